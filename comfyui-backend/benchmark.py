@@ -0,0 +1,368 @@
+"""
+Scheduler Benchmark for ComfyUI Backend
+=======================================
+
+Drives the backend end to end with stub ComfyUI workers so changes to
+``process_queue``/``process_job`` can be compared with numbers:
+
+    python benchmark.py --workers 4 --submitters 8 --jobs 25 --run-time lognormal:2:0.5
+
+- Starts ``main.py`` (uvicorn) with ``stub_comfyui.py`` as the ComfyUI
+  executable and an in-memory job store, or targets ``--url``
+- Each job's run time is drawn from ``--run-time`` with a seeded RNG and
+  embedded in the workflow (a ``StubSleep`` node), so runs are repeatable
+- N submitters post jobs (closed loop, or Poisson arrivals with ``--rate``)
+  while M pollers query job status until every job has finished
+- Reports throughput, queue wait and end-to-end latency (server
+  timestamps), status request latency (client side) as p50/p95/p99, and
+  the server process' CPU and RSS sampled from ``/proc`` (Linux)
+- Worker outputs and the backend log go to a temporary directory that is
+  removed afterwards (``--keep-workdir`` keeps it for debugging)
+
+Run-time distributions: ``fixed:S``, ``uniform:LO:HI``, ``exp:MEAN`` and
+``lognormal:MEDIAN:SIGMA`` (seconds).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+STUB_COMFYUI = os.path.join(BACKEND_DIR, "stub_comfyui.py")
+TERMINAL_STATES = ("completed", "failed", "cancelled", "timed_out")
+
+
+def parse_distribution(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Sampler for a ``kind:param[:param]`` run-time distribution"""
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(p) for p in params.split(":")] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid distribution parameters: {spec!r}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda: rng.expovariate(1 / values[0])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown distribution {spec!r} (fixed:S, uniform:LO:HI, exp:MEAN, lognormal:MEDIAN:SIGMA)")
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """``q``-th percentile (0-100) with linear interpolation, None if empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of a process from /proc"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.rss_samples: List[int] = []
+        self._start: Optional[tuple] = None
+        self._end: Optional[tuple] = None
+
+    def _cpu_seconds(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        return (int(fields[11]) + int(fields[12])) / self.ticks  # utime + stime
+
+    def _rss_bytes(self) -> Optional[int]:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return None
+
+    def _mark(self) -> tuple:
+        return time.monotonic(), self._cpu_seconds()
+
+    async def run(self):
+        self._start = self._mark()
+        try:
+            while True:
+                rss = self._rss_bytes()
+                if rss is not None:
+                    self.rss_samples.append(rss)
+                await asyncio.sleep(self.interval)
+        finally:
+            self._end = self._mark()
+
+    def report(self) -> dict:
+        cpu_percent = None
+        if self._start and self._end and self._start[1] is not None and self._end[1] is not None:
+            elapsed = self._end[0] - self._start[0]
+            cpu_percent = 100 * (self._end[1] - self._start[1]) / elapsed if elapsed > 0 else None
+        return {
+            "cpuPercent": cpu_percent,
+            "rssPeakBytes": max(self.rss_samples) if self.rss_samples else None,
+            "rssMeanBytes": sum(self.rss_samples) / len(self.rss_samples) if self.rss_samples else None,
+        }
+
+
+def start_backend(args, workdir: str) -> subprocess.Popen:
+    """Launch main.py with stub workers; returns the uvicorn process"""
+    env = {
+        **os.environ,
+        "COMFYUI_MAIN": STUB_COMFYUI,
+        "COMFYUI_BASE_PORT": str(args.worker_base_port or free_port()),
+        "COMFYUI_WORKER_ARGS": f"--output-bytes {args.output_bytes}",
+        "MAX_CONCURRENT_JOBS": str(args.workers),
+        "WORKER_OUTPUT_ROOT": os.path.join(workdir, "workers"),
+        "WORKER_HEALTH_INTERVAL": "1",
+        "JOB_STORE": "memory",
+        "MAX_QUEUE_WAIT_SECONDS": "0",  # measure the scheduler, not admission control
+        "JOB_OUTPUT_ROOT": os.path.join(workdir, "outputs"),
+        "BLOB_ROOT": os.path.join(workdir, "blobs"),
+        "FIREBASE_SERVICE_ACCOUNT": os.path.join(workdir, "no-firebase.json"),
+    }
+    log = open(os.path.join(workdir, "backend.log"), "wb")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, workers: int, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            health = (await client.get("/health/detailed")).json()
+            if health["workers"]["healthyWorkers"] >= workers:
+                return
+        except (httpx.HTTPError, KeyError, ValueError):
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Backend did not become ready")
+
+
+class Benchmark:
+    def __init__(self, args, client: httpx.AsyncClient):
+        self.args = args
+        self.client = client
+        self.pending: List[str] = []
+        self.finished: Dict[str, dict] = {}
+        self.submit_latency: List[float] = []
+        self.status_latency: List[float] = []
+        self.submitted = 0
+        self.done_submitting = asyncio.Event()
+
+    def make_request(self, rng: random.Random, run_time: Callable[[], float], name: str) -> dict:
+        models = [f"model_{i}.safetensors" for i in range(max(self.args.models, 1))]
+        return {
+            "prompt": f"benchmark {name}",
+            "workflow": {
+                "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": rng.choice(models)}},
+                "2": {"class_type": "StubSleep", "inputs": {"seconds": round(run_time(), 3)}},
+                "3": {"class_type": "KSampler", "inputs": {"seed": rng.getrandbits(32)}},
+            },
+            "priority": rng.choice(self.args.priorities),
+        }
+
+    async def submitter(self, submitter: int):
+        # One RNG per submitter: the same seed yields the same jobs however requests interleave
+        rng = random.Random(f"{self.args.seed}-{submitter}")
+        run_time = parse_distribution(self.args.run_time, rng)
+        for index in range(self.args.jobs):
+            if self.args.rate > 0:
+                await asyncio.sleep(rng.expovariate(self.args.rate))
+            request = self.make_request(rng, run_time, f"{submitter}-{index}")
+            start = time.perf_counter()
+            response = await self.client.post("/api/comfyui/generate", json=request)
+            self.submit_latency.append(time.perf_counter() - start)
+            response.raise_for_status()
+            self.pending.append(response.json()["data"]["jobId"])
+            self.submitted += 1
+
+    async def poller(self):
+        while not (self.done_submitting.is_set() and not self.pending):
+            if not self.pending:
+                await asyncio.sleep(self.args.poll_interval)
+                continue
+            job_id = self.pending.pop(0)
+            start = time.perf_counter()
+            response = await self.client.get(f"/api/comfyui/job/{job_id}")
+            self.status_latency.append(time.perf_counter() - start)
+            job = response.json()["data"]
+            if job["state"] in TERMINAL_STATES:
+                self.finished[job_id] = job
+            else:
+                self.pending.append(job_id)
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def run(self) -> dict:
+        start = time.monotonic()
+        pollers = [asyncio.create_task(self.poller()) for _ in range(self.args.pollers)]
+        await asyncio.gather(*(self.submitter(i) for i in range(self.args.submitters)))
+        self.done_submitting.set()
+        await asyncio.gather(*pollers)
+        elapsed = time.monotonic() - start
+
+        jobs = list(self.finished.values())
+        completed = [job for job in jobs if job["state"] == "completed"]
+        started = [job for job in jobs if job.get("startedAt")]
+        return {
+            "jobs": len(jobs),
+            "completed": len(completed),
+            "failed": len(jobs) - len(completed),
+            "elapsedSeconds": elapsed,
+            "throughputJobsPerSecond": len(completed) / elapsed if elapsed > 0 else None,
+            "queueWaitSeconds": summarize([job["startedAt"] - job["createdAt"] for job in started]),
+            "endToEndSeconds": summarize([job["completedAt"] - job["createdAt"] for job in completed]),
+            "submitLatencySeconds": summarize(self.submit_latency),
+            "statusLatencySeconds": summarize(self.status_latency),
+        }
+
+
+def format_report(report: dict) -> str:
+    def fmt(value, scale=1.0, unit="s"):
+        return "-" if value is None else f"{value * scale:.3f}{unit}"
+
+    lines = [
+        f"Jobs: {report['completed']}/{report['jobs']} completed in {report['elapsedSeconds']:.1f}s "
+        f"({fmt(report['throughputJobsPerSecond'], unit=' jobs/s')})",
+        f"{'':24}{'p50':>12}{'p95':>12}{'p99':>12}{'max':>12}",
+    ]
+    for label, key, scale, unit in (
+        ("Queue wait", "queueWaitSeconds", 1, "s"),
+        ("End to end", "endToEndSeconds", 1, "s"),
+        ("Submit request", "submitLatencySeconds", 1000, "ms"),
+        ("Status request", "statusLatencySeconds", 1000, "ms"),
+    ):
+        stats = report[key]
+        lines.append(f"{label:24}" + "".join(f"{fmt(stats[q], scale, unit):>12}" for q in ("p50", "p95", "p99", "max")))
+    server = report.get("server") or {}
+    if server:
+        rss = server.get("rssPeakBytes")
+        lines.append(
+            f"Server: CPU {fmt(server.get('cpuPercent'), unit='%')}, "
+            f"peak RSS {'-' if rss is None else f'{rss / 2**20:.1f} MiB'}"
+        )
+    return "\n".join(lines)
+
+
+async def main(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="comfyui_bench_")
+    process = None
+    url = args.url
+    if url is None:
+        args.port = args.port or free_port()
+        process = start_backend(args, workdir)
+        url = f"http://127.0.0.1:{args.port}"
+
+    sampler = None
+    sampler_task = None
+    try:
+        limits = httpx.Limits(max_connections=args.submitters + args.pollers + 4)
+        async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+            await wait_until_ready(client, args.workers if process else 0)
+            pid = process.pid if process else args.pid
+            if pid:
+                sampler = ProcessSampler(pid)
+                sampler_task = asyncio.create_task(sampler.run())
+            report = await Benchmark(args, client).run()
+    finally:
+        if sampler_task is not None:
+            sampler_task.cancel()
+            await asyncio.gather(sampler_task, return_exceptions=True)
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        if args.keep_workdir:
+            print(f"Work directory kept: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report["server"] = sampler.report() if sampler else None
+    report["config"] = {
+        key: getattr(args, key)
+        for key in ("label", "workers", "submitters", "pollers", "jobs", "rate", "run_time", "priorities", "models", "seed")
+    }
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the ComfyUI backend scheduler with stub workers")
+    parser.add_argument("--url", help="Benchmark a running backend instead of starting one")
+    parser.add_argument("--pid", type=int, help="Process to sample CPU/RSS of when using --url")
+    parser.add_argument("--port", type=int, default=0, help="Port for the started backend (default: free port)")
+    parser.add_argument("--worker-base-port", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=2, help="Stub ComfyUI workers (MAX_CONCURRENT_JOBS)")
+    parser.add_argument("--submitters", type=int, default=4, help="Concurrent submitting clients")
+    parser.add_argument("--pollers", type=int, default=4, help="Concurrent status polling clients")
+    parser.add_argument("--jobs", type=int, default=10, help="Jobs per submitter")
+    parser.add_argument("--rate", type=float, default=0, help="Poisson arrival rate per submitter (jobs/s), 0 = all at once")
+    parser.add_argument("--run-time", default="fixed:0.5", help="Job run-time distribution (seconds)")
+    parser.add_argument("--priorities", type=lambda s: [int(p) for p in s.split(",")], default=[5], help="e.g. 1,5,9")
+    parser.add_argument("--models", type=int, default=1, help="Distinct checkpoints (exercises model affinity)")
+    parser.add_argument("--output-bytes", type=int, default=1024, help="Size of each stub output video")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="Name stored with --json results")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep worker outputs and the backend log")
+    args = parser.parse_args(argv)
+    parse_distribution(args.run_time, random.Random())  # fail fast on a bad spec
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,141 @@
+"""
+Blob Store for ComfyUI Backend
+==============================
+
+Content-addressed storage for uploaded inputs such as character reference
+images. A blob is stored once under the SHA-256 of its bytes
+(``<root>/<first two hex digits>/<digest>``) and jobs refer to it by that
+digest instead of carrying the image inline.
+
+- Uploads are streamed to a temporary file while hashing, so memory use
+  does not grow with the blob size (``max_blob_bytes`` caps it on disk)
+- Identical uploads are deduplicated; the temporary file is discarded
+- Writes are atomic (rename into place), so readers never see partial blobs
+- Blobs not used for ``ttl`` seconds are removed by ``evict_unused``
+
+All methods touch the filesystem and are meant to run in an executor.
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from typing import Optional, Tuple
+
+DIGEST_LENGTH = 64
+
+
+def is_digest(value: str) -> bool:
+    """True for a lowercase hex SHA-256 digest"""
+    return len(value) == DIGEST_LENGTH and all(c in "0123456789abcdef" for c in value)
+
+
+def decode_data_url(value: str) -> bytes:
+    """Bytes of a base64 string, with or without a ``data:<mime>;base64,`` prefix"""
+    if value.startswith("data:"):
+        _, _, value = value.partition(",")
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image: {e}") from e
+
+
+class BlobTooLarge(ValueError):
+    pass
+
+
+class BlobUpload:
+    """A blob being written; ``commit`` moves it into the store under its digest"""
+
+    def __init__(self, store: "BlobStore"):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._path = os.path.join(store.tmp_dir, f"{uuid.uuid4().hex}.part")
+        self._file = open(self._path, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if 0 < self.store.max_blob_bytes < self.size:
+            raise BlobTooLarge(f"Blob exceeds {self.store.max_blob_bytes} bytes")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> Tuple[str, bool]:
+        """Store the blob; returns its digest and whether it was new"""
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = self.store.path(digest)
+        if os.path.exists(path):
+            os.remove(self._path)
+            self.store.touch(digest)
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self._path, path)
+        return digest, True
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+class BlobStore:
+    """SHA-256 addressed files under ``root``"""
+
+    def __init__(self, root: str, max_blob_bytes: int = 0):
+        self.root = root
+        self.max_blob_bytes = max_blob_bytes
+        self.tmp_dir = os.path.join(root, "tmp")
+        # Partial uploads of a previous process are never committed
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        if not is_digest(digest):
+            raise ValueError(f"Not a SHA-256 digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return is_digest(digest) and os.path.exists(self.path(digest))
+
+    def touch(self, digest: str):
+        """Mark a blob as used now, so ``evict_unused`` keeps it"""
+        try:
+            os.utime(self.path(digest))
+        except OSError:
+            pass
+
+    def upload(self) -> BlobUpload:
+        return BlobUpload(self)
+
+    def put(self, data: bytes) -> Tuple[str, bool]:
+        """Store ``data``; returns its digest and whether it was new"""
+        upload = self.upload()
+        try:
+            upload.write(data)
+            return upload.commit()
+        except BaseException:
+            upload.abort()
+            raise
+
+    def evict_unused(self, ttl_seconds: float, now: Optional[float] = None) -> int:
+        """Delete blobs not used for ``ttl_seconds``; returns how many"""
+        cutoff = (now or time.time()) - ttl_seconds
+        removed = 0
+        for shard in os.scandir(self.root):
+            if not shard.is_dir(follow_symlinks=False) or shard.path == self.tmp_dir:
+                continue
+            for entry in os.scandir(shard.path):
+                if is_digest(entry.name) and entry.stat().st_mtime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        continue
+        return removed
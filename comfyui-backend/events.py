@@ -0,0 +1,113 @@
+"""
+Job Event Bus for ComfyUI Backend
+=================================
+
+In-process publish/subscribe channel for job state and progress updates.
+
+``process_job`` publishes each transition once; SSE and WebSocket handlers
+subscribe to a single job or to every job of a user. Subscribers are
+indexed by job id and user id so a publish only touches interested
+listeners, and each subscriber has a bounded queue that drops the oldest
+event when a slow client falls behind (the latest state always wins).
+``end_all`` wakes every listener with ``ended`` set so streams can finish
+before the server shuts down.
+"""
+
+import asyncio
+import json
+from typing import Dict, Optional, Set
+
+_END = object()  # wakes a listener whose subscription was ended
+
+
+class Subscription:
+    """One listener's bounded event queue"""
+
+    def __init__(self, bus: "EventBus", job_id: Optional[str], user_id: Optional[str], max_queue: int):
+        self._bus = bus
+        self.job_id = job_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.ended = False
+
+    def put(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or None if ``timeout`` elapses first or the subscription is ended"""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return None if event is _END else event
+
+    def end(self):
+        """Tell the listener to stop; pending events are dropped"""
+        self.ended = True
+        self.put(_END)
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBus:
+    """Fan-out of job events to per-job and per-user subscribers"""
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._by_job: Dict[str, Set[Subscription]] = {}
+        self._by_user: Dict[str, Set[Subscription]] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._by_job.values()) + sum(len(s) for s in self._by_user.values())
+
+    def subscribe(self, job_id: Optional[str] = None, user_id: Optional[str] = None) -> Subscription:
+        """Listen to one job (``job_id``) or to all jobs of ``user_id``"""
+        if (job_id is None) == (user_id is None):
+            raise ValueError("Subscribe to exactly one of job_id or user_id")
+
+        sub = Subscription(self, job_id, user_id, self.max_queue)
+        if job_id is not None:
+            self._by_job.setdefault(job_id, set()).add(sub)
+        else:
+            self._by_user.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        index, key = (self._by_job, sub.job_id) if sub.job_id is not None else (self._by_user, sub.user_id)
+        subs = index.get(key)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del index[key]
+
+    def end_all(self) -> int:
+        """End every open subscription (server shutdown); returns how many were open"""
+        subs = [sub for index in (self._by_job, self._by_user) for subs in index.values() for sub in subs]
+        for sub in subs:
+            sub.end()
+        return len(subs)
+
+    def publish(self, event: dict):
+        """Deliver ``event`` (must carry jobId and userId) to matching subscribers"""
+        for sub in self._by_job.get(event.get("jobId"), ()):
+            sub.put(event)
+        for sub in self._by_user.get(event.get("userId"), ()):
+            sub.put(event)
+
+
+def format_sse(event: dict, event_name: str = "job") -> str:
+    """Encode an event as a Server-Sent Events frame"""
+    return f"event: {event_name}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,83 @@
+"""
+Job Statistics for ComfyUI Backend
+==================================
+
+Counters maintained incrementally on every job state transition, so stats
+and health endpoints are O(1) no matter how many jobs the store holds.
+
+Counts describe the jobs currently held by the job store: they are seeded
+from the store on startup and decremented when finished jobs are evicted.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+# (state, userId, tier, count) rows as produced by JobStore.summary()
+SummaryRow = Tuple[str, Optional[str], Optional[str], int]
+
+
+def _state(value) -> str:
+    return getattr(value, "value", value)
+
+
+def _nonzero(counts) -> Dict[str, int]:
+    return {state: count for state, count in counts.items() if count}
+
+
+class JobStats:
+    """Per-state counts, broken down by user and by tier"""
+
+    def __init__(self):
+        self.by_state: Counter = Counter()
+        self.by_user: Dict[str, Counter] = {}
+        self.by_tier: Dict[str, Counter] = {}
+        self.total = 0
+
+    def seed(self, rows: Iterable[SummaryRow]):
+        """Initialise counters from existing store contents"""
+        for state, user_id, tier, count in rows:
+            self._add(_state(state), user_id, tier, count)
+
+    def created(self, job: dict):
+        self._add(_state(job["state"]), job.get("userId"), job.get("tier"), 1)
+
+    def transitioned(self, job: dict, old_state, new_state):
+        old_state, new_state = _state(old_state), _state(new_state)
+        if old_state == new_state:
+            return
+        user_id, tier = job.get("userId"), job.get("tier")
+        self._bump(old_state, user_id, tier, -1)
+        self._bump(new_state, user_id, tier, 1)
+
+    def removed(self, job: dict):
+        self._add(_state(job["state"]), job.get("userId"), job.get("tier"), -1)
+
+    def count(self, state) -> int:
+        return self.by_state.get(_state(state), 0)
+
+    def state_counts(self) -> Dict[str, int]:
+        return _nonzero(self.by_state)
+
+    def user_counts(self, user_id: str) -> Dict[str, int]:
+        return _nonzero(self.by_user.get(user_id, {}))
+
+    def tier_counts(self) -> Dict[str, Dict[str, int]]:
+        return {tier: _nonzero(counts) for tier, counts in self.by_tier.items()}
+
+    def _add(self, state: str, user_id: Optional[str], tier: Optional[str], delta: int):
+        self.total += delta
+        self._bump(state, user_id, tier, delta)
+
+    def _bump(self, state: str, user_id: Optional[str], tier: Optional[str], delta: int):
+        self.by_state[state] += delta
+        if user_id is not None:
+            self._bump_group(self.by_user, user_id, state, delta)
+        if tier is not None:
+            self._bump_group(self.by_tier, tier, state, delta)
+
+    @staticmethod
+    def _bump_group(groups: Dict[str, Counter], key: str, state: str, delta: int):
+        counts = groups.setdefault(key, Counter())
+        counts[state] += delta
+        if delta < 0 and not any(counts.values()):
+            del groups[key]
@@ -0,0 +1,491 @@
+"""
+Job Store for ComfyUI Backend
+=============================
+
+Pluggable storage for job records.
+
+- MemoryJobStore: process-local, used for tests and throwaway deployments
+- SQLiteJobStore: embedded SQLite (WAL mode), survives restarts
+- RedisJobStore: shared by several backend replicas (requires ``redis``)
+
+Memory and SQLite keep a bounded hot set in memory: active (queued/running)
+jobs are always resident because the worker mutates them in place, while
+finished jobs live in an LRU of ``hot_size`` entries (Redis only keeps the
+jobs running on this replica resident). Finished jobs older than the TTL
+are evicted from memory and disk by ``evict_expired``.
+
+Batches (a scene's shots submitted together) are stored as a small record
+listing their job ids; ``add_batch`` inserts the record and all of its jobs
+in one transaction.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+ACTIVE_STATES = ("queued", "running")
+
+# Large request fields that are only needed until the job has run
+HEAVY_FIELDS = ("workflow", "referenceImage")
+
+
+def _state(value) -> str:
+    return getattr(value, "value", value)
+
+
+def is_active(job: dict) -> bool:
+    return job.get("state") in ACTIVE_STATES
+
+
+class MemoryJobStore:
+    """In-memory job store with a bounded LRU of finished jobs"""
+
+    def __init__(self, hot_size: int = 1000):
+        self.hot_size = hot_size
+        self._active: Dict[str, dict] = {}
+        self._finished: "OrderedDict[str, dict]" = OrderedDict()
+        self._batches: Dict[str, dict] = {}
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._active) + len(self._finished)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._active.get(job_id)
+        if job is not None:
+            return job
+        job = self._finished.get(job_id)
+        if job is not None:
+            self._finished.move_to_end(job_id)
+        return job
+
+    def add(self, job: dict):
+        """Insert a new job"""
+        self._cache(job)
+
+    def add_batch(self, batch: dict, new_jobs: List[dict]):
+        """Insert a batch record together with its new jobs (all or nothing)"""
+        self._batches[batch["id"]] = batch
+        for job in new_jobs:
+            self._cache(job)
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        return self._batches.get(batch_id)
+
+    def save_progress(self, job: dict):
+        """Publish progress of a running job (only stores shared between processes need this)"""
+
+    def save(self, job: dict):
+        """Record a state transition of ``job``"""
+        if not is_active(job):
+            for field in HEAVY_FIELDS:
+                job.pop(field, None)
+        self._cache(job)
+
+    def delete(self, job_id: str):
+        self._active.pop(job_id, None)
+        self._finished.pop(job_id, None)
+
+    def active_jobs(self) -> List[dict]:
+        """Jobs currently queued or running"""
+        return list(self._active.values())
+
+    def recover(self) -> List[dict]:
+        """Jobs that were queued or running when the store was last used"""
+        return []
+
+    def count_by_state(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for state, _, _, count in self.summary():
+            counts[state] = counts.get(state, 0) + count
+        return counts
+
+    def summary(self) -> List[Tuple[str, Optional[str], Optional[str], int]]:
+        """(state, userId, tier, count) rows for seeding JobStats"""
+        counts: Dict[tuple, int] = {}
+        for job in self._iter_resident():
+            key = (_state(job["state"]), job.get("userId"), job.get("tier"))
+            counts[key] = counts.get(key, 0) + 1
+        return [(*key, count) for key, count in counts.items()]
+
+    def evict_expired(self, ttl_seconds: float, now: Optional[float] = None) -> List[dict]:
+        """Drop finished jobs completed more than ``ttl_seconds`` ago and return them"""
+        cutoff = (now or time.time()) - ttl_seconds
+        expired = [
+            job for job in self._finished.values()
+            if (job.get("completedAt") or 0) < cutoff
+        ]
+        for job in expired:
+            del self._finished[job["id"]]
+        return expired
+
+    def evict_expired_batches(self, ttl_seconds: float, now: Optional[float] = None) -> int:
+        """Drop batch records older than ``ttl_seconds`` with no queued or running job"""
+        cutoff = (now or time.time()) - ttl_seconds
+        expired = [
+            batch["id"] for batch in self._batches.values()
+            if batch["createdAt"] < cutoff and not self._batch_active(batch)
+        ]
+        for batch_id in expired:
+            del self._batches[batch_id]
+        return len(expired)
+
+    def close(self):
+        pass
+
+    def _batch_active(self, batch: dict) -> bool:
+        return any(job_id in self._active for job_id in batch["jobIds"])
+
+    # Hot set
+
+    def _iter_resident(self) -> Iterable[dict]:
+        yield from self._active.values()
+        yield from self._finished.values()
+
+    def _cache(self, job: dict):
+        job_id = job["id"]
+        if is_active(job):
+            self._finished.pop(job_id, None)
+            self._active[job_id] = job
+            return
+
+        self._active.pop(job_id, None)
+        self._finished[job_id] = job
+        self._finished.move_to_end(job_id)
+        while len(self._finished) > self.hot_size:
+            self._finished.popitem(last=False)
+
+
+class SQLiteJobStore(MemoryJobStore):
+    """Job store persisted to an embedded SQLite database"""
+
+    def __init__(self, path: str, hot_size: int = 1000):
+        super().__init__(hot_size)
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                user_id TEXT,
+                created_at REAL NOT NULL,
+                completed_at REAL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_completed_at ON jobs(completed_at)")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batches (
+                id TEXT PRIMARY KEY,
+                user_id TEXT,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = super().get(job_id)
+        if job is not None:
+            return job
+
+        row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row[0])
+        self._cache(job)
+        return job
+
+    def add(self, job: dict):
+        self._write(job)
+        super().add(job)
+
+    def add_batch(self, batch: dict, new_jobs: List[dict]):
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.execute(
+                "INSERT INTO batches (id, user_id, created_at, data) VALUES (?, ?, ?, ?)",
+                (batch["id"], batch.get("userId"), batch["createdAt"], json.dumps(batch)),
+            )
+            for job in new_jobs:
+                self._write(job)
+        super().add_batch(batch, new_jobs)
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        batch = super().get_batch(batch_id)
+        if batch is not None:
+            return batch
+
+        row = self._db.execute("SELECT data FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, job: dict):
+        super().save(job)
+        self._write(job)
+
+    def delete(self, job_id: str):
+        super().delete(job_id)
+        self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def recover(self) -> List[dict]:
+        placeholders = ",".join("?" * len(ACTIVE_STATES))
+        rows = self._db.execute(
+            f"SELECT data FROM jobs WHERE state IN ({placeholders}) ORDER BY created_at",
+            ACTIVE_STATES,
+        ).fetchall()
+        recovered = []
+        for (data,) in rows:
+            job = json.loads(data)
+            self._cache(job)
+            recovered.append(job)
+        return recovered
+
+    def summary(self) -> List[Tuple[str, Optional[str], Optional[str], int]]:
+        return self._db.execute(
+            "SELECT state, user_id, json_extract(data, '$.tier'), COUNT(*) FROM jobs GROUP BY 1, 2, 3"
+        ).fetchall()
+
+    def evict_expired(self, ttl_seconds: float, now: Optional[float] = None) -> List[dict]:
+        cutoff = (now or time.time()) - ttl_seconds
+        super().evict_expired(ttl_seconds, now)
+        placeholders = ",".join("?" * len(ACTIVE_STATES))
+        where = f"completed_at < ? AND state NOT IN ({placeholders})"
+        params = (cutoff, *ACTIVE_STATES)
+        with self._db:
+            self._db.execute("BEGIN")
+            rows = self._db.execute(
+                f"SELECT id, state, user_id, json_extract(data, '$.tier') FROM jobs WHERE {where}", params
+            ).fetchall()
+            self._db.execute(f"DELETE FROM jobs WHERE {where}", params)
+        return [
+            {"id": job_id, "state": state, "userId": user_id, "tier": tier}
+            for job_id, state, user_id, tier in rows
+        ]
+
+    def evict_expired_batches(self, ttl_seconds: float, now: Optional[float] = None) -> int:
+        cutoff = (now or time.time()) - ttl_seconds
+        super().evict_expired_batches(ttl_seconds, now)
+        rows = self._db.execute("SELECT data FROM batches WHERE created_at < ?", (cutoff,)).fetchall()
+        # Active jobs are always resident, so the in-memory check is authoritative
+        batches = [json.loads(data) for (data,) in rows]
+        expired = [batch["id"] for batch in batches if not self._batch_active(batch)]
+        self._db.executemany("DELETE FROM batches WHERE id = ?", [(batch_id,) for batch_id in expired])
+        return len(expired)
+
+    def close(self):
+        self._db.close()
+
+    def _write(self, job: dict):
+        self._db.execute(
+            """
+            INSERT INTO jobs (id, state, user_id, created_at, completed_at, data)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                state = excluded.state,
+                completed_at = excluded.completed_at,
+                data = excluded.data
+            """,
+            (
+                job["id"],
+                _state(job["state"]),
+                job.get("userId"),
+                job.get("createdAt") or time.time(),
+                job.get("completedAt"),
+                json.dumps(job),
+            ),
+        )
+
+
+class RedisJobStore(MemoryJobStore):
+    """
+    Job store shared by several replicas through Redis.
+
+    Any replica may claim a queued job, a running job may belong to another
+    replica and finished jobs still change (renditions, output eviction), so
+    all of them are read from Redis. Only jobs running on this replica stay
+    resident, since ``process_job`` mutates them in place.
+    Progress of running jobs is published at most every
+    ``progress_interval`` seconds.
+
+    Keys (under ``prefix``): ``job:<id>`` JSON record, ``active`` set of
+    queued/running ids, ``finished`` zset by completion time,
+    ``batch:<id>`` and ``batches`` zset by creation time.
+    """
+
+    def __init__(
+        self,
+        client: "redis.Redis",
+        prefix: str = "comfyui",
+        hot_size: int = 1000,
+        progress_interval: float = 1.0,
+    ):
+        super().__init__(hot_size)
+        self.client = client
+        self.prefix = prefix
+        self.progress_interval = progress_interval
+        self._progress_written: Dict[str, float] = {}
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    def __len__(self) -> int:
+        return self.client.scard(self._key("active")) + self.client.zcard(self._key("finished"))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = super().get(job_id)
+        if job is not None:
+            return job
+
+        data = self.client.get(self._key("job", job_id))
+        if data is None:
+            return None
+        return json.loads(data)
+
+    def add(self, job: dict):
+        self._write(self.client, job)
+        super().add(job)
+
+    def add_batch(self, batch: dict, new_jobs: List[dict]):
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self._key("batch", batch["id"]), json.dumps(batch))
+            pipe.zadd(self._key("batches"), {batch["id"]: batch["createdAt"]})
+            for job in new_jobs:
+                self._write(pipe, job)
+            pipe.execute()
+        super().add_batch(batch, new_jobs)
+
+    def get_batch(self, batch_id: str) -> Optional[dict]:
+        data = self.client.get(self._key("batch", batch_id))
+        return json.loads(data) if data is not None else None
+
+    def save_progress(self, job: dict):
+        now = time.monotonic()
+        if now - self._progress_written.get(job["id"], 0.0) < self.progress_interval:
+            return
+        self._progress_written[job["id"]] = now
+        self.client.set(self._key("job", job["id"]), json.dumps(job))
+
+    def save(self, job: dict):
+        super().save(job)
+        self._write(self.client, job)
+        if _state(job["state"]) != "running":
+            self._progress_written.pop(job["id"], None)
+
+    def delete(self, job_id: str):
+        super().delete(job_id)
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key("job", job_id))
+            pipe.srem(self._key("active"), job_id)
+            pipe.zrem(self._key("finished"), job_id)
+            pipe.execute()
+
+    def active_jobs(self) -> List[dict]:
+        ids = [job_id.decode() for job_id in self.client.smembers(self._key("active"))]
+        return [job for job in map(self.get, ids) if job is not None and is_active(job)]
+
+    def recover(self) -> List[dict]:
+        # Jobs of a stopped replica come back through the queue's visibility timeout
+        return []
+
+    def summary(self) -> List[Tuple[str, Optional[str], Optional[str], int]]:
+        counts: Dict[tuple, int] = {}
+        for key in self.client.scan_iter(match=self._key("job", "*"), count=1000):
+            data = self.client.get(key)
+            if data is None:
+                continue
+            job = json.loads(data)
+            group = (_state(job["state"]), job.get("userId"), job.get("tier"))
+            counts[group] = counts.get(group, 0) + 1
+        return [(*group, count) for group, count in counts.items()]
+
+    def evict_expired(self, ttl_seconds: float, now: Optional[float] = None) -> List[dict]:
+        cutoff = (now or time.time()) - ttl_seconds
+        super().evict_expired(ttl_seconds, now)
+        evicted = []
+        for job_id in self.client.zrangebyscore(self._key("finished"), "-inf", cutoff):
+            # ZREM succeeds for exactly one replica, which then owns the eviction
+            if not self.client.zrem(self._key("finished"), job_id):
+                continue
+            job_id = job_id.decode()
+            data = self.client.getdel(self._key("job", job_id))
+            if data is not None:
+                job = json.loads(data)
+                evicted.append({"id": job_id, "state": _state(job["state"]), "userId": job.get("userId"), "tier": job.get("tier")})
+        return evicted
+
+    def evict_expired_batches(self, ttl_seconds: float, now: Optional[float] = None) -> int:
+        cutoff = (now or time.time()) - ttl_seconds
+        super().evict_expired_batches(ttl_seconds, now)
+        evicted = 0
+        for batch_id in self.client.zrangebyscore(self._key("batches"), "-inf", cutoff):
+            batch = self.get_batch(batch_id.decode())
+            if batch is not None and any(self.client.smismember(self._key("active"), batch["jobIds"])):
+                continue
+            if self.client.zrem(self._key("batches"), batch_id):
+                self.client.delete(self._key("batch", batch_id.decode()))
+                evicted += 1
+        return evicted
+
+    def close(self):
+        self.client.close()
+
+    def _cache(self, job: dict):
+        if _state(job["state"]) != "running":
+            # Queued or finished: another replica may change it, so never serve a local copy
+            self._active.pop(job["id"], None)
+            self._finished.pop(job["id"], None)
+            return
+        # Running here (saved by process_job)
+        super()._cache(job)
+
+    def _write(self, target, job: dict):
+        job_id = job["id"]
+        target.set(self._key("job", job_id), json.dumps(job))
+        if is_active(job):
+            target.sadd(self._key("active"), job_id)
+            target.zrem(self._key("finished"), job_id)
+        else:
+            target.srem(self._key("active"), job_id)
+            target.zadd(self._key("finished"), {job_id: job.get("completedAt") or time.time()})
+
+
+def create_job_store(
+    backend: str,
+    path: str,
+    hot_size: int,
+    redis_url: Optional[str] = None,
+    redis_prefix: str = "comfyui",
+) -> MemoryJobStore:
+    """Build the job store selected by the JOB_STORE setting"""
+    if backend == "memory":
+        return MemoryJobStore(hot_size)
+    if backend == "sqlite":
+        return SQLiteJobStore(path, hot_size)
+    if backend == "redis":
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("JOB_STORE=redis requires the redis package (pip install redis)")
+        return RedisJobStore(redis.Redis.from_url(redis_url), redis_prefix, hot_size)
+    raise ValueError(f"Unknown job store backend: {backend}")
@@ -13,21 +13,40 @@ Features:
 - Automatic model selection
 """
 
-from fastapi import FastAPI, HTTPException, Header, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Header, BackgroundTasks, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import subprocess
-import json
+import uvicorn
 import uuid
 import time
 import os
-import base64
+import secrets
+import socket
 from typing import Optional, Dict, List
 from pathlib import Path
 import asyncio
+import math
 from enum import Enum
 from dotenv import load_dotenv
 
+from artifacts import RangeFileResponse, artifact_info, signed_query, verify_artifact_signature
+from blob_store import BlobStore, BlobTooLarge, decode_data_url
+from events import EventBus, format_sse
+from job_stats import JobStats
+from job_store import HEAVY_FIELDS, create_job_store, is_active
+from metrics import CONTENT_TYPE, JOB_BUCKETS, MetricsRegistry, RequestMetricsMiddleware
+from output_store import OutputStore, dir_size
+from redis_queue import RedisJobQueue
+from renditions import RenditionPipeline, rendition_filename
+from result_cache import ResultCache, request_fingerprint
+from scheduler import FairShareScheduler, parse_user_weights
+from tier_router import LatencyModel
+from token_cache import TokenCache
+from tracing import JobTrace, TraceExporter, new_trace_id, parse_traceparent
+from worker_pool import ComfyUIWorkerPool
+from workflow_analysis import ModelSizeIndex, detect_tier, estimate_cost, required_models
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -67,8 +86,63 @@ app.add_middleware(
 
 # Configuration
 COMFYUI_PATH = os.getenv("COMFYUI_PATH", "/workspace/ComfyUI")
-MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+COMFYUI_MAIN = os.getenv("COMFYUI_MAIN", f"{COMFYUI_PATH}/main.py")
+COMFYUI_WORKER_URLS = [u.strip() for u in os.getenv("COMFYUI_WORKER_URLS", "").split(",") if u.strip()]
+COMFYUI_BASE_PORT = int(os.getenv("COMFYUI_BASE_PORT", "8188"))
+COMFYUI_WORKER_ARGS = os.getenv("COMFYUI_WORKER_ARGS", "").split()
+WORKER_OUTPUT_ROOT = os.getenv("WORKER_OUTPUT_ROOT", "/tmp/comfyui_workers")
+WORKER_HEALTH_INTERVAL = float(os.getenv("WORKER_HEALTH_INTERVAL", "10"))
+WORKER_STARTUP_TIMEOUT = float(os.getenv("WORKER_STARTUP_TIMEOUT", "300"))
+PRELOAD_MODELS = [m.strip() for m in os.getenv("PRELOAD_MODELS", "").split(",") if m.strip()]  # checkpoints loaded on every worker at startup
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "300"))  # seconds shutdown waits for running jobs
+HTTP_DRAIN_TIMEOUT = float(os.getenv("HTTP_DRAIN_TIMEOUT", "10"))  # seconds open requests get after the job drain
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))  # ComfyUI worker processes
+GPU_MEMORY_BUDGET_GB = float(os.getenv("GPU_MEMORY_BUDGET_GB", "24"))  # shared by running jobs, 0 = no budget
+COST_QUANTUM_GB = float(os.getenv("COST_QUANTUM_GB", "4"))  # fair-share credit per turn
 JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "300"))  # 5 minutes
+QUEUE_AGING_SECONDS = float(os.getenv("QUEUE_AGING_SECONDS", "60"))  # 1 priority level per minute waited
+MAX_JOBS_PER_USER = int(os.getenv("MAX_JOBS_PER_USER", "0"))  # concurrent jobs per user, 0 = unlimited
+DEFAULT_USER_WEIGHT = float(os.getenv("DEFAULT_USER_WEIGHT", "1"))
+USER_WEIGHTS = parse_user_weights(os.getenv("USER_WEIGHTS", ""))  # e.g. "uidA:2,uidB:0.5"
+if not COST_QUANTUM_GB > 0:
+    raise ValueError(f"COST_QUANTUM_GB must be positive, got {COST_QUANTUM_GB}")
+if not DEFAULT_USER_WEIGHT > 0:
+    raise ValueError(f"DEFAULT_USER_WEIGHT must be positive, got {DEFAULT_USER_WEIGHT}")
+AFFINITY_WINDOW = int(os.getenv("AFFINITY_WINDOW", "4"))  # queued jobs considered for model reuse, 1 = strict order
+AFFINITY_MAX_SKIPS = int(os.getenv("AFFINITY_MAX_SKIPS", "2"))  # times a job may be overtaken for model reuse
+JOB_STORE = os.getenv("JOB_STORE", "sqlite")  # sqlite | memory | redis (shared by replicas)
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "/tmp/comfyui_jobs.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = os.getenv("REDIS_PREFIX", "comfyui")  # key namespace, one per deployment
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+VISIBILITY_TIMEOUT = float(os.getenv("VISIBILITY_TIMEOUT", "60"))  # seconds before a silent replica's jobs are requeued
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "1"))  # heartbeat and shared queue polling
+JOB_CACHE_SIZE = int(os.getenv("JOB_CACHE_SIZE", "1000"))  # finished jobs kept in memory
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "86400"))  # 24 hours
+JOB_EVICT_INTERVAL = int(os.getenv("JOB_EVICT_INTERVAL", "300"))  # 5 minutes
+JOB_OUTPUT_ROOT = os.getenv("JOB_OUTPUT_ROOT", "/tmp/comfyui_output")  # one directory per job
+OUTPUT_QUOTA_GB = float(os.getenv("OUTPUT_QUOTA_GB", "50"))  # finished outputs kept on disk, 0 = unlimited
+RENDITIONS = [name.strip() for name in os.getenv("RENDITIONS", "poster,preview").split(",") if name.strip()]  # poster, preview, web
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+RENDITION_PROCESSES = int(os.getenv("RENDITION_PROCESSES", "2"))  # concurrent ffmpeg processes
+RENDITION_TIMEOUT = float(os.getenv("RENDITION_TIMEOUT", "120"))  # seconds per rendition
+PREVIEW_HEIGHT = int(os.getenv("PREVIEW_HEIGHT", "360"))  # lines of poster and preview
+BLOB_ROOT = os.getenv("BLOB_ROOT", "/tmp/comfyui_blobs")  # uploaded reference images by SHA-256
+MAX_BLOB_MB = float(os.getenv("MAX_BLOB_MB", "20"))  # per upload
+BLOB_TTL_SECONDS = int(os.getenv("BLOB_TTL_SECONDS", "604800"))  # 7 days since last use
+ARTIFACT_URL_SECRET = os.getenv("ARTIFACT_URL_SECRET") or secrets.token_hex(32)
+ARTIFACT_URL_TTL = int(os.getenv("ARTIFACT_URL_TTL", "3600"))  # 1 hour
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1000"))  # 0 disables deduplication
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+AUTH_VERIFY_THREADS = int(os.getenv("AUTH_VERIFY_THREADS", "4"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))  # shots per batch request
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")  # finished job traces are appended here, empty = not exported
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "otlp")  # otlp (OTLP-JSON lines) | chrome (Perfetto / chrome://tracing)
+ROUTING_EWMA_ALPHA = float(os.getenv("ROUTING_EWMA_ALPHA", "0.2"))  # weight of the latest run in per-tier execution estimates
+MAX_QUEUE_WAIT_SECONDS = float(os.getenv("MAX_QUEUE_WAIT_SECONDS", "3600"))  # estimated wait above which submissions get 429, 0 = unlimited
+MAX_BULK_JOBS = int(os.getenv("MAX_BULK_JOBS", "200"))  # job ids per bulk status request
+MAX_LONG_POLL_SECONDS = float(os.getenv("MAX_LONG_POLL_SECONDS", "30"))  # cap on ?wait= of bulk status
 
 # Initialize Firebase (if enabled)
 if FIREBASE_ENABLED and not firebase_admin._apps:
@@ -92,18 +166,118 @@ class JobState(str, Enum):
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
 
-# In-memory job storage (use Redis for production)
-jobs: Dict[str, dict] = {}
-job_queue: List[str] = []
+# Job storage (queued/running jobs always resident, finished jobs LRU-cached)
+jobs = create_job_store(JOB_STORE, JOB_STORE_PATH, JOB_CACHE_SIZE, REDIS_URL, REDIS_PREFIX)
+job_stats = JobStats()
+job_stats.seed(jobs.summary())
+CLUSTERED = JOB_STORE == "redis"
+if CLUSTERED:
+    # Replicas share one queue; fair share and per-user caps are local-mode only
+    job_queue = RedisJobQueue(
+        jobs.client,
+        REPLICA_ID,
+        prefix=REDIS_PREFIX,
+        aging_interval=QUEUE_AGING_SECONDS,
+        visibility_timeout=VISIBILITY_TIMEOUT,
+        cost_fn=lambda job_id: job_cost(job_id),
+        tier_fn=lambda job_id: (jobs.get(job_id) or {}).get("tier") or "other",
+        reorder_window=AFFINITY_WINDOW,
+        max_skips=AFFINITY_MAX_SKIPS,
+    )
+else:
+    job_queue = FairShareScheduler(
+        aging_interval=QUEUE_AGING_SECONDS,
+        weights=USER_WEIGHTS,
+        default_weight=DEFAULT_USER_WEIGHT,
+        max_running_per_user=MAX_JOBS_PER_USER,
+        quantum=COST_QUANTUM_GB,
+        cost_fn=lambda job_id: job_cost(job_id),
+        reorder_window=AFFINITY_WINDOW,
+        max_skips=AFFINITY_MAX_SKIPS,
+    )
 running_jobs: List[str] = []
+running_cost: Dict[str, float] = {}  # job id -> estimated GB held while running
+running_tasks: Dict[str, asyncio.Task] = {}
+shutting_down = False
+drain_task: Optional[asyncio.Task] = None  # started by the first shutdown signal
+warmed_up = False  # workers started and PRELOAD_MODELS loaded
+events = EventBus()
+result_cache = ResultCache(RESULT_CACHE_SIZE)
+latency_model = LatencyModel(ROUTING_EWMA_ALPHA)
+trace_exporter = TraceExporter(TRACE_EXPORT_PATH, TRACE_FORMAT) if TRACE_EXPORT_PATH else None
+job_traces: Dict[str, JobTrace] = {}  # job id -> trace of a job this process is handling
+model_sizes = ModelSizeIndex(os.path.join(COMFYUI_PATH, "models"))
+output_store = OutputStore(JOB_OUTPUT_ROOT, int(OUTPUT_QUOTA_GB * 1e9))
+blob_store = BlobStore(BLOB_ROOT, int(MAX_BLOB_MB * 1024 * 1024))
+renditions = RenditionPipeline(RENDITIONS, FFMPEG_PATH, RENDITION_PROCESSES, RENDITION_TIMEOUT, PREVIEW_HEIGHT)
+postprocess_tasks: set = set()
+
+# Prometheus metrics (GET /metrics)
+metrics = MetricsRegistry()
+jobs_submitted = metrics.counter("comfyui_jobs_submitted_total", "Jobs accepted into the queue", ["tier"])
+jobs_finished = metrics.counter("comfyui_jobs_finished_total", "Jobs that reached a final state", ["state", "tier"])
+queue_wait_seconds = metrics.histogram(
+    "comfyui_job_queue_wait_seconds", "Time from submission to start", ["tier"], JOB_BUCKETS
+)
+execution_seconds = metrics.histogram(
+    "comfyui_job_execution_seconds", "Time from start to final state", ["state", "tier"], JOB_BUCKETS
+)
+e2e_seconds = metrics.histogram(
+    "comfyui_job_e2e_seconds", "Time from submission to final state", ["state", "tier"], JOB_BUCKETS
+)
+jobs_rejected = metrics.counter("comfyui_jobs_rejected_total", "Submissions rejected because the queue was full")
+tier_routes = metrics.counter(
+    "comfyui_tier_routes_total", "Submissions routed by latency target", ["requested", "served"]
+)
+request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+requests_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests being served")
+metrics.gauge("comfyui_jobs_queued", "Jobs waiting in the queue", fn=lambda: len(job_queue))
+metrics.gauge("comfyui_jobs_running", "Jobs currently executing", fn=lambda: len(running_jobs))
+metrics.gauge("comfyui_workers_total", "ComfyUI workers in the pool", fn=lambda: len(worker_pool))
+metrics.gauge("comfyui_workers_healthy", "Healthy ComfyUI workers", fn=lambda: worker_pool.healthy_count)
+metrics.gauge("comfyui_workers_busy", "ComfyUI workers executing a prompt", fn=lambda: worker_pool.busy_count)
+metrics.gauge("comfyui_gpu_budget_used_gb", "Estimated GPU memory held by running jobs", fn=lambda: sum(running_cost.values()))
+metrics.gauge("comfyui_output_bytes", "Bytes of finished job outputs on disk", fn=lambda: output_store.used_bytes)
+metrics.gauge("comfyui_event_subscribers", "Open SSE/WebSocket event subscriptions", fn=lambda: events.subscriber_count)
+metrics.gauge("comfyui_queue_estimated_wait_seconds", "Estimated wait of a job submitted now", fn=lambda: expected_wait())
+app.add_middleware(RequestMetricsMiddleware, duration=request_seconds, in_flight=requests_in_flight)
+
+# Long-lived ComfyUI servers, one per concurrent job slot
+worker_pool = ComfyUIWorkerPool.from_config(
+    size=MAX_CONCURRENT_JOBS,
+    comfyui_main=COMFYUI_MAIN,
+    base_port=COMFYUI_BASE_PORT,
+    worker_urls=COMFYUI_WORKER_URLS,
+    output_root=WORKER_OUTPUT_ROOT,
+    extra_args=COMFYUI_WORKER_ARGS,
+    health_interval=WORKER_HEALTH_INTERVAL,
+    startup_timeout=WORKER_STARTUP_TIMEOUT,
+)
+
+TERMINAL_STATES = (JobState.COMPLETED, JobState.FAILED, JobState.CANCELLED, JobState.TIMED_OUT)
+
+# Output files accepted as the job's video, most preferred first
+VIDEO_EXTENSIONS = [".mp4", ".webm", ".gif", ".webp"]
 
 # Request/Response Models
 class GenerateRequest(BaseModel):
     prompt: str
     workflow: dict
-    referenceImage: Optional[str] = None
-    priority: int = 5
+    referenceImage: Optional[str] = None  # inline base64; prefer uploading once and sending the hash
+    referenceImageHash: Optional[str] = None  # SHA-256 returned by POST /api/comfyui/blobs
+    priority: int = 5  # 1 = most urgent, 10 = bulk
+    timeout: Optional[int] = None  # seconds, capped at JOB_TIMEOUT
+    fallbackWorkflows: Optional[List[dict]] = None  # cheaper alternatives (e.g. AnimateDiff for SVD), preferred first
+    latencyTarget: Optional[float] = None  # seconds to result; picks among workflow and fallbackWorkflows
+
+class BatchRequest(BaseModel):
+    shots: List[GenerateRequest]
+    priority: Optional[int] = None  # overrides every shot's priority when set
 
 class JobResponse(BaseModel):
     id: str
@@ -116,6 +290,12 @@ class JobResponse(BaseModel):
     failedReason: Optional[str] = None
 
 # Authentication Helper
+def _verify_id_token(token: str) -> dict:
+    return auth.verify_id_token(token)
+
+# Verified tokens are reused until they expire; cold checks run off the event loop
+token_cache = TokenCache(_verify_id_token, max_entries=TOKEN_CACHE_SIZE, max_workers=AUTH_VERIFY_THREADS)
+
 async def verify_token(authorization: Optional[str] = None) -> Optional[str]:
     """Verify Firebase ID token and return user ID"""
     if not FIREBASE_ENABLED:
@@ -126,96 +306,309 @@ async def verify_token(authorization: Optional[str] = None) -> Optional[str]:
     
     token = authorization.split("Bearer ")[1]
     try:
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = await token_cache.verify(token)
         return decoded_token['uid']
     except Exception as e:
         raise HTTPException(401, f"Invalid token: {e}")
 
+def bearer(authorization: Optional[str], token: Optional[str]) -> Optional[str]:
+    """Authorization header, falling back to a ?token= query parameter (EventSource/WebSocket)"""
+    if not authorization and token:
+        return f"Bearer {token}"
+    return authorization
+
+# Job State Transitions
+def job_event(job: dict) -> dict:
+    """Public snapshot of a job pushed to event subscribers"""
+    return {
+        "jobId": job["id"],
+        "userId": job.get("userId"),
+        "batchId": job.get("batchId"),
+        "state": job["state"],
+        "progress": job.get("progress", 0),
+        "failedReason": job.get("failedReason"),
+        "result": job.get("result"),
+        "version": job.get("version", 0),
+        "timestamp": time.time(),
+    }
+
+def bump_version(job: dict):
+    """Mark a visible change of the job for bulk status clients (see get_jobs_status)"""
+    job["version"] = job.get("version", 0) + 1
+
+def set_job_state(job: dict, state: JobState, **fields):
+    """Apply a state transition, persist it and notify subscribers"""
+    job_stats.transitioned(job, job["state"], state)
+    job["state"] = state
+    job.update(fields)
+    trace_transition(job, state)
+    bump_version(job)
+    jobs.save(job)
+    observe_job(job)
+    events.publish(job_event(job))
+
+def trace_context(traceparent: Optional[str], auth_started: int) -> dict:
+    """Trace fields of a new job: the client's trace (W3C traceparent) or a new one, and the auth span"""
+    trace_id, parent_span_id = parse_traceparent(traceparent)
+    context = {"traceId": trace_id or new_trace_id(), "authNs": [auth_started, time.time_ns()]}
+    if parent_span_id:
+        context["parentSpanId"] = parent_span_id
+    return context
+
+def job_trace(job: dict) -> JobTrace:
+    """Trace of a job handled here, started from the context recorded at submission"""
+    trace = job_traces.get(job["id"])
+    if trace is None:
+        if not job.get("traceId"):
+            job["traceId"] = new_trace_id()  # submitted before tracing existed
+        trace = JobTrace(job["id"], job["traceId"], job.get("parentSpanId"), int(job["createdAt"] * 1e9))
+        if job.get("authNs"):
+            trace.add("auth", *job["authNs"])
+        job_traces[job["id"]] = trace
+    return trace
+
+def trace_transition(job: dict, state: JobState):
+    """Record the queue wait of a starting job, or sum up the phases of a finished one"""
+    if state == JobState.RUNNING and job.get("startedAt"):
+        job_trace(job).add("queue_wait", int(job["createdAt"] * 1e9), int(job["startedAt"] * 1e9))
+    elif state in TERMINAL_STATES:
+        job["phases"] = job_trace(job).durations()
+        # Renditions are encoded after completion; render_renditions ends those traces
+        if not (state == JobState.COMPLETED and renditions.enabled):
+            end_trace(job)
+
+def end_trace(job: dict):
+    """Close a job's root span and export the trace"""
+    trace = job_traces.pop(job["id"], None)
+    if trace is None:
+        return
+    trace.end(**{"job.state": JobState(job["state"]).value, "job.tier": job.get("tier") or "other"})
+    if trace_exporter is not None:
+        asyncio.get_running_loop().run_in_executor(None, export_trace, trace)
+
+def export_trace(trace: JobTrace):
+    try:
+        trace_exporter.export(trace)
+    except OSError as e:
+        print(f"⚠️ Trace export failed: {e}")
+
+def observe_job(job: dict):
+    """Record latency metrics for a job that just started or finished"""
+    state = JobState(job["state"]).value
+    tier = job.get("tier") or "other"
+    if state == JobState.RUNNING and job.get("startedAt"):
+        queue_wait_seconds.observe(job["startedAt"] - job["createdAt"], tier=tier)
+    elif job["state"] in TERMINAL_STATES:
+        completed_at = job.get("completedAt") or time.time()
+        jobs_finished.inc(state=state, tier=tier)
+        e2e_seconds.observe(completed_at - job["createdAt"], state=state, tier=tier)
+        if job.get("startedAt"):
+            execution_seconds.observe(completed_at - job["startedAt"], state=state, tier=tier)
+            if state == JobState.COMPLETED:
+                latency_model.observe(tier, completed_at - job["startedAt"])
+
+def set_job_progress(job: dict, progress: float):
+    """Update progress of a running job and notify subscribers"""
+    job["progress"] = progress
+    bump_version(job)
+    jobs.save_progress(job)
+    events.publish(job_event(job))
+
 # Job Processing
 async def process_job(job_id: str):
     """Process a ComfyUI job in background"""
+    job = jobs.get(job_id)
     try:
-        job = jobs[job_id]
-        job["state"] = JobState.RUNNING
-        job["startedAt"] = time.time()
-        job["progress"] = 10
+        set_job_state(job, JobState.RUNNING, startedAt=time.time(), progress=10)
         
         workflow = job["workflow"]
+        loop = asyncio.get_running_loop()
+        trace = job_trace(job)
         
-        # Save workflow to temp file
-        workflow_path = f"/tmp/workflow_{job_id}.json"
-        with open(workflow_path, 'w') as f:
-            json.dump(workflow, f, indent=2)
-        
-        job["progress"] = 20
+        output_dir = output_store.job_dir(job_id)  # created by the worker pool before dispatch
         
-        # Determine output directory
-        output_dir = f"/tmp/comfyui_output_{job_id}"
-        os.makedirs(output_dir, exist_ok=True)
+        set_job_progress(job, 20)
         
-        # Execute ComfyUI
-        # Note: This is a simplified version. 
-        # In production, use ComfyUI's Python API directly or websocket API
+        # Execute on a pooled ComfyUI server (models stay loaded between jobs)
         print(f"🎬 Executing ComfyUI for job {job_id}...")
         
-        job["progress"] = 30
+        set_job_progress(job, 30)
         
-        # Simulated execution (replace with actual ComfyUI call)
-        # Real implementation would use ComfyUI's server.py with websocket
-        cmd = [
-            "python",
-            f"{COMFYUI_PATH}/main.py",
-            "--input", workflow_path,
-            "--output", output_dir,
-        ]
+        def on_progress(fraction: float):
+            set_job_progress(job, round(30 + 50 * fraction, 1))
         
-        # For now, simulate with sleep (replace with actual subprocess.run)
-        await asyncio.sleep(10)  # Simulate processing time
+        # Deadline covers the whole job; wait_for cancels the run, which interrupts ComfyUI
+        remaining = job.get("timeout", JOB_TIMEOUT) - (time.time() - job["startedAt"])
+        run = worker_pool.run(workflow, output_dir, on_progress, job.get("models", ()), trace.span)
+        outputs = await asyncio.wait_for(run, timeout=remaining)
         
-        job["progress"] = 80
+        set_job_progress(job, 80)
         
-        # Parse output (simplified - actual implementation needs to read ComfyUI output)
-        # In real scenario, ComfyUI saves files to output/ directory
-        output_files = list(Path(output_dir).glob("*.mp4"))
+        output_files = sorted(
+            (Path(p) for p in outputs if Path(p).suffix.lower() in VIDEO_EXTENSIONS),
+            key=lambda p: VIDEO_EXTENSIONS.index(p.suffix.lower())
+        )
         
         if output_files:
-            # Read video file and convert to base64
+            # Reference the video on disk; clients stream it from the artifact endpoint
             video_path = output_files[0]
-            with open(video_path, 'rb') as f:
-                video_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            job["result"] = {
-                "imageData": f"data:video/mp4;base64,{video_data}",
+            with trace.span("finalize"):
+                artifact = await loop.run_in_executor(
+                    None, artifact_info, str(video_path), f"/api/comfyui/job/{job_id}/artifact"
+                )
+            result = {
+                "artifact": artifact,
                 "videoPath": str(video_path)
             }
-            job["state"] = JobState.COMPLETED
-            job["progress"] = 100
-            job["completedAt"] = time.time()
+            set_job_state(job, JobState.COMPLETED, result=result, progress=100, completedAt=time.time())
             print(f"✅ Job {job_id} completed successfully")
+            await track_output(job_id)
+            if renditions.enabled:
+                # Outside the job's worker slot: the next render can start meanwhile
+                task = asyncio.create_task(render_renditions(job_id, str(video_path)))
+                postprocess_tasks.add(task)
+                task.add_done_callback(postprocess_tasks.discard)
         else:
             raise Exception("No output video generated")
+    
+    except asyncio.TimeoutError:
+        timeout = job.get("timeout", JOB_TIMEOUT)
+        print(f"⏱️ Job {job_id} timed out after {timeout}s")
+        set_job_state(job, JobState.TIMED_OUT, failedReason=f"Timed out after {timeout}s", completedAt=time.time())
+    
+    except asyncio.CancelledError:
+        if not job.get("cancelRequested"):
+            # Server shutdown: the job store recovers it on restart, but a shared queue
+            # must get it back before release_slot drops the lease
+            if CLUSTERED:
+                set_job_state(job, JobState.QUEUED, progress=0, startedAt=None)
+                job_queue.requeue(job_id)
+            raise
+        print(f"🛑 Job {job_id} cancelled while running")
+        set_job_state(job, JobState.CANCELLED, failedReason="Cancelled by user", completedAt=time.time())
         
     except Exception as e:
         print(f"❌ Job {job_id} failed: {e}")
-        job["state"] = JobState.FAILED
-        job["progress"] = 0
-        job["failedReason"] = str(e)
-        job["completedAt"] = time.time()
+        set_job_state(job, JobState.FAILED, progress=0, failedReason=str(e), completedAt=time.time())
     
     finally:
-        # Remove from running jobs
-        if job_id in running_jobs:
-            running_jobs.remove(job_id)
+        release_slot(job_id)
+        
+        if job["state"] in TERMINAL_STATES and job["state"] != JobState.COMPLETED:
+            await discard_outputs([job_id])
         
         # Start next job in queue
-        await process_queue()
+        if not shutting_down:
+            await process_queue()
+
+# Output Lifecycle
+async def track_output(job_id: str):
+    """Count a completed job's outputs against the disk quota"""
+    size = await asyncio.get_running_loop().run_in_executor(None, dir_size, output_store.job_dir(job_id))
+    output_store.add(job_id, size)
+    await enforce_output_quota()
+
+def rendition_dir(job_id: str) -> str:
+    return os.path.join(output_store.job_dir(job_id), "renditions")
+
+async def render_renditions(job_id: str, video_path: str):
+    """Add poster/preview/web variants to a completed job's result"""
+    try:
+        await add_renditions(job_id, video_path)
+    finally:
+        job = jobs.get(job_id)
+        if job is not None:
+            end_trace(job)
+        else:
+            job_traces.pop(job_id, None)
+
+async def add_renditions(job_id: str, video_path: str):
+    trace = job_traces.get(job_id)
+    started = time.time_ns()
+    paths = await renditions.render(video_path, rendition_dir(job_id))
+    if trace is not None:
+        trace.add("encoding", started, time.time_ns(), renditions=",".join(paths))
+    job = jobs.get(job_id)
+    if job is None or not output_available(job):
+        # Evicted or expired while rendering
+        await asyncio.get_running_loop().run_in_executor(None, output_store.delete, [job_id])
+        return
+    if trace is not None:
+        job["phases"] = trace.durations()
+    if not paths:
+        if trace is not None:
+            jobs.save(job)  # phases now include encoding
+        return
+    
+    loop = asyncio.get_running_loop()
+    variants = {}
+    for name, path in paths.items():
+        variants[name] = await loop.run_in_executor(
+            None, artifact_info, path, f"/api/comfyui/job/{job_id}/artifact/{name}"
+        )
+    job["result"] = {**job["result"], "renditions": variants}
+    bump_version(job)
+    jobs.save(job)
+    events.publish(job_event(job))
+    print(f"🎞️ Job {job_id} renditions: {', '.join(variants)}")
+    await track_output(job_id)
+
+async def enforce_output_quota():
+    """Evict least recently used outputs beyond OUTPUT_QUOTA_GB"""
+    evicted = output_store.select_evictions()
+    for job_id in evicted:
+        job = jobs.get(job_id)
+        if job is not None and job.get("result"):
+            job["result"] = {**job["result"], "evicted": True}
+            bump_version(job)
+            jobs.save(job)
+    if evicted:
+        print(f"🧹 Evicted outputs of {len(evicted)} jobs (disk quota)")
+        await discard_outputs(evicted)
+
+async def discard_outputs(job_ids: List[str]):
+    """Delete job output directories off the event loop"""
+    for job_id in job_ids:
+        output_store.forget(job_id)
+    await asyncio.get_running_loop().run_in_executor(None, output_store.delete, job_ids)
+
+def output_available(job: dict) -> bool:
+    result = job.get("result") or {}
+    return bool(result.get("videoPath")) and not result.get("evicted") and os.path.exists(result["videoPath"])
+
+def release_slot(job_id: str):
+    """Remove a job from the running set so its worker slot can be reused"""
+    if job_id in running_jobs:
+        running_jobs.remove(job_id)
+    running_cost.pop(job_id, None)
+    running_tasks.pop(job_id, None)
+    job_queue.job_finished(job_id)
+
+def models_resident(job_id: str) -> bool:
+    """True if an idle worker already has this queued job's models loaded"""
+    models = (jobs.get(job_id) or {}).get("models")
+    return bool(models) and worker_pool.holds_models(models)
+
+def job_cost(job_id: str) -> float:
+    """Estimated GPU memory (GB) of a job, as recorded at submission"""
+    return (jobs.get(job_id) or {}).get("cost", 0.0)
+
+def budget_remaining() -> float:
+    """GPU memory left for new jobs; an idle GPU admits any one job, however large"""
+    if GPU_MEMORY_BUDGET_GB <= 0 or not running_jobs:
+        return math.inf
+    return GPU_MEMORY_BUDGET_GB - sum(running_cost.values())
 
 async def process_queue():
-    """Process jobs from queue if workers available"""
+    """Start queued jobs while a worker is free and their cost fits the GPU budget"""
     while job_queue and len(running_jobs) < MAX_CONCURRENT_JOBS:
-        job_id = job_queue.pop(0)
+        # Within the reorder window, start jobs whose checkpoints are already loaded
+        job_id = job_queue.pop(prefer=models_resident, max_cost=budget_remaining())
+        if job_id is None:
+            break  # users at MAX_JOBS_PER_USER, or the next job must wait for memory
         running_jobs.append(job_id)
-        asyncio.create_task(process_job(job_id))
+        running_cost[job_id] = job_cost(job_id)
+        running_tasks[job_id] = asyncio.create_task(process_job(job_id))
 
 # API Endpoints
 
@@ -227,6 +620,14 @@ async def root():
         "status": "running"
     }
 
+def budget_stats() -> dict:
+    used = sum(running_cost.values())
+    return {
+        "totalGb": GPU_MEMORY_BUDGET_GB,
+        "usedGb": round(used, 2),
+        "freeGb": round(max(GPU_MEMORY_BUDGET_GB - used, 0), 2) if GPU_MEMORY_BUDGET_GB > 0 else None,
+    }
+
 @app.get("/health/detailed")
 async def health_check():
     """Health check with system statistics"""
@@ -234,14 +635,29 @@ async def health_check():
         "success": True,
         "timestamp": time.time(),
         "workers": {
-            "totalWorkers": MAX_CONCURRENT_JOBS,
-            "healthyWorkers": MAX_CONCURRENT_JOBS,
+            "totalWorkers": len(worker_pool),
+            "healthyWorkers": worker_pool.healthy_count,
             "runningJobs": len(running_jobs)
         },
+        "budget": budget_stats(),
         "queue": {
             "pending": len(job_queue),
             "running": len(running_jobs),
-            "total": len(jobs)
+            "completed": job_stats.count(JobState.COMPLETED),
+            "failed": job_stats.count(JobState.FAILED),
+            "cancelled": job_stats.count(JobState.CANCELLED),
+            "timedOut": job_stats.count(JobState.TIMED_OUT),
+            "total": job_stats.total
+        },
+        "ready": readiness(),
+        "cache": result_cache.stats(),
+        "auth": token_cache.stats(),
+        "disk": output_store.usage(),
+        "renditions": renditions.stats(),
+        "routing": {
+            "expectedWaitSeconds": round(expected_wait(), 1),
+            "maxWaitSeconds": MAX_QUEUE_WAIT_SECONDS or None,
+            "tiers": latency_model.stats(),
         },
         "comfyui": {
             "path": COMFYUI_PATH,
@@ -249,43 +665,450 @@ async def health_check():
         }
     }
 
+def readiness() -> str:
+    if shutting_down:
+        return "draining"
+    if not warmed_up:
+        return "warming_up"
+    if worker_pool.healthy_count == 0:
+        return "no_workers"
+    return "ready"
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 until workers are warm, and again while draining for shutdown"""
+    status = readiness()
+    return JSONResponse(
+        {
+            "status": status,
+            "healthyWorkers": worker_pool.healthy_count,
+            "preloadedModels": PRELOAD_MODELS,
+        },
+        status_code=200 if status == "ready" else 503,
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
 @app.post("/api/comfyui/generate")
 async def generate_video(
     req: GenerateRequest,
     background_tasks: BackgroundTasks,
-    authorization: str = Header(None)
+    authorization: str = Header(None),
+    traceparent: Optional[str] = Header(None)
 ):
     """Submit video generation job"""
     
     # Verify authentication
+    auth_started = time.time_ns()
     user_id = await verify_token(authorization)
+    trace = trace_context(traceparent, auth_started)
+    if shutting_down:
+        raise HTTPException(503, "Server is shutting down")
+    
+    # Reject before storing uploads or routing while the queue holds more than MAX_QUEUE_WAIT_SECONDS of work
+    wait = expected_wait()
+    admit(wait)
+    
+    reference = await resolve_reference_image(req)
+    routing = route_request(req, wait)
+    
+    # Reuse an identical finished or in-flight job instead of rendering again
+    fingerprint = request_fingerprint(user_id, req.prompt, req.workflow, reference)
+    duplicate = find_duplicate_job(fingerprint, req.priority) if RESULT_CACHE_SIZE > 0 else None
+    if duplicate is not None:
+        print(f"♻️ Duplicate request reuses job {duplicate['id']} ({duplicate['state']})")
+        return {"data": {**submission_info(duplicate), "deduplicated": True}}
     
     # Create job
-    job_id = str(uuid.uuid4())
-    jobs[job_id] = {
-        "id": job_id,
+    job = new_job(req, user_id, fingerprint, reference_image=reference, routing=routing, trace=trace)
+    job.update(job_eta(job, wait))
+    jobs.add(job)
+    enqueue_job(job)
+    print(f"📥 Job {job['id']} queued (user: {user_id})")
+    
+    # Start processing if workers available
+    background_tasks.add_task(process_queue)
+    
+    return {"data": submission_info(job)}
+
+def submission_info(job: dict) -> dict:
+    """Ids and ETA returned for a submission, from the (possibly pre-existing) job it maps to"""
+    return {
+        "jobId": job["id"],
+        "traceId": job.get("traceId"),
+        "estimatedWaitSeconds": job.get("estimatedWaitSeconds"),
+        "eta": job.get("eta"),
+    }
+
+def new_job(
+    req: GenerateRequest,
+    user_id: str,
+    fingerprint: str,
+    batch_id: Optional[str] = None,
+    reference_image: Optional[str] = None,
+    routing: Optional[dict] = None,
+    trace: Optional[dict] = None,
+) -> dict:
+    """Job record for a generation request (not yet stored or queued)"""
+    job = {
+        "id": str(uuid.uuid4()),
         "state": JobState.QUEUED,
         "progress": 0,
         "userId": user_id,
         "createdAt": time.time(),
         "workflow": req.workflow,
         "prompt": req.prompt,
-        "referenceImage": req.referenceImage,
-        "priority": req.priority
+        "referenceImageHash": reference_image,
+        "priority": req.priority,
+        "timeout": min(req.timeout or JOB_TIMEOUT, JOB_TIMEOUT),
+        "tier": detect_tier(req.workflow),
+        "models": required_models(req.workflow),
+        "cost": estimate_cost(req.workflow, model_sizes),
+        "fingerprint": fingerprint,
+        "version": 1,
+        **(trace or {"traceId": new_trace_id()})
+    }
+    if batch_id is not None:
+        job["batchId"] = batch_id
+    if routing is not None:
+        job["routing"] = routing
+    return job
+
+def queue_depth() -> Dict[str, Dict[str, int]]:
+    """Queued and running jobs per tier"""
+    if CLUSTERED:
+        # Local counts miss jobs submitted here but run elsewhere, and vice versa
+        return job_queue.depth()
+    return {
+        tier: {state: max(counts.get(state, 0), 0) for state in (JobState.QUEUED.value, JobState.RUNNING.value)}
+        for tier, counts in job_stats.by_tier.items()
+    }
+
+def expected_wait(depth: Optional[Dict[str, Dict[str, int]]] = None) -> float:
+    """Seconds until a job submitted now starts, from the queue ``depth`` (default: current)"""
+    slots = MAX_CONCURRENT_JOBS * (job_queue.replicas() if CLUSTERED else 1)
+    return latency_model.expected_wait(queue_depth() if depth is None else depth, slots)
+
+def job_eta(job: dict, wait: float) -> dict:
+    """Expected start and completion of a job queued behind ``wait`` seconds of work"""
+    seconds = wait + latency_model.runtime(job.get("tier") or "other")
+    return {
+        "estimatedWaitSeconds": round(wait, 1),
+        "estimatedSeconds": round(seconds, 1),
+        "eta": round(time.time() + seconds, 1),
+    }
+
+def admit(wait: float):
+    """Reject a submission with 429 while the estimated wait exceeds MAX_QUEUE_WAIT_SECONDS"""
+    if MAX_QUEUE_WAIT_SECONDS <= 0 or wait <= MAX_QUEUE_WAIT_SECONDS:
+        return
+    jobs_rejected.inc()
+    # Without new submissions the wait shrinks by about a second per second
+    retry_after = max(math.ceil(wait - MAX_QUEUE_WAIT_SECONDS), 1)
+    raise HTTPException(
+        429,
+        f"Queue is full: estimated wait {wait:.0f}s exceeds {MAX_QUEUE_WAIT_SECONDS:.0f}s",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+def route_request(req: GenerateRequest, wait: float) -> Optional[dict]:
+    """
+    Replace ``req.workflow`` by the alternative that meets ``req.latencyTarget``
+    behind ``wait`` seconds of queued work; returns the routing decision recorded on the job.
+    """
+    if req.latencyTarget is None or not req.fallbackWorkflows:
+        return None
+    candidates = [req.workflow, *req.fallbackWorkflows]
+    tiers = [detect_tier(workflow) for workflow in candidates]
+    index, eta = latency_model.choose(tiers, wait, req.latencyTarget)
+    req.workflow = candidates[index]
+    tier_routes.inc(requested=tiers[0], served=tiers[index])
+    if index > 0:
+        print(f"🔀 Routed {tiers[0]} request to {tiers[index]} (expected {eta:.0f}s, target {req.latencyTarget:.0f}s)")
+    return {
+        "requestedTier": tiers[0],
+        "servedTier": tiers[index],
+        "downgraded": index > 0,
+        "latencyTarget": req.latencyTarget,
+        "expectedSeconds": round(eta, 1),
+        "expectedWaitSeconds": round(wait, 1),
+    }
+
+def enqueue_job(job: dict):
+    """Count, announce and queue a job that has just been stored"""
+    job_stats.created(job)
+    jobs_submitted.inc(tier=job.get("tier") or "other")
+    events.publish(job_event(job))
+    if RESULT_CACHE_SIZE > 0:
+        result_cache.put(job["fingerprint"], job["id"])
+    job_queue.push(job["id"], job["priority"], job["createdAt"], job["userId"], job.get("batchId"))
+
+def find_duplicate_job(fingerprint: str, priority: int) -> Optional[dict]:
+    """Job that already produced or is producing this exact request, if any"""
+    job_id = result_cache.get(fingerprint)
+    job = jobs.get(job_id) if job_id else None
+    
+    if job is not None and job["state"] in (JobState.QUEUED, JobState.RUNNING):
+        result_cache.record_coalesced()
+        # A more urgent duplicate promotes the queued original
+        if job["state"] == JobState.QUEUED and priority < job.get("priority", 5):
+            job["priority"] = priority
+            job_queue.push(job["id"], priority, job["createdAt"], job["userId"], job.get("batchId"))
+        return job
+    
+    if job is not None and job["state"] == JobState.COMPLETED and output_available(job):
+        result_cache.record_hit()
+        output_store.touch(job["id"])
+        return job
+    
+    # Failed, cancelled, evicted or output deleted: render again
+    if job_id:
+        result_cache.discard(fingerprint)
+    result_cache.record_miss()
+    return None
+
+@app.post("/api/comfyui/batch")
+async def generate_batch(
+    req: BatchRequest,
+    background_tasks: BackgroundTasks,
+    authorization: str = Header(None),
+    traceparent: Optional[str] = Header(None)
+):
+    """Submit all shots of a scene as one batch"""
+    auth_started = time.time_ns()
+    user_id = await verify_token(authorization)
+    trace = trace_context(traceparent, auth_started)  # one trace for the whole scene
+    if shutting_down:
+        raise HTTPException(503, "Server is shutting down")
+    
+    if not req.shots:
+        raise HTTPException(400, "Batch has no shots")
+    if len(req.shots) > MAX_BATCH_SIZE:
+        raise HTTPException(413, f"Batch exceeds {MAX_BATCH_SIZE} shots")
+    
+    # Admit before storing uploads, routing or deduplicating any shot, so a rejected batch
+    # changes nothing. The last shot waits behind the rest of the batch (at the requested tiers).
+    depth = queue_depth()  # grows with the shots queued ahead in this batch
+    projected = {tier: dict(counts) for tier, counts in depth.items()}
+    for shot in req.shots[:-1]:
+        counts = projected.setdefault(detect_tier(shot.workflow), {})
+        counts[JobState.QUEUED.value] = counts.get(JobState.QUEUED.value, 0) + 1
+    admit(expected_wait(projected))
+    
+    # Scenes repeat the character reference in every shot: store it once
+    resolved: Dict[str, str] = {}
+    references = [await resolve_reference_image(shot, resolved) for shot in req.shots]
+    
+    batch_id = str(uuid.uuid4())
+    job_ids: List[str] = []
+    new_jobs: List[dict] = []
+    created: Dict[str, str] = {}  # fingerprint -> job id, for repeats within the batch
+    deduplicated = 0
+    
+    for shot, reference in zip(req.shots, references):
+        if req.priority is not None:
+            shot.priority = req.priority
+        wait = expected_wait(depth)
+        routing = route_request(shot, wait)
+        fingerprint = request_fingerprint(user_id, shot.prompt, shot.workflow, reference)
+        duplicate_id = created.get(fingerprint)
+        if duplicate_id is None and RESULT_CACHE_SIZE > 0:
+            duplicate_id = (find_duplicate_job(fingerprint, shot.priority) or {}).get("id")
+        if duplicate_id is not None:
+            # Shared with another submission; batch cancel leaves it alone
+            job_ids.append(duplicate_id)
+            deduplicated += 1
+            continue
+        
+        job = new_job(shot, user_id, fingerprint, batch_id, reference, routing, dict(trace))
+        job.update(job_eta(job, wait))
+        counts = depth.setdefault(job["tier"], {})
+        counts[JobState.QUEUED.value] = counts.get(JobState.QUEUED.value, 0) + 1
+        new_jobs.append(job)
+        created[fingerprint] = job["id"]
+        job_ids.append(job["id"])
+    
+    batch = {
+        "id": batch_id,
+        "userId": user_id,
+        "createdAt": time.time(),
+        "jobIds": job_ids,
     }
     
-    # Add to queue
-    job_queue.append(job_id)
-    print(f"📥 Job {job_id} queued (user: {user_id})")
+    # One transaction, and no await until every shot is queued
+    jobs.add_batch(batch, new_jobs)
+    for job in new_jobs:
+        enqueue_job(job)
+    print(f"📦 Batch {batch_id} queued: {len(new_jobs)} jobs, {deduplicated} reused (user: {user_id})")
     
-    # Start processing if workers available
     background_tasks.add_task(process_queue)
     
-    return {"data": {"jobId": job_id}}
+    return {
+        "data": {
+            "batchId": batch_id,
+            "jobIds": job_ids,
+            "deduplicated": deduplicated,
+            "traceId": trace["traceId"],
+            "eta": max((job["eta"] for job in new_jobs), default=None),  # last new shot
+        }
+    }
+
+async def resolve_reference_image(req: GenerateRequest, resolved: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """Blob hash of a request's reference image, storing an inline image first"""
+    if req.referenceImageHash:
+        digest = req.referenceImageHash.lower()
+        if not await asyncio.get_running_loop().run_in_executor(None, blob_store.exists, digest):
+            raise HTTPException(400, "Unknown referenceImageHash; upload the image to /api/comfyui/blobs first")
+        blob_store.touch(digest)
+        return digest
+    
+    if not req.referenceImage:
+        return None
+    if resolved is not None and req.referenceImage in resolved:
+        return resolved[req.referenceImage]
+    
+    def store_inline(value: str) -> str:
+        return blob_store.put(decode_data_url(value))[0]
+    
+    try:
+        digest = await asyncio.get_running_loop().run_in_executor(None, store_inline, req.referenceImage)
+    except BlobTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if resolved is not None:
+        resolved[req.referenceImage] = digest
+    return digest
+
+@app.post("/api/comfyui/blobs")
+async def upload_blob(
+    request: Request,
+    authorization: str = Header(None)
+):
+    """Upload a reference image (raw bytes) once; jobs refer to it by the returned SHA-256"""
+    await verify_token(authorization)
+    
+    length = request.headers.get("content-length")  # absent for chunked uploads
+    if length is not None and not length.strip().isdigit():
+        raise HTTPException(400, "Invalid Content-Length header")
+    declared = int(length or 0)
+    if 0 < blob_store.max_blob_bytes < declared:
+        raise HTTPException(413, f"Blob exceeds {blob_store.max_blob_bytes} bytes")
+    
+    loop = asyncio.get_running_loop()
+    upload = await loop.run_in_executor(None, blob_store.upload)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await loop.run_in_executor(None, upload.write, chunk)
+        if upload.size == 0:
+            raise HTTPException(400, "Empty upload")
+        digest, created = await loop.run_in_executor(None, upload.commit)
+    except BlobTooLarge as e:
+        await loop.run_in_executor(None, upload.abort)
+        raise HTTPException(413, str(e))
+    except BaseException:
+        await loop.run_in_executor(None, upload.abort)
+        raise
+    
+    return {"data": {"hash": digest, "size": upload.size, "deduplicated": not created}}
+
+@app.api_route("/api/comfyui/blobs/{digest}", methods=["GET", "HEAD"])
+async def get_blob(
+    digest: str,
+    request: Request,
+    authorization: str = Header(None)
+):
+    """Fetch an uploaded blob; HEAD tells a client whether it still has to upload it.
+    
+    Blobs are shared by all users on purpose: they are content-addressed, so the same image
+    uploaded by two users is stored once, and fetching one requires already knowing its SHA-256.
+    """
+    await verify_token(authorization)
+    
+    if not await asyncio.get_running_loop().run_in_executor(None, blob_store.exists, digest):
+        raise HTTPException(404, "Blob not found")
+    return RangeFileResponse(blob_store.path(digest), request.headers, method=request.method)
+
+def get_owned_batch(batch_id: str, user_id: str) -> dict:
+    batch = jobs.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(404, "Batch not found")
+    if FIREBASE_ENABLED and batch["userId"] != user_id:
+        raise HTTPException(403, "Not authorized to access this batch")
+    return batch
+
+def batch_status(batch: dict) -> dict:
+    """Aggregate state and progress of a batch's jobs"""
+    counts: Dict[str, int] = {}
+    shots = []
+    done = 0.0
+    for job_id in batch["jobIds"]:
+        job = jobs.get(job_id)
+        state = JobState(job["state"]).value if job else "expired"
+        counts[state] = counts.get(state, 0) + 1
+        progress = job.get("progress", 0) if job and state in ("queued", "running") else 100
+        done += progress
+        shots.append({"jobId": job_id, "state": state, "progress": progress})
+    
+    total = len(batch["jobIds"])
+    if counts.get("running") or (counts.get("queued") and counts["queued"] < total):
+        state = "running"
+    elif counts.get("queued"):
+        state = "queued"
+    elif counts.get("completed") == total:
+        state = "completed"
+    elif counts.get("completed"):
+        state = "partial"
+    elif counts.get("cancelled"):
+        state = "cancelled"
+    else:
+        state = "failed"
+    
+    return {
+        "batchId": batch["id"],
+        "state": state,
+        "progress": round(done / total, 1) if total else 100,
+        "total": total,
+        "counts": counts,
+        "createdAt": batch["createdAt"],
+        "jobs": shots,
+    }
+
+@app.get("/api/comfyui/batch/{batch_id}")
+async def get_batch_status(
+    batch_id: str,
+    authorization: str = Header(None)
+):
+    """Aggregate progress of a batch"""
+    user_id = await verify_token(authorization)
+    batch = get_owned_batch(batch_id, user_id)
+    return {"data": batch_status(batch)}
+
+@app.delete("/api/comfyui/batch/{batch_id}")
+async def cancel_batch(
+    batch_id: str,
+    authorization: str = Header(None)
+):
+    """Cancel every queued or running job of a batch"""
+    user_id = await verify_token(authorization)
+    batch = get_owned_batch(batch_id, user_id)
+    
+    pending = [
+        job for job in map(jobs.get, batch["jobIds"])
+        if job is not None and job.get("batchId") == batch_id and job["state"] not in TERMINAL_STATES
+    ]
+    await cancel_jobs(pending)
+    
+    return {"success": True, "cancelled": len(pending)}
 
 @app.get("/api/comfyui/job/{job_id}")
 async def get_job_status(
     job_id: str,
+    request: Request,
     authorization: str = Header(None)
 ):
     """Get job status and result"""
@@ -293,16 +1116,280 @@ async def get_job_status(
     # Verify authentication
     user_id = await verify_token(authorization)
     
-    if job_id not in jobs:
+    job = jobs.get(job_id)
+    if job is None:
         raise HTTPException(404, "Job not found")
     
-    job = jobs[job_id]
-    
     # Verify ownership (skip if anonymous)
     if FIREBASE_ENABLED and job["userId"] != user_id:
         raise HTTPException(403, "Not authorized to view this job")
     
-    return {"data": job}
+    return {"data": job_status(job, request)}
+
+def job_status(job: dict, request: Request) -> dict:
+    """Job as returned to clients, with signed artifact URLs"""
+    job_id = job["id"]
+    result = job.get("result")
+    if result and "artifact" in result and not result.get("evicted"):
+        # Signed URL lets the browser download without an Authorization header
+        artifact_url = request.url_for("get_job_artifact", job_id=job_id)
+        query = signed_query(ARTIFACT_URL_SECRET, job_id, ARTIFACT_URL_TTL)
+        result = {**result, "imageUrl": f"{artifact_url}?{query}"}
+        if result.get("renditions"):
+            result["renditions"] = {
+                name: {**info, "signedUrl": f"{request.url_for('get_job_rendition', job_id=job_id, name=name)}?{query}"}
+                for name, info in result["renditions"].items()
+            }
+        job = {**job, "result": result}
+    return job
+
+@app.get("/api/comfyui/jobs")
+async def get_jobs_status(
+    request: Request,
+    ids: str,
+    wait: float = 0,
+    authorization: str = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Status of many jobs in one call.
+    
+    The ETag lists each job's version in ``ids`` order. Sent back as
+    If-None-Match, only jobs that changed since are returned; if none did,
+    the call waits up to ``wait`` seconds for one to change and otherwise
+    answers 304 Not Modified.
+    """
+    user_id = await verify_token(authorization)
+    
+    job_ids = list(dict.fromkeys(job_id for job_id in ids.split(",") if job_id))
+    if not job_ids:
+        raise HTTPException(400, "No job ids")
+    if len(job_ids) > MAX_BULK_JOBS:
+        raise HTTPException(413, f"At most {MAX_BULK_JOBS} job ids per request")
+    known = parse_versions_token(if_none_match, len(job_ids))
+    deadline = time.monotonic() + min(max(wait, 0), MAX_LONG_POLL_SECONDS)
+    
+    # Subscribe before reading so a change in between still wakes us up
+    with events.subscribe(user_id=user_id) as subscription:
+        while True:
+            found = {job_id: visible_job(job_id, user_id) for job_id in job_ids}
+            versions = [job.get("version", 0) if job is not None else 0 for job in found.values()]
+            if versions != known:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or subscription.ended:
+                return Response(status_code=304, headers={"etag": versions_token(versions), "cache-control": "no-cache"})
+            # Other replicas' updates are not published here: re-read the store periodically
+            await wait_for_job_event(subscription, set(job_ids), min(remaining, QUEUE_POLL_INTERVAL) if CLUSTERED else remaining)
+    
+    changed = [
+        job_id for job_id, version, old in zip(job_ids, versions, known or [None] * len(job_ids))
+        if version != old and found[job_id] is not None
+    ]
+    return JSONResponse(
+        {
+            "data": {
+                "jobs": [status_summary(job_status(found[job_id], request)) for job_id in changed],
+                "unchanged": [job_id for job_id in job_ids if job_id not in changed and found[job_id] is not None],
+                "missing": [job_id for job_id in job_ids if found[job_id] is None],
+            }
+        },
+        headers={"etag": versions_token(versions), "cache-control": "no-cache"},
+    )
+
+def visible_job(job_id: str, user_id: str) -> Optional[dict]:
+    """The job if it exists and the caller may see it (others' jobs look missing)"""
+    job = jobs.get(job_id)
+    if job is None or (FIREBASE_ENABLED and job["userId"] != user_id):
+        return None
+    return job
+
+def status_summary(job: dict) -> dict:
+    """Job status without the request payload (workflow, reference image)"""
+    return {key: value for key, value in job.items() if key not in HEAVY_FIELDS}
+
+def versions_token(versions: List[int]) -> str:
+    return '"' + ".".join(map(str, versions)) + '"'
+
+def parse_versions_token(header: Optional[str], count: int) -> Optional[List[int]]:
+    """Per-job versions from an If-None-Match token, or None if absent or not for this id list"""
+    if not header:
+        return None
+    token = header.split(",")[0].strip()
+    if token.startswith("W/"):
+        token = token[2:]
+    try:
+        versions = [int(v) for v in token.strip('"').split(".")]
+    except ValueError:
+        return None
+    return versions if len(versions) == count else None
+
+async def wait_for_job_event(subscription, job_ids: set, timeout: float):
+    """Return when one of ``job_ids`` is published or ``timeout`` elapses"""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        event = await subscription.get(timeout=remaining)
+        if event is None or event["jobId"] in job_ids:
+            return
+
+@app.api_route("/api/comfyui/job/{job_id}/artifact", methods=["GET", "HEAD"])
+async def get_job_artifact(
+    job_id: str,
+    request: Request,
+    expires: Optional[int] = None,
+    sig: Optional[str] = None,
+    authorization: str = Header(None)
+):
+    """Stream a job's output file (supports Range, ETag and If-None-Match)"""
+    job = await get_artifact_job(job_id, expires, sig, authorization)
+    output_store.touch(job_id)
+    return RangeFileResponse(job["result"]["videoPath"], request.headers, method=request.method)
+
+@app.api_route("/api/comfyui/job/{job_id}/artifact/{name}", methods=["GET", "HEAD"])
+async def get_job_rendition(
+    job_id: str,
+    name: str,
+    request: Request,
+    expires: Optional[int] = None,
+    sig: Optional[str] = None,
+    authorization: str = Header(None)
+):
+    """Stream a smaller variant of a job's output (poster, preview or web)"""
+    job = await get_artifact_job(job_id, expires, sig, authorization)
+    if name not in (job["result"].get("renditions") or {}):
+        raise HTTPException(404, f"Rendition {name} not available")
+    path = os.path.join(rendition_dir(job_id), rendition_filename(name))
+    if not os.path.exists(path):
+        raise HTTPException(404, f"Rendition {name} not available")
+    
+    output_store.touch(job_id)
+    return RangeFileResponse(path, request.headers, method=request.method)
+
+async def get_artifact_job(job_id: str, expires: Optional[int], sig: Optional[str], authorization: Optional[str]) -> dict:
+    """Job whose output may be served to this caller (signed URL or owner)"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    
+    if not verify_artifact_signature(ARTIFACT_URL_SECRET, job_id, expires, sig):
+        user_id = await verify_token(authorization)
+        if FIREBASE_ENABLED and job["userId"] != user_id:
+            raise HTTPException(403, "Not authorized to view this job")
+    
+    if (job.get("result") or {}).get("evicted"):
+        raise HTTPException(410, "Artifact was removed to free disk space")
+    if not output_available(job):
+        raise HTTPException(404, "Artifact not available")
+    return job
+
+async def job_event_stream(subscription, snapshot: List[dict], close_on_terminal: bool):
+    """SSE body: current snapshot first, then live transitions"""
+    with subscription:
+        for job in snapshot:
+            yield format_sse(job_event(job))
+            if close_on_terminal and job["state"] in TERMINAL_STATES:
+                return
+        
+        while True:
+            event = await subscription.get(timeout=EVENT_KEEPALIVE_SECONDS)
+            if subscription.ended:
+                return  # draining: the client reconnects to another replica
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event)
+            if close_on_terminal and event["state"] in TERMINAL_STATES:
+                return
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/api/comfyui/job/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    token: Optional[str] = None,
+    authorization: str = Header(None)
+):
+    """Server-Sent Events stream of one job's state and progress"""
+    user_id = await verify_token(bearer(authorization, token))
+    
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    
+    if FIREBASE_ENABLED and job["userId"] != user_id:
+        raise HTTPException(403, "Not authorized to view this job")
+    if shutting_down:
+        raise HTTPException(503, "Server is shutting down")
+    
+    # Subscribe before taking the snapshot so no transition is missed
+    subscription = events.subscribe(job_id=job_id)
+    return StreamingResponse(
+        job_event_stream(subscription, [job], close_on_terminal=True),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+@app.get("/api/comfyui/events")
+async def stream_user_events(
+    token: Optional[str] = None,
+    authorization: str = Header(None)
+):
+    """Server-Sent Events stream of all jobs belonging to the caller"""
+    user_id = await verify_token(bearer(authorization, token))
+    if shutting_down:
+        raise HTTPException(503, "Server is shutting down")
+    
+    subscription = events.subscribe(user_id=user_id)
+    snapshot = [job for job in jobs.active_jobs() if job["userId"] == user_id]
+    return StreamingResponse(
+        job_event_stream(subscription, snapshot, close_on_terminal=False),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+@app.websocket("/api/comfyui/ws")
+async def job_events_websocket(
+    websocket: WebSocket,
+    jobId: Optional[str] = None,
+    token: Optional[str] = None
+):
+    """WebSocket push of job events (one job with ?jobId=, otherwise all of the caller's jobs)"""
+    try:
+        user_id = await verify_token(bearer(None, token))
+    except HTTPException as e:
+        await websocket.close(code=4401, reason=e.detail)
+        return
+    if shutting_down:
+        await websocket.close(code=1012, reason="Server is shutting down")  # 1012: service restart
+        return
+    
+    if jobId is not None:
+        job = jobs.get(jobId)
+        if job is None or (FIREBASE_ENABLED and job["userId"] != user_id):
+            await websocket.close(code=4404, reason="Job not found")
+            return
+        subscription = events.subscribe(job_id=jobId)
+        snapshot = [job]
+    else:
+        subscription = events.subscribe(user_id=user_id)
+        snapshot = [job for job in jobs.active_jobs() if job["userId"] == user_id]
+    
+    await websocket.accept()
+    try:
+        with subscription:
+            for job in snapshot:
+                await websocket.send_json(job_event(job))
+            while True:
+                event = await subscription.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                if subscription.ended:
+                    await websocket.close(code=1012, reason="Server is shutting down")
+                    return
+                await websocket.send_json(event if event is not None else {"type": "ping"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
 
 @app.get("/api/comfyui/workers")
 async def get_worker_stats(authorization: str = Header(None)):
@@ -311,27 +1398,33 @@ async def get_worker_stats(authorization: str = Header(None)):
     
     return {
         "data": {
-            "total": MAX_CONCURRENT_JOBS,
+            "total": len(worker_pool),
+            "healthy": worker_pool.healthy_count,
             "running": len(running_jobs),
-            "idle": MAX_CONCURRENT_JOBS - len(running_jobs)
+            "idle": worker_pool.healthy_count - worker_pool.busy_count,
+            "budget": budget_stats(),
+            "workers": worker_pool.stats()["workers"]
         }
     }
 
 @app.get("/api/queue/stats")
 async def get_queue_stats(authorization: str = Header(None)):
     """Get queue statistics"""
-    await verify_token(authorization)
-    
-    completed = len([j for j in jobs.values() if j["state"] == JobState.COMPLETED])
-    failed = len([j for j in jobs.values() if j["state"] == JobState.FAILED])
+    user_id = await verify_token(authorization)
     
     return {
         "data": {
             "pending": len(job_queue),
             "running": len(running_jobs),
-            "completed": completed,
-            "failed": failed,
-            "total": len(jobs)
+            "completed": job_stats.count(JobState.COMPLETED),
+            "failed": job_stats.count(JobState.FAILED),
+            "cancelled": job_stats.count(JobState.CANCELLED),
+            "timedOut": job_stats.count(JobState.TIMED_OUT),
+            "total": job_stats.total,
+            "byState": job_stats.state_counts(),
+            "byTier": job_stats.tier_counts(),
+            "user": job_stats.user_counts(user_id),
+            "cache": result_cache.stats()
         }
     }
 
@@ -340,28 +1433,54 @@ async def cancel_job(
     job_id: str,
     authorization: str = Header(None)
 ):
-    """Cancel a queued job"""
+    """Cancel a queued or running job"""
     user_id = await verify_token(authorization)
     
-    if job_id not in jobs:
+    job = jobs.get(job_id)
+    if job is None:
         raise HTTPException(404, "Job not found")
     
-    job = jobs[job_id]
-    
     if FIREBASE_ENABLED and job["userId"] != user_id:
         raise HTTPException(403, "Not authorized to cancel this job")
     
-    if job["state"] == JobState.RUNNING:
-        raise HTTPException(400, "Cannot cancel running job")
+    if job["state"] in TERMINAL_STATES:
+        raise HTTPException(400, f"Job already {JobState(job['state']).value}")
     
-    if job_id in job_queue:
-        job_queue.remove(job_id)
-    
-    job["state"] = JobState.FAILED
-    job["failedReason"] = "Cancelled by user"
+    await cancel_jobs([job])
     
     return {"success": True}
 
+async def cancel_jobs(to_cancel: List[dict]):
+    """Cancel queued and running jobs, waiting briefly for running ones to stop"""
+    # Drop queued jobs first so a finishing task cannot start one of them
+    tasks = []
+    remote = set()
+    for job in to_cancel:
+        task = running_tasks.get(job["id"])
+        if task is None:
+            if job_queue.remove(job["id"]) or not CLUSTERED:
+                set_job_state(job, JobState.CANCELLED, failedReason="Cancelled by user", completedAt=time.time())
+            else:
+                # Claimed by another replica, which stops it on its next heartbeat
+                job_queue.request_cancel(job["id"])
+                remote.add(job["id"])
+        else:
+            # Cancelling the task interrupts ComfyUI and frees the worker slot
+            job["cancelRequested"] = True
+            task.cancel()
+            tasks.append(task)
+    
+    if tasks:
+        await asyncio.wait(tasks, timeout=10)
+    
+    for job in to_cancel:
+        if job["state"] not in TERMINAL_STATES and job["id"] not in remote:
+            # A task cancelled before it got to run
+            release_slot(job["id"])
+            set_job_state(job, JobState.CANCELLED, failedReason="Cancelled by user", completedAt=time.time())
+    
+    await process_queue()
+
 # Startup Event
 @app.on_event("startup")
 async def startup_event():
@@ -372,21 +1491,187 @@ async def startup_event():
     print(f"🔐 Firebase Auth: {'Enabled' if FIREBASE_ENABLED else 'Disabled'}")
     
     # Verify ComfyUI installation
-    if not os.path.exists(COMFYUI_PATH):
+    if COMFYUI_WORKER_URLS:
+        print(f"🔗 Using external ComfyUI workers: {', '.join(COMFYUI_WORKER_URLS)}")
+    elif not os.path.exists(COMFYUI_MAIN):
         print(f"⚠️ WARNING: ComfyUI not found at {COMFYUI_PATH}")
         print("   Please install ComfyUI or set COMFYUI_PATH environment variable")
     else:
         print(f"✅ ComfyUI found at {COMFYUI_PATH}")
+    
+    await worker_pool.start()
+    asyncio.create_task(warm_up())
+    
+    # Track outputs that survived the restart; delete leftovers of unfinished runs
+    orphans = await asyncio.get_running_loop().run_in_executor(None, output_store.scan, has_output)
+    if CLUSTERED:
+        # Other replicas may be writing to a shared output root
+        orphans = [job_id for job_id in orphans if not is_active(jobs.get(job_id) or {})]
+    await discard_outputs(orphans)
+    await enforce_output_quota()
+    print(f"💾 Outputs: {len(output_store)} jobs, {output_store.used_bytes / 1e9:.1f} GB in {JOB_OUTPUT_ROOT}")
+    await asyncio.get_running_loop().run_in_executor(None, model_sizes.refresh)
+    if renditions.enabled:
+        print(f"🎞️ Renditions: {', '.join(renditions.names)} (ffmpeg: {renditions.ffmpeg})")
+    elif RENDITIONS:
+        print(f"⚠️ ffmpeg not found ({FFMPEG_PATH}); renditions disabled")
+    print(f"📦 Indexed {len(model_sizes)} model files for cost estimates")
+    print(f"👷 Worker pool: {worker_pool.healthy_count}/{len(worker_pool)} workers healthy")
+    
+    # Re-queue jobs that were queued or running when the server stopped
+    recovered = jobs.recover()
+    for job in recovered:
+        job.setdefault("cost", estimate_cost(job.get("workflow"), model_sizes))
+        set_job_state(job, JobState.QUEUED, progress=0, startedAt=None)
+        if job.get("fingerprint") and RESULT_CACHE_SIZE > 0:
+            result_cache.put(job["fingerprint"], job["id"])
+        job_queue.push(job["id"], job.get("priority", 5), job["createdAt"], job["userId"], job.get("batchId"))
+    if recovered:
+        print(f"♻️ Recovered {len(recovered)} unfinished jobs from {JOB_STORE} store")
+        await process_queue()
+    
+    asyncio.create_task(evict_expired_jobs())
+    if CLUSTERED:
+        print(f"🌐 Replica {REPLICA_ID} sharing queue at {REDIS_URL} ({REDIS_PREFIX})")
+        asyncio.create_task(poll_shared_queue())
+
+async def warm_up():
+    """Load PRELOAD_MODELS on the idle workers, then report ready on /health/ready"""
+    global warmed_up
+    if PRELOAD_MODELS:
+        started = time.monotonic()
+        try:
+            warmed = await worker_pool.preload(PRELOAD_MODELS)
+            print(f"🔥 Preloaded {', '.join(PRELOAD_MODELS)} on {warmed}/{len(worker_pool)} workers in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            print(f"⚠️ Model preload failed: {e}")
+    warmed_up = True
+
+def has_output(job_id: str) -> bool:
+    """True if the job exists, completed and its output was not evicted"""
+    job = jobs.get(job_id)
+    return job is not None and job["state"] == JobState.COMPLETED and not (job.get("result") or {}).get("evicted")
+
+async def evict_expired_jobs():
+    """Periodically drop finished jobs older than JOB_TTL_SECONDS"""
+    while True:
+        await asyncio.sleep(JOB_EVICT_INTERVAL)
+        try:
+            evicted = jobs.evict_expired(JOB_TTL_SECONDS)
+            for job in evicted:
+                job_stats.removed(job)
+            await discard_outputs([job["id"] for job in evicted])
+            jobs.evict_expired_batches(JOB_TTL_SECONDS)
+            blobs = await asyncio.get_running_loop().run_in_executor(None, blob_store.evict_unused, BLOB_TTL_SECONDS)
+            if blobs:
+                print(f"🧹 Removed {blobs} unused blobs")
+            if evicted:
+                print(f"🧹 Evicted {len(evicted)} expired jobs")
+        except Exception as e:
+            print(f"⚠️ Job eviction failed: {e}")
+
+async def poll_shared_queue():
+    """Keep this replica's leases alive, honour remote cancels and take over jobs of lost replicas"""
+    while True:
+        await asyncio.sleep(QUEUE_POLL_INTERVAL)
+        try:
+            for job_id in job_queue.heartbeat():
+                task = running_tasks.get(job_id)
+                job = jobs.get(job_id)
+                if task is not None and job is not None and not job.get("cancelRequested"):
+                    print(f"🛑 Cancel requested for job {job_id} by another replica")
+                    job["cancelRequested"] = True
+                    task.cancel()
+            
+            for job_id in job_queue.reclaim_expired():
+                job = jobs.get(job_id)
+                if job is not None and job["state"] == JobState.RUNNING:
+                    print(f"♻️ Requeueing job {job_id}: its replica stopped responding")
+                    set_job_state(job, JobState.QUEUED, progress=0, startedAt=None)
+                if job is not None and job["state"] == JobState.QUEUED:
+                    job_queue.requeue(job_id)
+                else:
+                    job_queue.job_finished(job_id)
+            
+            # Jobs submitted to other replicas
+            if not shutting_down:
+                await process_queue()
+        except Exception as e:
+            print(f"⚠️ Shared queue poll failed: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain running jobs (unless a signal already did), then stop workers and flush job store"""
+    global drain_task
+    await start_shutdown()
+    drain_task = None
+    await interrupt_running_jobs()
+    await worker_pool.stop()
+    token_cache.close()
+    jobs.close()
+
+def start_shutdown() -> asyncio.Task:
+    """Stop accepting work, end event streams and start draining running jobs; the drain task is shared"""
+    global shutting_down, drain_task
+    if drain_task is None:
+        shutting_down = True
+        streams = events.end_all()
+        if streams:
+            print(f"🔌 Closed {streams} event streams")
+        drain_task = asyncio.ensure_future(drain(DRAIN_TIMEOUT))
+    return drain_task
+
+async def drain(timeout: float):
+    """
+    Wait up to ``timeout`` seconds for running jobs and their renditions.
+    Queued jobs stay queued: the job store recovers them on restart, and
+    with JOB_STORE=redis other replicas pick them up.
+    """
+    tasks = [*running_tasks.values(), *postprocess_tasks]
+    if not tasks or timeout <= 0:
+        return
+    print(f"⏳ Draining {len(running_tasks)} running jobs (up to {timeout:.0f}s)")
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        print(f"⚠️ Drain timed out with {len(pending)} tasks still running")
+
+async def interrupt_running_jobs():
+    """Cancel jobs still running after the drain, so they are handed back before the store closes"""
+    tasks = list(running_tasks.values())
+    if not tasks:
+        return
+    print(f"🛑 Interrupting {len(tasks)} running jobs")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn server that drains jobs on SIGTERM/SIGINT while still serving.
+
+    uvicorn closes its listeners and waits for open connections before the
+    lifespan shutdown runs, so draining there would cut off status polls and
+    leave event streams hanging. Here the signal first flips readiness to
+    draining and ends event streams; once running jobs are done (or a second
+    Ctrl+C forces exit) uvicorn shuts down as usual, giving open requests
+    ``timeout_graceful_shutdown`` seconds.
+    """
+
+    async def shutdown(self, sockets=None):
+        drained = start_shutdown()
+        while not drained.done() and not self.force_exit:
+            await asyncio.wait({drained}, timeout=0.1)
+        await super().shutdown(sockets)
 
 if __name__ == "__main__":
-    import uvicorn
-    
     port = int(os.getenv("PORT", "8000"))
     host = os.getenv("HOST", "0.0.0.0")
     
-    uvicorn.run(
+    config = uvicorn.Config(
         app,
         host=host,
         port=port,
-        log_level="info"
+        log_level="info",
+        timeout_graceful_shutdown=HTTP_DRAIN_TIMEOUT
     )
+    DrainingServer(config).run()
@@ -0,0 +1,136 @@
+"""
+Output Store for ComfyUI Backend
+================================
+
+Owns the per-job output directories (``<root>/<job_id>/``) and keeps their
+total size under a byte quota.
+
+- Completed jobs are tracked in LRU order; serving or reusing an artifact
+  counts as a use
+- When the quota is exceeded the least recently used outputs are evicted
+  (the most recent one is always kept)
+- Outputs of failed/cancelled jobs and directories left by a crash are
+  deleted outright
+
+Bookkeeping runs on the event loop; ``delete``, ``scan`` and ``dir_size``
+touch the filesystem and are meant to run in an executor.
+"""
+
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional
+
+
+def dir_size(path: str) -> int:
+    """Total size of the files below ``path`` in bytes"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def is_job_id(name: str) -> bool:
+    """Job ids are UUIDs; anything else under the root is not ours to delete"""
+    try:
+        uuid.UUID(name)
+    except ValueError:
+        return False
+    return True
+
+
+class OutputStore:
+    """Per-job output directories under a byte quota with LRU eviction"""
+
+    def __init__(self, root: str, quota_bytes: int = 0):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # job id -> bytes, oldest use first
+        self.used_bytes = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._sizes
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def add(self, job_id: str, size: int):
+        """Track a finished job's output directory of ``size`` bytes"""
+        self.forget(job_id)
+        self._sizes[job_id] = size
+        self.used_bytes += size
+
+    def touch(self, job_id: str):
+        if job_id in self._sizes:
+            self._sizes.move_to_end(job_id)
+
+    def forget(self, job_id: str) -> bool:
+        size = self._sizes.pop(job_id, None)
+        if size is None:
+            return False
+        self.used_bytes -= size
+        return True
+
+    def select_evictions(self) -> List[str]:
+        """Untrack least recently used outputs until the quota is met; returns their job ids"""
+        evicted: List[str] = []
+        if self.quota_bytes <= 0:
+            return evicted
+        while self.used_bytes > self.quota_bytes and len(self._sizes) > 1:
+            job_id, size = self._sizes.popitem(last=False)
+            self.used_bytes -= size
+            evicted.append(job_id)
+        self.evictions += len(evicted)
+        return evicted
+
+    def delete(self, job_ids: Iterable[str]):
+        """Remove the output directories of ``job_ids`` (blocking)"""
+        for job_id in job_ids:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def scan(self, is_completed: Callable[[str], bool]) -> List[str]:
+        """
+        Rebuild tracking from disk after a restart (blocking).
+
+        Directories of completed jobs are tracked, oldest modification first;
+        the ids of all other directories are returned for deletion.
+        """
+        found = []
+        orphans = []
+        for entry in os.scandir(self.root):
+            if not entry.is_dir(follow_symlinks=False) or not is_job_id(entry.name):
+                continue
+            if is_completed(entry.name):
+                found.append((entry.stat().st_mtime, entry.name, dir_size(entry.path)))
+            else:
+                orphans.append(entry.name)
+        for _, job_id, size in sorted(found):
+            self.add(job_id, size)
+        return orphans
+
+    def usage(self) -> dict:
+        try:
+            disk = shutil.disk_usage(self.root)
+            disk_total: Optional[int] = disk.total
+            disk_free: Optional[int] = disk.free
+        except OSError:
+            disk_total = disk_free = None
+        return {
+            "root": self.root,
+            "usedBytes": self.used_bytes,
+            "quotaBytes": self.quota_bytes or None,
+            "jobs": len(self._sizes),
+            "evictions": self.evictions,
+            "diskTotalBytes": disk_total,
+            "diskFreeBytes": disk_free,
+        }
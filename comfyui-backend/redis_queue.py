@@ -0,0 +1,333 @@
+"""
+Shared Job Queue for ComfyUI Backend
+====================================
+
+RedisJobQueue: a priority queue in Redis that several backend replicas
+consume, with the same interface as FairShareScheduler so ``main`` can use
+either.
+
+- Ordering matches JobScheduler: lower priority first, FIFO within a
+  priority, starvation aging through the static ``priority +
+  enqueued_at / aging_interval`` key
+- Claims are atomic (Lua), so exactly one replica starts each job
+- A claimed job holds a lease that its replica extends with ``heartbeat``;
+  when a replica dies its leases expire and ``reclaim_expired`` hands the
+  jobs back to the queue (at-least-once execution)
+- Cancelling a job claimed by another replica sets a flag that the owner
+  picks up on its next heartbeat
+
+- Queued and leased jobs are counted per tier in Redis (``depth``), so
+  every replica sees the cluster-wide queue when estimating waits; live
+  replicas register on each ``heartbeat`` (``replicas``)
+
+Fair share between users and per-user concurrency caps are local-mode
+features; the shared queue orders jobs by priority and age only. Bounded
+reordering for model affinity (``prefer``) is kept.
+
+Keys (under ``prefix``): ``queue`` zset of job ids by sort key,
+``queue:score``/``queue:cost``/``queue:skips``/``queue:tier`` hashes,
+``leases`` zset of claimed job ids by lease deadline, ``owners`` hash of
+job id -> replica id, ``depth:queued``/``depth:running`` hashes of tier ->
+count, ``replicas`` zset of replica ids by heartbeat deadline and
+``cancel:<id>`` flags.
+"""
+
+import math
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from scheduler import DEFAULT_PRIORITY
+
+# Re-pushing updates the priority of a queued job, but never re-queues a claimed one
+_PUSH = """
+if redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    return 0
+end
+if redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1]) == 1 then
+    redis.call('HSET', KEYS[5], ARGV[1], ARGV[4])
+    redis.call('HINCRBY', KEYS[6], ARGV[4], 1)
+end
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+redis.call('HSET', KEYS[4], ARGV[1], ARGV[3])
+return 1
+"""
+
+# ARGV: replica, lease deadline, max cost, max skips, preferred candidates...
+_CLAIM = """
+local head = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+if not head then
+    return false
+end
+local chosen = head
+if tonumber(redis.call('HGET', KEYS[5], head) or '0') < tonumber(ARGV[4]) then
+    for i = 5, #ARGV do
+        if redis.call('ZSCORE', KEYS[1], ARGV[i]) then
+            chosen = ARGV[i]
+            break
+        end
+    end
+end
+if tonumber(redis.call('HGET', KEYS[4], chosen) or '0') > tonumber(ARGV[3]) then
+    return false
+end
+if chosen ~= head then
+    redis.call('HINCRBY', KEYS[5], head, 1)
+end
+redis.call('ZREM', KEYS[1], chosen)
+redis.call('HDEL', KEYS[5], chosen)
+redis.call('ZADD', KEYS[2], ARGV[2], chosen)
+redis.call('HSET', KEYS[3], chosen, ARGV[1])
+local tier = redis.call('HGET', KEYS[6], chosen)
+if tier then
+    redis.call('HINCRBY', KEYS[7], tier, -1)
+    redis.call('HINCRBY', KEYS[8], tier, 1)
+end
+return chosen
+"""
+
+# Take over expired leases so exactly one replica requeues each job
+_RECLAIM = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, job_id in ipairs(expired) do
+    redis.call('ZADD', KEYS[1], ARGV[2], job_id)
+    redis.call('HSET', KEYS[2], job_id, ARGV[3])
+end
+return expired
+"""
+
+_REQUEUE = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[3], redis.call('HGET', KEYS[4], ARGV[1]) or ARGV[3], ARGV[1])
+local tier = redis.call('HGET', KEYS[5], ARGV[1])
+if tier then
+    redis.call('HINCRBY', KEYS[7], tier, -1)
+    redis.call('HINCRBY', KEYS[6], tier, 1)
+end
+return 1
+"""
+
+_REMOVE = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[4], ARGV[1])
+local tier = redis.call('HGET', KEYS[5], ARGV[1])
+if tier then
+    redis.call('HINCRBY', KEYS[6], tier, -1)
+    redis.call('HDEL', KEYS[5], ARGV[1])
+end
+return 1
+"""
+
+# Only the owner releases a lease: after a takeover the job belongs to someone else
+_RELEASE = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('HDEL', KEYS[4], ARGV[1])
+redis.call('DEL', KEYS[5])
+local tier = redis.call('HGET', KEYS[6], ARGV[1])
+if tier then
+    redis.call('HINCRBY', KEYS[7], tier, -1)
+    redis.call('HDEL', KEYS[6], ARGV[1])
+end
+return 1
+"""
+
+
+class RedisJobQueue:
+    """Job queue shared by several replicas, with leases and remote cancel"""
+
+    def __init__(
+        self,
+        client,
+        replica_id: str,
+        prefix: str = "comfyui",
+        aging_interval: float = 60.0,
+        visibility_timeout: float = 60.0,
+        cost_fn: Optional[Callable[[str], float]] = None,
+        tier_fn: Optional[Callable[[str], str]] = None,
+        clock: Callable[[], float] = time.time,
+        reorder_window: int = 1,
+        max_skips: int = 0,
+    ):
+        self.client = client
+        self.replica_id = replica_id
+        self.prefix = prefix
+        self.aging_interval = aging_interval
+        self.visibility_timeout = visibility_timeout
+        self.cost_fn = cost_fn or (lambda job_id: 1.0)
+        self.tier_fn = tier_fn or (lambda job_id: "other")
+        self.reorder_window = reorder_window
+        self.max_skips = max_skips
+        self._clock = clock
+        self._claimed: Set[str] = set()  # job ids leased by this replica
+
+        self._queue = self._key("queue")
+        self._scores = self._key("queue", "score")
+        self._costs = self._key("queue", "cost")
+        self._skips = self._key("queue", "skips")
+        self._tiers = self._key("queue", "tier")
+        self._queued = self._key("depth", "queued")
+        self._running = self._key("depth", "running")
+        self._leases = self._key("leases")
+        self._owners = self._key("owners")
+        self._replicas = self._key("replicas")
+
+        self._push = client.register_script(_PUSH)
+        self._claim = client.register_script(_CLAIM)
+        self._reclaim = client.register_script(_RECLAIM)
+        self._requeue = client.register_script(_REQUEUE)
+        self._release = client.register_script(_RELEASE)
+        self._remove = client.register_script(_REMOVE)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    def _sort_key(self, priority: int, enqueued_at: float) -> float:
+        if self.aging_interval <= 0:
+            return float(priority)
+        return priority + enqueued_at / self.aging_interval
+
+    def __len__(self) -> int:
+        return self.client.zcard(self._queue)
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.client.zscore(self._queue, job_id) is not None
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def push(
+        self,
+        job_id: str,
+        priority: int = DEFAULT_PRIORITY,
+        enqueued_at: Optional[float] = None,
+        user_id: str = "anonymous",
+        batch_id: Optional[str] = None,
+    ):
+        """Queue a job. Re-pushing a queued job updates its priority."""
+        if enqueued_at is None:
+            enqueued_at = self._clock()
+        score = self._sort_key(priority, enqueued_at)
+        self._push(
+            keys=[self._queue, self._leases, self._scores, self._costs, self._tiers, self._queued],
+            args=[job_id, repr(score), repr(float(self.cost_fn(job_id))), self.tier_fn(job_id)],
+        )
+
+    def pop(
+        self,
+        prefer: Optional[Callable[[str], bool]] = None,
+        max_cost: float = math.inf,
+    ) -> Optional[str]:
+        """
+        Claim the next job for this replica, or None if the queue is empty
+        or the next job costs more than ``max_cost`` (it stays at the head).
+        """
+        preferred: List[str] = []
+        if prefer is not None and self.reorder_window > 1 and self.max_skips > 0:
+            window = self.client.zrange(self._queue, 0, self.reorder_window - 1)
+            preferred = [job_id for job_id in (raw.decode() for raw in window) if prefer(job_id)]
+
+        job_id = self._claim(
+            keys=[
+                self._queue, self._leases, self._owners, self._costs, self._skips,
+                self._tiers, self._queued, self._running,
+            ],
+            args=[
+                self.replica_id,
+                repr(self._clock() + self.visibility_timeout),
+                repr(min(max_cost, 1e308)),
+                self.max_skips,
+                *preferred,
+            ],
+        )
+        if job_id is None:
+            return None
+        job_id = job_id.decode()
+        self._claimed.add(job_id)
+        return job_id
+
+    def remove(self, job_id: str) -> bool:
+        """Remove a queued job. Returns False if it was not queued (e.g. already claimed)."""
+        return bool(self._remove(
+            keys=[self._queue, self._scores, self._costs, self._skips, self._tiers, self._queued],
+            args=[job_id],
+        ))
+
+    def job_finished(self, job_id: str):
+        """Release the lease of a job returned by ``pop``"""
+        self._claimed.discard(job_id)
+        self._release(
+            keys=[
+                self._leases, self._owners, self._scores, self._costs, self._key("cancel", job_id),
+                self._tiers, self._running,
+            ],
+            args=[job_id, self.replica_id],
+        )
+
+    def request_cancel(self, job_id: str):
+        """Ask the replica running ``job_id`` to stop it"""
+        self.client.set(self._key("cancel", job_id), 1, ex=max(int(self.visibility_timeout * 10), 60))
+
+    def heartbeat(self) -> List[str]:
+        """Extend this replica's leases; returns the claimed jobs with a cancel request"""
+        deadline = self._clock() + self.visibility_timeout
+        self.client.zadd(self._replicas, {self.replica_id: deadline})
+        claimed = sorted(self._claimed)
+        if not claimed:
+            return []
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._leases, {job_id: deadline for job_id in claimed}, xx=True)
+            pipe.mget([self._key("cancel", job_id) for job_id in claimed])
+            _, flags = pipe.execute()
+        return [job_id for job_id, flag in zip(claimed, flags) if flag is not None]
+
+    def reclaim_expired(self) -> List[str]:
+        """
+        Take over jobs whose lease expired (their replica stopped
+        heartbeating). The caller resets each job and hands it back with
+        ``requeue``; until then it holds a fresh lease, so a crash in between
+        only delays the job.
+        """
+        now = self._clock()
+        expired = self._reclaim(
+            keys=[self._leases, self._owners],
+            args=[repr(now), repr(now + self.visibility_timeout), self.replica_id],
+        )
+        return [job_id.decode() for job_id in expired]
+
+    def requeue(self, job_id: str) -> bool:
+        """Return a job leased by this replica (claimed, or taken over by ``reclaim_expired``) to the queue at its original position"""
+        score = self._sort_key(DEFAULT_PRIORITY, self._clock())
+        return bool(self._requeue(
+            keys=[self._leases, self._owners, self._queue, self._scores, self._tiers, self._queued, self._running],
+            args=[job_id, self.replica_id, repr(score)],
+        ))
+
+    def depth(self) -> Dict[str, Dict[str, int]]:
+        """Queued and leased (running) jobs per tier across all replicas"""
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._queued)
+            pipe.hgetall(self._running)
+            queued, running = pipe.execute()
+        depth: Dict[str, Dict[str, int]] = {}
+        for state, counts in (("queued", queued), ("running", running)):
+            for tier, count in counts.items():
+                depth.setdefault(tier.decode(), {"queued": 0, "running": 0})[state] = max(int(count), 0)
+        return depth
+
+    def replicas(self) -> int:
+        """Replicas that sent a heartbeat within the visibility timeout (at least this one)"""
+        now = self._clock()
+        self.client.zremrangebyscore(self._replicas, "-inf", now)
+        return max(self.client.zcount(self._replicas, now, "+inf"), 1)
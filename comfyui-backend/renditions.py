@@ -0,0 +1,133 @@
+"""
+Output Renditions for ComfyUI Backend
+=====================================
+
+Post-processing of a finished video into smaller variants with ffmpeg, so
+thumbnail grids and mobile previews do not download the full render.
+
+- ``poster``: a representative JPEG frame
+- ``preview``: low-bitrate H.264 at ``preview_height`` lines, no audio
+- ``web``: the original stream remuxed with ``+faststart`` (moov atom up
+  front, so playback starts before the download finishes)
+
+ffmpeg runs as child processes, at most ``max_processes`` at a time across
+all jobs; each rendition has a ``timeout``. Renditions are best effort: a
+failing one is logged and skipped, it never fails the job.
+"""
+
+import asyncio
+import os
+import shutil
+from typing import Dict, List, Optional, Sequence
+
+RENDITION_NAMES = ("poster", "preview", "web")
+
+_EXTENSIONS = {"poster": ".jpg", "preview": ".mp4", "web": ".mp4"}
+
+
+def rendition_filename(name: str) -> str:
+    return name + _EXTENSIONS[name]
+
+
+def ffmpeg_args(name: str, source: str, target: str, preview_height: int) -> List[str]:
+    """ffmpeg arguments (without the executable) that render ``name``"""
+    common = ["-y", "-v", "error", "-i", source]
+    if name == "poster":
+        return [*common, "-vf", f"thumbnail,scale=-2:{preview_height}", "-frames:v", "1", "-q:v", "3", target]
+    if name == "preview":
+        return [
+            *common,
+            "-vf", f"scale=-2:{preview_height}",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "32", "-pix_fmt", "yuv420p",
+            "-an", "-movflags", "+faststart", target,
+        ]
+    if name == "web":
+        return [*common, "-c", "copy", "-movflags", "+faststart", target]
+    raise ValueError(f"Unknown rendition: {name}")
+
+
+class RenditionPipeline:
+    """Renders the configured variants of a video with a bounded number of ffmpeg processes"""
+
+    def __init__(
+        self,
+        names: Sequence[str] = ("poster", "preview"),
+        ffmpeg: str = "ffmpeg",
+        max_processes: int = 2,
+        timeout: float = 120,
+        preview_height: int = 360,
+    ):
+        unknown = set(names) - set(RENDITION_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown renditions: {', '.join(sorted(unknown))}")
+        self.names = tuple(names)
+        self.ffmpeg = shutil.which(ffmpeg)
+        self.timeout = timeout
+        self.preview_height = preview_height
+        self.max_processes = max_processes
+        self._slots = asyncio.Semaphore(max_processes)
+        self.running = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.names) and self.ffmpeg is not None
+
+    async def render(self, source: str, output_dir: str) -> Dict[str, str]:
+        """Render every configured variant of ``source``; returns name -> path of those that succeeded"""
+        if not self.enabled:
+            return {}
+        os.makedirs(output_dir, exist_ok=True)
+        paths = await asyncio.gather(*(self._render_one(name, source, output_dir) for name in self.names))
+        return {name: path for name, path in zip(self.names, paths) if path is not None}
+
+    async def _render_one(self, name: str, source: str, output_dir: str) -> Optional[str]:
+        target = os.path.join(output_dir, rendition_filename(name))
+        partial = os.path.join(output_dir, f"{name}.part{_EXTENSIONS[name]}")
+        args = ffmpeg_args(name, source, partial, self.preview_height)
+
+        async with self._slots:
+            self.running += 1
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.ffmpeg, *args,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                try:
+                    _, stderr = await asyncio.wait_for(process.communicate(), timeout=self.timeout)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    process.kill()
+                    await process.wait()
+                    raise
+            except asyncio.TimeoutError:
+                return self._failed(name, partial, f"timed out after {self.timeout}s")
+            except OSError as e:
+                return self._failed(name, partial, str(e))
+            finally:
+                self.running -= 1
+
+        if process.returncode != 0 or not os.path.exists(partial):
+            message = stderr.decode(errors="replace").strip().splitlines()[-1:] or [f"exit code {process.returncode}"]
+            return self._failed(name, partial, message[0])
+        os.replace(partial, target)
+        return target
+
+    def _failed(self, name: str, partial: str, reason: str) -> None:
+        self.failures += 1
+        print(f"⚠️ {name} rendition failed: {reason}")
+        try:
+            os.remove(partial)
+        except FileNotFoundError:
+            pass
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "renditions": list(self.names),
+            "running": self.running,
+            "maxProcesses": self.max_processes,
+            "failures": self.failures,
+        }
@@ -0,0 +1,85 @@
+"""
+Result Cache for ComfyUI Backend
+================================
+
+Maps a canonical hash of a generation request to the job that produced
+(or is producing) it, so identical submissions reuse a finished artifact
+or attach to the job already in flight instead of starting another GPU run.
+
+The cache only stores job ids; whether an entry is a usable hit is decided
+by the caller from the job's current state. Entries are LRU-evicted beyond
+``max_entries``.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Optional
+
+
+def request_fingerprint(user_id: str, prompt: str, workflow: dict, reference_image: Optional[str]) -> str:
+    """SHA-256 of the request in canonical JSON form (key order independent)"""
+    canonical = json.dumps(
+        {
+            "userId": user_id,
+            "prompt": prompt,
+            "workflow": workflow,
+            "referenceImage": reference_image,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Bounded LRU of request fingerprint -> job id with hit/miss counters"""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        job_id = self._entries.get(fingerprint)
+        if job_id is not None:
+            self._entries.move_to_end(fingerprint)
+        return job_id
+
+    def put(self, fingerprint: str, job_id: str):
+        self._entries[fingerprint] = job_id
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, fingerprint: str):
+        self._entries.pop(fingerprint, None)
+
+    def record_hit(self):
+        self.hits += 1
+
+    def record_coalesced(self):
+        self.coalesced += 1
+
+    def record_miss(self):
+        self.misses += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,468 @@
+"""
+Job Scheduler for ComfyUI Backend
+=================================
+
+JobScheduler: indexed binary min-heap of queued job ids.
+
+- Lower ``priority`` numbers run first (1 = most urgent, matching the
+  Bull queue convention used by comfyui-service).
+- Jobs with equal priority are served FIFO.
+- Starvation aging: a waiting job gains one priority level every
+  ``aging_interval`` seconds, so bulk low-priority work still completes
+  while interactive jobs keep jumping ahead.
+- ``remove`` is O(log n), so cancelling a queued job never scans the queue.
+- Optional bounded reordering: ``pop(prefer=...)`` may take a preferred
+  job (e.g. one whose models are already loaded on an idle worker) from the
+  first ``reorder_window`` jobs, but the head can only be overtaken
+  ``max_skips`` times.
+
+Aging is applied without re-heapifying: a job's effective priority at time
+``now`` is ``priority - (now - enqueued_at) / aging_interval``. The ``now``
+term is shared by every entry, so ordering by
+``priority + enqueued_at / aging_interval`` is time-invariant and can be used
+as a static heap key.
+
+FairShareScheduler: one queue per user, served by weighted deficit
+round-robin with optional per-user concurrency caps. Inside a user's queue
+each batch is its own flow, and flows take turns, so a 40-shot scene does
+not hold back that user's single previews (and counts as one tenant, not
+40, against other users).
+"""
+
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+DEFAULT_PRIORITY = 5
+
+# (sort key, FIFO sequence, job id)
+_Entry = Tuple[float, int, str]
+
+
+def parse_user_weights(spec: str) -> Dict[str, float]:
+    """Parse ``"uidA:2,uidB:0.5"`` (the USER_WEIGHTS setting) into positive weights per user id"""
+    weights: Dict[str, float] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        uid, _, weight = item.partition(":")
+        try:
+            value = float(weight)
+        except ValueError:
+            value = None
+        if not uid.strip() or value is None or not value > 0:
+            raise ValueError(f"Invalid USER_WEIGHTS entry {item.strip()!r} (expected uid:weight with weight > 0)")
+        weights[uid.strip()] = value
+    return weights
+
+
+class JobScheduler:
+    """Priority queue with stable FIFO tie-breaking and O(log n) cancel"""
+
+    def __init__(
+        self,
+        aging_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+        reorder_window: int = 1,
+        max_skips: int = 0,
+    ):
+        self.aging_interval = aging_interval
+        self.reorder_window = reorder_window
+        self.max_skips = max_skips
+        self._clock = clock
+        self._heap: List[_Entry] = []
+        self._index: Dict[str, int] = {}
+        self._skips: Dict[str, int] = {}  # times the job was overtaken while at the head
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._index
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
+
+    def _key(self, priority: int, enqueued_at: float) -> float:
+        if self.aging_interval <= 0:
+            return float(priority)
+        return priority + enqueued_at / self.aging_interval
+
+    def push(self, job_id: str, priority: int = DEFAULT_PRIORITY, enqueued_at: Optional[float] = None):
+        """Queue a job. Re-pushing a queued job updates its priority."""
+        if enqueued_at is None:
+            enqueued_at = self._clock()
+        entry = (self._key(priority, enqueued_at), next(self._seq), job_id)
+
+        if job_id in self._index:
+            pos = self._index[job_id]
+            self._heap[pos] = entry
+            self._sift_up(pos)
+            self._sift_down(self._index[job_id])
+            return
+
+        self._heap.append(entry)
+        self._index[job_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def peek(self, prefer: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """
+        Return the next job id without removing it.
+
+        With ``prefer``, the first preferred job among the ``reorder_window``
+        best entries is returned instead of the head, unless the head has
+        already been overtaken ``max_skips`` times.
+        """
+        if not self._heap:
+            return None
+        head = self._heap[0][2]
+        if prefer is None or self.reorder_window <= 1 or self._skips.get(head, 0) >= self.max_skips:
+            return head
+        for job_id in self._smallest(self.reorder_window):
+            if prefer(job_id):
+                return job_id
+        return head
+
+    def pop(self, prefer: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """Remove and return the next job id, or None if the queue is empty"""
+        job_id = self.peek(prefer)
+        if job_id is None:
+            return None
+        head = self._heap[0][2]
+        if job_id != head:
+            self._skips[head] = self._skips.get(head, 0) + 1
+        return self._remove_at(self._index[job_id])
+
+    def remove(self, job_id: str) -> bool:
+        """Remove a queued job. Returns False if it was not queued."""
+        pos = self._index.get(job_id)
+        if pos is None:
+            return False
+        self._remove_at(pos)
+        return True
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Number of jobs that would run before ``job_id`` (O(n log n))"""
+        if job_id not in self._index:
+            return None
+        target = self._heap[self._index[job_id]]
+        return sum(1 for entry in self._heap if entry < target)
+
+    # Heap internals
+
+    def _smallest(self, k: int) -> List[str]:
+        """Job ids of the ``k`` best entries in order (O(k log k))"""
+        heap = self._heap
+        result: List[str] = []
+        frontier = [(heap[0], 0)]
+        while frontier and len(result) < k:
+            entry, pos = heapq.heappop(frontier)
+            result.append(entry[2])
+            for child in (2 * pos + 1, 2 * pos + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return result
+
+    def _remove_at(self, pos: int) -> str:
+        heap = self._heap
+        job_id = heap[pos][2]
+        last = heap.pop()
+        del self._index[job_id]
+        self._skips.pop(job_id, None)
+
+        if pos < len(heap):
+            heap[pos] = last
+            self._index[last[2]] = pos
+            self._sift_up(pos)
+            self._sift_down(self._index[last[2]])
+
+        return job_id
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._index[heap[i][2]] = i
+        self._index[heap[j][2]] = j
+
+    def _sift_up(self, pos: int):
+        heap = self._heap
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if heap[pos] < heap[parent]:
+                self._swap(pos, parent)
+                pos = parent
+            else:
+                break
+
+    def _sift_down(self, pos: int):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            left = 2 * pos + 1
+            if left >= size:
+                break
+            smallest = left
+            right = left + 1
+            if right < size and heap[right] < heap[left]:
+                smallest = right
+            if heap[smallest] < heap[pos]:
+                self._swap(pos, smallest)
+                pos = smallest
+            else:
+                break
+
+
+class FlowQueue:
+    """
+    One user's queued jobs, split into flows served round-robin.
+
+    A flow is a batch id, or None for jobs submitted on their own. Each flow
+    is a JobScheduler, so priority and aging apply within it.
+    """
+
+    def __init__(
+        self,
+        aging_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+        reorder_window: int = 1,
+        max_skips: int = 0,
+    ):
+        self.aging_interval = aging_interval
+        self.reorder_window = reorder_window
+        self.max_skips = max_skips
+        self._clock = clock
+        self._flows: Dict[Optional[str], JobScheduler] = {}
+        self._order: Deque[Optional[str]] = deque()
+        self._flow_of: Dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._flow_of)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._flow_of
+
+    def __bool__(self) -> bool:
+        return bool(self._flow_of)
+
+    def push(
+        self,
+        job_id: str,
+        priority: int = DEFAULT_PRIORITY,
+        enqueued_at: Optional[float] = None,
+        flow: Optional[str] = None,
+    ):
+        """Queue a job in ``flow``. Re-pushing a queued job updates its priority within its flow."""
+        flow = self._flow_of.get(job_id, flow)
+        queue = self._flows.get(flow)
+        if queue is None:
+            queue = self._flows[flow] = JobScheduler(
+                self.aging_interval, self._clock, self.reorder_window, self.max_skips
+            )
+            self._order.append(flow)
+        queue.push(job_id, priority, enqueued_at)
+        self._flow_of[job_id] = flow
+
+    def peek(self, prefer: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        return self._flows[self._order[0]].peek(prefer) if self._order else None
+
+    def pop(self, prefer: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """Next job of the flow whose turn it is; that flow then goes to the back"""
+        if not self._order:
+            return None
+        flow = self._order[0]
+        queue = self._flows[flow]
+        job_id = queue.pop(prefer)
+        del self._flow_of[job_id]
+        if queue:
+            self._order.rotate(-1)
+        else:
+            self._order.popleft()
+            del self._flows[flow]
+        return job_id
+
+    def remove(self, job_id: str) -> bool:
+        if job_id not in self._flow_of:
+            return False
+        flow = self._flow_of.pop(job_id)
+        queue = self._flows[flow]
+        queue.remove(job_id)
+        if not queue:
+            self._order.remove(flow)
+            del self._flows[flow]
+        return True
+
+
+class FairShareScheduler:
+    """
+    Weighted fair queuing across users (deficit round-robin).
+
+    Each user has their own FlowQueue, so priority and aging still apply
+    within a user's jobs and the user's batches take turns. Users with queued work take turns:
+    on its turn a user is credited ``quantum * weight`` and may start jobs
+    while its credit covers their cost (1 per job unless ``cost_fn`` says
+    otherwise). A user already running ``max_running_per_user`` jobs is
+    skipped until one finishes, so one heavy tenant cannot occupy every
+    worker.
+
+    ``reorder_window``/``max_skips`` enable bounded reordering inside a flow
+    (see JobScheduler.peek); the order of users and flows is never changed.
+    ``quantum`` and all weights must be positive, otherwise a user's credit
+    never grows and ``pop`` would spin forever.
+    """
+
+    def __init__(
+        self,
+        aging_interval: float = 60.0,
+        weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+        max_running_per_user: int = 0,
+        quantum: float = 1.0,
+        cost_fn: Optional[Callable[[str], float]] = None,
+        clock: Callable[[], float] = time.time,
+        reorder_window: int = 1,
+        max_skips: int = 0,
+    ):
+        if not quantum > 0:
+            raise ValueError(f"quantum must be positive, got {quantum}")
+        for user_id, weight in {**(weights or {}), "default": default_weight}.items():
+            if not weight > 0:
+                raise ValueError(f"Weight of {user_id!r} must be positive, got {weight}")
+        self.aging_interval = aging_interval
+        self.reorder_window = reorder_window
+        self.max_skips = max_skips
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.max_running_per_user = max_running_per_user
+        self.quantum = quantum
+        self.cost_fn = cost_fn or (lambda job_id: 1.0)
+        self._clock = clock
+
+        self._queues: Dict[str, FlowQueue] = {}
+        self._rotation: Deque[str] = deque()
+        self._deficit: Dict[str, float] = {}
+        self._head_credited = False
+        self._owner: Dict[str, str] = {}  # queued or running job id -> user id
+        self._running: Dict[str, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, job_id: str) -> bool:
+        user_id = self._owner.get(job_id)
+        return user_id is not None and job_id in self._queues.get(user_id, ())
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def weight(self, user_id: str) -> float:
+        return self.weights.get(user_id, self.default_weight)
+
+    def push(
+        self,
+        job_id: str,
+        priority: int = DEFAULT_PRIORITY,
+        enqueued_at: Optional[float] = None,
+        user_id: str = "anonymous",
+        batch_id: Optional[str] = None,
+    ):
+        """Queue a job for ``user_id``. Re-pushing a queued job updates its priority."""
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = FlowQueue(
+                self.aging_interval, self._clock, self.reorder_window, self.max_skips
+            )
+            self._rotation.append(user_id)
+            self._deficit[user_id] = 0.0
+
+        if job_id not in queue:
+            self._size += 1
+        queue.push(job_id, priority, enqueued_at, batch_id)
+        self._owner[job_id] = user_id
+
+    def pop(
+        self,
+        prefer: Optional[Callable[[str], bool]] = None,
+        max_cost: float = math.inf,
+    ) -> Optional[str]:
+        """
+        Next job to start, or None if nothing is queued, every user with
+        queued work is at their concurrency cap, or the job whose turn it is
+        costs more than ``max_cost`` (it keeps its turn until resources free
+        up, so large jobs are not starved by small ones).
+        """
+        capped = 0
+        while self._rotation:
+            user_id = self._rotation[0]
+            if self._at_cap(user_id):
+                capped += 1
+                if capped >= len(self._rotation):
+                    return None
+                self._next_user()
+                continue
+            capped = 0
+
+            queue = self._queues[user_id]
+            if not self._head_credited:
+                self._deficit[user_id] += self.quantum * self.weight(user_id)
+                self._head_credited = True
+
+            cost = self.cost_fn(queue.peek(prefer))
+            if self._deficit[user_id] < cost:
+                self._next_user()
+                continue
+
+            if cost > max_cost:
+                return None
+
+            self._deficit[user_id] -= cost
+            job_id = queue.pop(prefer)
+            self._size -= 1
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+            if not queue:
+                self._drop_user(user_id)
+            return job_id
+        return None
+
+    def remove(self, job_id: str) -> bool:
+        """Remove a queued job. Returns False if it was not queued."""
+        user_id = self._owner.get(job_id)
+        queue = self._queues.get(user_id) if user_id is not None else None
+        if queue is None or not queue.remove(job_id):
+            return False
+        del self._owner[job_id]
+        self._size -= 1
+        if not queue:
+            self._drop_user(user_id)
+        return True
+
+    def job_finished(self, job_id: str):
+        """Release the concurrency slot of a job returned by ``pop``"""
+        user_id = self._owner.pop(job_id, None)
+        if user_id is None:
+            return
+        remaining = self._running.get(user_id, 0) - 1
+        if remaining > 0:
+            self._running[user_id] = remaining
+        else:
+            self._running.pop(user_id, None)
+
+    def _at_cap(self, user_id: str) -> bool:
+        return 0 < self.max_running_per_user <= self._running.get(user_id, 0)
+
+    def _next_user(self):
+        self._rotation.rotate(-1)
+        self._head_credited = False
+
+    def _drop_user(self, user_id: str):
+        if self._rotation and self._rotation[0] == user_id:
+            self._rotation.popleft()
+            self._head_credited = False
+        else:
+            self._rotation.remove(user_id)
+        del self._queues[user_id]
+        del self._deficit[user_id]
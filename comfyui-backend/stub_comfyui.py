@@ -0,0 +1,182 @@
+"""
+Stub ComfyUI Server
+===================
+
+Minimal stand-in for ComfyUI's HTTP/WebSocket prompt API so the worker
+pool can be exercised without a GPU or model downloads.
+
+Accepts the same CLI flags the pool passes to ComfyUI's ``main.py``:
+
+    python stub_comfyui.py --listen 127.0.0.1 --port 8188 --output-directory /tmp/out
+
+Workflows run one at a time. Each prompt sleeps ``--run-seconds`` (or the
+``seconds`` input of a ``StubSleep`` node), streams progress over ``/ws``
+and writes a fake mp4 of ``--output-bytes`` bytes. A ``StubFail`` node makes
+the prompt fail with an execution error.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from typing import Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse
+
+PROGRESS_STEPS = 10
+
+
+class StubComfyUI:
+    def __init__(self, output_dir: str, run_seconds: float, output_bytes: int):
+        self.output_dir = output_dir
+        self.run_seconds = run_seconds
+        self.output_bytes = output_bytes
+        self.history: Dict[str, dict] = {}
+        self.clients: Dict[str, WebSocket] = {}
+        self.queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self.running: Optional[str] = None
+        self.current_task: Optional[asyncio.Task] = None
+        self.counter = 0
+
+    async def send(self, client_id: str, kind: str, data: dict):
+        ws = self.clients.get(client_id)
+        if ws is None:
+            return
+        try:
+            await ws.send_json({"type": kind, "data": data})
+        except Exception:
+            self.clients.pop(client_id, None)
+
+    async def worker(self):
+        while True:
+            prompt_id, workflow, client_id = await self.queue.get()
+            self.running = prompt_id
+            self.current_task = asyncio.create_task(self.execute(prompt_id, workflow, client_id))
+            try:
+                await self.current_task
+            except asyncio.CancelledError:
+                self.history[prompt_id] = {
+                    "outputs": {},
+                    "status": {"status_str": "error", "completed": False, "messages": [["execution_interrupted", {}]]},
+                }
+                await self.send(client_id, "execution_interrupted", {"prompt_id": prompt_id})
+            finally:
+                self.running = None
+                self.current_task = None
+
+    async def execute(self, prompt_id: str, workflow: dict, client_id: str):
+        seconds = self.run_seconds
+        for node_id, node in workflow.items():
+            if node.get("class_type") == "StubSleep":
+                seconds = float(node.get("inputs", {}).get("seconds", seconds))
+
+        await self.send(client_id, "execution_start", {"prompt_id": prompt_id})
+        for node_id, node in workflow.items():
+            await self.send(client_id, "executing", {"node": node_id, "prompt_id": prompt_id})
+            if node.get("class_type") == "StubFail":
+                message = node.get("inputs", {}).get("message", "Stub failure")
+                self.history[prompt_id] = {
+                    "outputs": {},
+                    "status": {"status_str": "error", "completed": False, "messages": [["execution_error", {"exception_message": message}]]},
+                }
+                await self.send(client_id, "execution_error", {"prompt_id": prompt_id, "node_id": node_id, "exception_message": message})
+                return
+
+        for step in range(1, PROGRESS_STEPS + 1):
+            await asyncio.sleep(seconds / PROGRESS_STEPS)
+            await self.send(client_id, "progress", {"value": step, "max": PROGRESS_STEPS, "prompt_id": prompt_id})
+
+        self.counter += 1
+        filename = f"stub_{self.counter:05d}.mp4"
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, filename), "wb") as f:
+            f.write(b"\x00\x00\x00\x18ftypmp42" + os.urandom(max(self.output_bytes - 12, 0)))
+
+        self.history[prompt_id] = {
+            "prompt": [0, prompt_id, workflow, {}, []],
+            "outputs": {"stub": {"gifs": [{"filename": filename, "subfolder": "", "type": "output", "format": "video/h264-mp4"}]}},
+            "status": {"status_str": "success", "completed": True, "messages": []},
+        }
+        await self.send(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+        await self.send(client_id, "execution_success", {"prompt_id": prompt_id, "timestamp": int(time.time() * 1000)})
+
+
+def create_app(output_dir: str, run_seconds: float = 1.0, output_bytes: int = 1024) -> FastAPI:
+    app = FastAPI(title="Stub ComfyUI")
+    stub = StubComfyUI(output_dir, run_seconds, output_bytes)
+    app.state.stub = stub
+
+    @app.on_event("startup")
+    async def start_worker():
+        asyncio.create_task(stub.worker())
+
+    @app.get("/system_stats")
+    async def system_stats():
+        return {"system": {"os": "stub", "comfyui_version": "stub"}, "devices": []}
+
+    @app.post("/prompt")
+    async def queue_prompt(request: Request):
+        body = await request.json()
+        workflow = body.get("prompt")
+        if not isinstance(workflow, dict):
+            raise HTTPException(400, "prompt must be an object")
+        prompt_id = str(uuid.uuid4())
+        await stub.queue.put((prompt_id, workflow, body.get("client_id", "")))
+        return {"prompt_id": prompt_id, "number": stub.queue.qsize(), "node_errors": {}}
+
+    @app.get("/history/{prompt_id}")
+    async def get_history(prompt_id: str):
+        if prompt_id in stub.history:
+            return {prompt_id: stub.history[prompt_id]}
+        return {}
+
+    @app.get("/queue")
+    async def get_queue():
+        running = [[0, stub.running]] if stub.running else []
+        return {"queue_running": running, "queue_pending": [[0, p[0]] for p in list(stub.queue._queue)]}
+
+    @app.post("/interrupt")
+    async def interrupt():
+        if stub.current_task:
+            stub.current_task.cancel()
+        return {}
+
+    @app.get("/view")
+    async def view(filename: str, subfolder: str = "", type: str = "output"):
+        path = os.path.join(stub.output_dir, subfolder, os.path.basename(filename))
+        if not os.path.exists(path):
+            raise HTTPException(404, "File not found")
+        return FileResponse(path)
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket, clientId: str = ""):
+        await websocket.accept()
+        stub.clients[clientId] = websocket
+        await websocket.send_json({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": stub.queue.qsize()}}, "sid": clientId}})
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            stub.clients.pop(clientId, None)
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub ComfyUI server")
+    parser.add_argument("--listen", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--output-directory", default="/tmp/stub_comfyui_output")
+    parser.add_argument("--run-seconds", type=float, default=float(os.getenv("STUB_RUN_SECONDS", "1.0")))
+    parser.add_argument("--output-bytes", type=int, default=int(os.getenv("STUB_OUTPUT_BYTES", "1024")))
+    args, _ = parser.parse_known_args()
+
+    uvicorn.run(
+        create_app(args.output_directory, args.run_seconds, args.output_bytes),
+        host=args.listen,
+        port=args.port,
+        log_level="warning",
+    )
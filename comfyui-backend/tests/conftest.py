@@ -0,0 +1,92 @@
+import os
+import shutil
+import socket
+import sys
+import tempfile
+
+import pytest
+
+# Backend modules are flat files next to main.py
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIR)
+
+# Tests never touch the on-disk job database
+os.environ.setdefault("JOB_STORE", "memory")
+
+# Nor a live backend's files: startup deletes output directories of jobs it does not know
+SESSION_ROOT = tempfile.mkdtemp(prefix="comfyui_tests_")
+os.environ["JOB_OUTPUT_ROOT"] = os.path.join(SESSION_ROOT, "outputs")
+os.environ["BLOB_ROOT"] = os.path.join(SESSION_ROOT, "blobs")
+os.environ["WORKER_OUTPUT_ROOT"] = os.path.join(SESSION_ROOT, "workers")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SESSION_ROOT, ignore_errors=True)
+
+STUB_COMFYUI = os.path.join(BACKEND_DIR, "stub_comfyui.py")
+
+
+def free_port_block(count: int) -> int:
+    """First port of ``count`` consecutive free ports"""
+    for _ in range(50):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            base = s.getsockname()[1]
+        if base + count > 65535:
+            continue
+        try:
+            for offset in range(count):
+                with socket.socket() as s:
+                    s.bind(("127.0.0.1", base + offset))
+            return base
+        except OSError:
+            continue
+    raise RuntimeError("No free port block")
+
+
+@pytest.fixture
+def make_stub_pool(tmp_path):
+    """Factory for worker pools backed by stub_comfyui.py processes"""
+    from worker_pool import ComfyUIWorkerPool
+
+    def factory(size: int = 2, run_seconds: float = 0.2, **kwargs):
+        return ComfyUIWorkerPool.from_config(
+            size=size,
+            comfyui_main=STUB_COMFYUI,
+            base_port=free_port_block(size),
+            output_root=str(tmp_path / "workers"),
+            python=sys.executable,
+            extra_args=["--run-seconds", str(run_seconds)],
+            health_interval=0.2,
+            startup_timeout=30,
+            **kwargs,
+        )
+
+    return factory
+
+
+FAKE_FFMPEG = """#!{python}
+# Copies the -i input to the output path (last argument); FAKE_FFMPEG_FAIL names renditions to fail
+import os, shutil, sys, time
+args = sys.argv[1:]
+target = args[-1]
+with open(os.environ["FAKE_FFMPEG_LOG"], "a") as log:
+    log.write(f"start {{time.time()}}\\n")
+time.sleep(float(os.environ.get("FAKE_FFMPEG_SECONDS", "0")))
+if os.path.basename(target).split(".")[0] in os.environ.get("FAKE_FFMPEG_FAIL", "").split(","):
+    sys.stderr.write("Conversion failed!\\n")
+    sys.exit(1)
+shutil.copyfile(args[args.index("-i") + 1], target)
+with open(os.environ["FAKE_FFMPEG_LOG"], "a") as log:
+    log.write(f"end {{time.time()}}\\n")
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """Path of an ffmpeg stand-in that copies its input; start/end times go to FAKE_FFMPEG_LOG"""
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    path.chmod(0o755)
+    monkeypatch.setenv("FAKE_FFMPEG_LOG", str(tmp_path / "ffmpeg.log"))
+    return str(path)
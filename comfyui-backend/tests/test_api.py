@@ -0,0 +1,658 @@
+import base64
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import STUB_COMFYUI, free_port_block
+from job_stats import JobStats
+from result_cache import ResultCache
+from tier_router import LatencyModel
+from tracing import TraceExporter
+
+
+@pytest.fixture
+def client(make_stub_pool, monkeypatch):
+    monkeypatch.setattr(main, "worker_pool", make_stub_pool(size=2, run_seconds=0.2))
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+    monkeypatch.setattr(main, "shutting_down", False)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def submit(client, workflow=None, priority=5, **extra) -> str:
+    response = client.post("/api/comfyui/generate", json={
+        "prompt": "a cat",
+        "workflow": workflow or {"1": {"class_type": "KSampler"}},
+        "priority": priority,
+        **extra,
+    })
+    assert response.status_code == 200
+    return response.json()["data"]["jobId"]
+
+
+def wait_for(client, job_id: str, states=main.TERMINAL_STATES, timeout: float = 30) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/comfyui/job/{job_id}").json()["data"]
+        if job["state"] in states:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not reach {states}")
+
+
+def test_generate_runs_on_worker_pool(client):
+    job_id = submit(client)
+    job = wait_for(client, job_id)
+
+    assert job["state"] == "completed"
+    assert job["progress"] == 100
+    assert job["result"]["artifact"]["name"].endswith(".mp4")
+    assert client.get(job["result"]["imageUrl"]).status_code == 200
+
+
+def test_worker_failure_marks_job_failed(client):
+    job_id = submit(client, {"1": {"class_type": "StubFail", "inputs": {"message": "out of memory"}}})
+    job = wait_for(client, job_id)
+
+    assert job["state"] == "failed"
+    assert "out of memory" in job["failedReason"]
+
+
+def test_health_reports_pool(client):
+    health = client.get("/health/detailed").json()
+    assert health["workers"]["totalWorkers"] == 2
+    assert health["workers"]["healthyWorkers"] == 2
+    assert set(health["auth"]) == {"entries", "hits", "misses"}
+
+
+def test_duplicate_submission_attaches_to_in_flight_job(client):
+    workflow = {"1": {"class_type": "StubSleep", "inputs": {"seconds": 0.5}}}
+    first = submit(client, workflow)
+    job = client.get(f"/api/comfyui/job/{first}").json()["data"]
+    response = client.post("/api/comfyui/generate", json={"prompt": "a cat", "workflow": workflow})
+
+    assert response.json()["data"] == {
+        "jobId": first,
+        "traceId": job["traceId"],
+        "estimatedWaitSeconds": job["estimatedWaitSeconds"],
+        "eta": job["eta"],
+        "deduplicated": True,
+    }
+
+
+def test_duplicate_of_completed_job_is_a_cache_hit(client):
+    first = submit(client)
+    wait_for(client, first)
+    hits = main.result_cache.hits
+
+    assert submit(client) == first
+    assert main.result_cache.hits == hits + 1
+
+
+def test_failed_job_is_not_reused(client):
+    workflow = {"1": {"class_type": "StubFail"}}
+    first = submit(client, workflow)
+    wait_for(client, first)
+
+    assert submit(client, workflow) != first
+
+
+def test_queue_stats_track_transitions(client):
+    before = client.get("/api/queue/stats").json()["data"]
+    job_id = submit(client, {"1": {"class_type": "ADE_LoadAnimateDiffModel"}})
+    wait_for(client, job_id)
+    after = client.get("/api/queue/stats").json()["data"]
+
+    assert after["completed"] == before["completed"] + 1
+    assert after["total"] == before["total"] + 1
+    assert after["byTier"]["animatediff"]["completed"] >= 1
+    assert after["user"]["completed"] >= 1
+
+
+def test_running_job_can_be_cancelled(client):
+    job_id = submit(client, {"1": {"class_type": "StubSleep", "inputs": {"seconds": 30}}})
+    wait_for(client, job_id, states=("running",))
+    time.sleep(0.5)
+
+    assert client.delete(f"/api/comfyui/job/{job_id}").json() == {"success": True}
+    job = client.get(f"/api/comfyui/job/{job_id}").json()["data"]
+    assert job["state"] == "cancelled"
+    assert main.running_jobs == []
+    assert main.worker_pool.busy_count == 0
+    assert client.delete(f"/api/comfyui/job/{job_id}").status_code == 400
+
+
+def test_job_timeout_frees_slot(client):
+    job_id = submit(client, {"1": {"class_type": "StubSleep", "inputs": {"seconds": 30}}}, timeout=1)
+    job = wait_for(client, job_id, states=("timed_out", "completed", "failed"))
+
+    assert job["state"] == "timed_out"
+    assert "Timed out" in job["failedReason"]
+
+    # Worker was interrupted, so the next job runs immediately
+    assert wait_for(client, submit(client), timeout=10)["state"] == "completed"
+
+
+def test_batch_runs_every_shot(client):
+    response = client.post("/api/comfyui/batch", json={"shots": [
+        {"prompt": f"shot {i}", "workflow": {"1": {"class_type": "KSampler", "inputs": {"seed": i}}}}
+        for i in range(4)
+    ]})
+    data = response.json()["data"]
+    assert len(data["jobIds"]) == 4
+
+    for job_id in data["jobIds"]:
+        assert wait_for(client, job_id)["batchId"] == data["batchId"]
+
+    status = client.get(f"/api/comfyui/batch/{data['batchId']}").json()["data"]
+    assert status["state"] == "completed"
+    assert status["progress"] == 100
+    assert status["counts"] == {"completed": 4}
+
+
+def test_batch_repeats_share_one_job(client):
+    shot = {"prompt": "same", "workflow": {"1": {"class_type": "StubSleep", "inputs": {"seconds": 0.1}}}}
+    data = client.post("/api/comfyui/batch", json={"shots": [shot, shot]}).json()["data"]
+
+    assert data["jobIds"][0] == data["jobIds"][1]
+    assert data["deduplicated"] == 1
+
+
+def test_batch_size_is_limited(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_BATCH_SIZE", 2)
+    shots = [{"prompt": str(i), "workflow": {}} for i in range(3)]
+
+    assert client.post("/api/comfyui/batch", json={"shots": shots}).status_code == 413
+    assert client.post("/api/comfyui/batch", json={"shots": []}).status_code == 400
+
+
+def test_batch_cancel_stops_running_and_queued_shots(client):
+    response = client.post("/api/comfyui/batch", json={"shots": [
+        {"prompt": f"shot {i}", "workflow": {"1": {"class_type": "StubSleep", "inputs": {"seconds": 30 + i}}}}
+        for i in range(4)
+    ]})
+    data = response.json()["data"]
+    wait_for(client, data["jobIds"][0], states=("running",))
+
+    assert client.delete(f"/api/comfyui/batch/{data['batchId']}").json() == {"success": True, "cancelled": 4}
+    status = client.get(f"/api/comfyui/batch/{data['batchId']}").json()["data"]
+    assert status["state"] == "cancelled"
+    assert status["counts"] == {"cancelled": 4}
+    assert main.running_jobs == []
+    assert len(main.job_queue) == 0
+
+
+def test_gpu_budget_limits_concurrency(client, monkeypatch):
+    monkeypatch.setattr(main, "GPU_MEMORY_BUDGET_GB", 4)
+    workflow = {"1": {"class_type": "StubSleep", "inputs": {"seconds": 1}}}
+    first = submit(client, workflow)
+    second = submit(client, {**workflow, "2": {"class_type": "KSampler"}})
+
+    wait_for(client, first, states=("running",))
+    assert client.get(f"/api/comfyui/job/{second}").json()["data"]["state"] == "queued"
+    assert client.get("/health/detailed").json()["budget"]["usedGb"] == main.job_cost(first)
+
+    assert wait_for(client, second)["state"] == "completed"
+
+
+def test_metrics_endpoint(client):
+    job_id = submit(client, {"1": {"class_type": "SVD_img2vid_Conditioning"}})
+    wait_for(client, job_id)
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'comfyui_jobs_finished_total{state="completed",tier="svd"}' in text
+    assert 'comfyui_job_queue_wait_seconds_count{tier="svd"}' in text
+    assert 'comfyui_job_e2e_seconds_bucket{state="completed",tier="svd",le="+Inf"}' in text
+    assert "comfyui_workers_healthy 2" in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/comfyui/job/{job_id}",status="200"}' in text
+
+
+def test_outputs_are_evicted_beyond_quota(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "output_store", main.OutputStore(str(tmp_path), quota_bytes=1))
+    first = submit(client, {"1": {"class_type": "KSampler", "inputs": {"seed": 1}}})
+    wait_for(client, first)
+    second = submit(client, {"1": {"class_type": "KSampler", "inputs": {"seed": 2}}})
+    wait_for(client, second)
+
+    job = client.get(f"/api/comfyui/job/{first}").json()["data"]
+    assert job["result"]["evicted"] is True
+    assert "imageUrl" not in job["result"]
+    assert client.get(f"/api/comfyui/job/{first}/artifact").status_code == 410
+    assert not os.path.exists(tmp_path / first)
+    assert client.get("/health/detailed").json()["disk"]["jobs"] == 1
+
+    # An evicted result is rendered again instead of being reused
+    assert submit(client, {"1": {"class_type": "KSampler", "inputs": {"seed": 1}}}) != first
+
+
+def test_failed_job_output_is_deleted(client):
+    job_id = submit(client, {"1": {"class_type": "StubFail"}})
+    wait_for(client, job_id)
+
+    deadline = time.time() + 5
+    while os.path.exists(main.output_store.job_dir(job_id)) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not os.path.exists(main.output_store.job_dir(job_id))
+
+
+@pytest.fixture
+def shared_redis(make_stub_pool, monkeypatch):
+    """Point this app at a fake Redis; returns a factory for the (store, queue) of another replica"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from job_store import RedisJobStore
+    from redis_queue import RedisJobQueue
+
+    server = fakeredis.FakeServer()
+
+    def replica(replica_id):
+        store = RedisJobStore(fakeredis.FakeRedis(server=server), progress_interval=0)
+        queue = RedisJobQueue(store.client, replica_id, cost_fn=lambda job_id: 0.0, visibility_timeout=5)
+        return store, queue
+
+    store, queue = replica("local")
+    monkeypatch.setattr(main, "jobs", store)
+    monkeypatch.setattr(main, "job_queue", queue)
+    monkeypatch.setattr(main, "CLUSTERED", True)
+    monkeypatch.setattr(main, "QUEUE_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(main, "worker_pool", make_stub_pool(size=2, run_seconds=0.2))
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+    monkeypatch.setattr(main, "shutting_down", False)
+    return replica
+
+
+@pytest.fixture
+def replicas(shared_redis):
+    """This app plus the store and queue of a second replica, sharing one fake Redis"""
+    with TestClient(main.app) as client:
+        yield client, shared_redis("remote")
+
+
+def test_job_queued_by_another_replica_runs_here(replicas):
+    client, (remote_store, remote_queue) = replicas
+    job = main.new_job(main.GenerateRequest(prompt="a cat", workflow={"1": {"class_type": "KSampler"}}), "anonymous", "fp")
+    remote_store.add(job)
+    remote_queue.push(job["id"], job["priority"], job["createdAt"], job["userId"])
+
+    assert wait_for(client, job["id"])["state"] == "completed"
+    assert remote_store.get(job["id"])["result"]["artifact"]["name"].endswith(".mp4")
+
+
+def test_cancel_of_job_running_on_another_replica_is_forwarded(replicas, monkeypatch):
+    client, (remote_store, remote_queue) = replicas
+    monkeypatch.setattr(main, "MAX_CONCURRENT_JOBS", 0)  # this replica claims nothing
+    job = main.new_job(main.GenerateRequest(prompt="a dog", workflow={"1": {"class_type": "KSampler"}}), "anonymous", "fp")
+    remote_store.add(job)
+    remote_queue.push(job["id"], job["priority"], job["createdAt"], job["userId"])
+    assert remote_queue.pop() == job["id"]
+    job["state"] = "running"
+    remote_store.save(job)
+
+    assert client.delete(f"/api/comfyui/job/{job['id']}").json() == {"success": True}
+    assert remote_queue.heartbeat() == [job["id"]]
+    assert client.get(f"/api/comfyui/job/{job['id']}").json()["data"]["state"] == "running"
+
+
+def test_job_interrupted_by_shutdown_is_handed_to_another_replica(shared_redis, monkeypatch):
+    monkeypatch.setattr(main, "DRAIN_TIMEOUT", 0.5)
+    remote_store, remote_queue = shared_redis("remote")
+    with TestClient(main.app) as client:
+        job_id = submit(client, {"1": {"class_type": "StubSleep", "inputs": {"seconds": 30}}})
+        wait_for(client, job_id, states=("running",))
+
+    # Drain timed out: the job is back in the shared queue instead of stuck as running
+    assert remote_store.get(job_id)["state"] == "queued"
+    assert remote_queue.depth()["other"] == {"queued": 1, "running": 0}
+    assert remote_queue.pop() == job_id
+
+
+def test_queue_depth_includes_jobs_run_by_another_replica(replicas, monkeypatch):
+    client, (remote_store, remote_queue) = replicas
+    monkeypatch.setattr(main, "MAX_CONCURRENT_JOBS", 0)  # this replica claims nothing
+    job_id = submit(client, {"1": {"class_type": "KSampler"}})
+    assert main.queue_depth() == {"other": {"queued": 1, "running": 0}}
+
+    assert remote_queue.pop() == job_id
+    assert main.queue_depth() == {"other": {"queued": 0, "running": 1}}
+    remote_queue.job_finished(job_id)
+    assert main.queue_depth() == {"other": {"queued": 0, "running": 0}}
+    assert main.expected_wait() == 0
+
+
+def test_reference_image_is_uploaded_once(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "blob_store", main.BlobStore(str(tmp_path)))
+    image = b"\x89PNG character sheet"
+    upload = client.post("/api/comfyui/blobs", content=image).json()["data"]
+    digest = upload["hash"]
+
+    assert upload == {"hash": hashlib.sha256(image).hexdigest(), "size": len(image), "deduplicated": False}
+    assert client.post("/api/comfyui/blobs", content=image).json()["data"]["deduplicated"]
+    assert client.head(f"/api/comfyui/blobs/{digest}").status_code == 200
+    assert client.get(f"/api/comfyui/blobs/{digest}").content == image
+
+    workflow = {"1": {"class_type": "StubSleep", "inputs": {"seconds": 0.5}}}
+    job_id = submit(client, workflow, referenceImageHash=digest)
+    job = client.get(f"/api/comfyui/job/{job_id}").json()["data"]
+    assert job["referenceImageHash"] == digest
+    assert "referenceImage" not in job
+
+    # The same image sent inline is stored under the same hash and deduplicates
+    inline = "data:image/png;base64," + base64.b64encode(image).decode()
+    response = client.post("/api/comfyui/generate", json={"prompt": "a cat", "workflow": workflow, "referenceImage": inline})
+    assert response.json()["data"]["jobId"] == job_id
+    assert response.json()["data"]["deduplicated"]
+
+
+def test_unknown_or_oversized_blobs_are_rejected(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "blob_store", main.BlobStore(str(tmp_path), max_blob_bytes=4))
+    response = client.post("/api/comfyui/generate", json={
+        "prompt": "a cat",
+        "workflow": {"1": {"class_type": "KSampler"}},
+        "referenceImageHash": "0" * 64,
+    })
+
+    assert response.status_code == 400
+    assert client.post("/api/comfyui/blobs", content=b"too large").status_code == 413
+    assert client.post("/api/comfyui/blobs", content=b"ok", headers={"content-length": "2x"}).status_code == 400
+    assert client.get(f"/api/comfyui/blobs/{'0' * 64}").status_code == 404
+
+
+def test_status_stays_fast_while_output_is_finalized(client, monkeypatch):
+    import worker_pool
+
+    real_move = worker_pool.shutil.move
+
+    def slow_move(source, target):
+        time.sleep(1.0)  # a large video copied across filesystems
+        return real_move(source, target)
+
+    monkeypatch.setattr(worker_pool.shutil, "move", slow_move)
+    job_id = submit(client, {"1": {"class_type": "StubSleep", "inputs": {"seconds": 0.2}}})
+
+    slowest = 0.0
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        start = time.perf_counter()
+        job = client.get(f"/api/comfyui/job/{job_id}").json()["data"]
+        slowest = max(slowest, time.perf_counter() - start)
+        if job["state"] in main.TERMINAL_STATES:
+            break
+        time.sleep(0.02)
+
+    assert job["state"] == "completed"
+    assert slowest < 0.5
+
+
+def test_completed_job_gets_renditions(client, monkeypatch, fake_ffmpeg):
+    monkeypatch.setattr(main, "renditions", main.RenditionPipeline(["poster", "preview"], ffmpeg=fake_ffmpeg))
+    job_id = submit(client, {"1": {"class_type": "KSampler", "inputs": {"seed": 20}}})
+    wait_for(client, job_id)
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        result = client.get(f"/api/comfyui/job/{job_id}").json()["data"]["result"]
+        if result.get("renditions"):
+            break
+        time.sleep(0.05)
+
+    assert set(result["renditions"]) == {"poster", "preview"}
+    poster = result["renditions"]["poster"]
+    assert poster["name"] == "poster.jpg"
+    assert poster["contentType"] == "image/jpeg"
+    original = client.get(result["imageUrl"]).content
+    assert client.get(poster["signedUrl"]).content == original  # the fake ffmpeg copies its input
+    assert client.get(f"/api/comfyui/job/{job_id}/artifact/web").status_code == 404
+
+
+def test_bulk_status_returns_only_changed_jobs(client):
+    first, second = submit(client), submit(client, {"1": {"class_type": "KSampler", "inputs": {"seed": 2}}})
+    wait_for(client, first)
+    wait_for(client, second)
+
+    response = client.get("/api/comfyui/jobs", params={"ids": f"{first},{second},nope"})
+    data = response.json()["data"]
+    assert [job["id"] for job in data["jobs"]] == [first, second]
+    assert all(job["state"] == "completed" and "workflow" not in job for job in data["jobs"])
+    assert data["missing"] == ["nope"]
+    etag = response.headers["etag"]
+
+    unchanged = client.get("/api/comfyui/jobs", params={"ids": f"{first},{second},nope"}, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["etag"] == etag
+
+    # A token for another id list is ignored
+    other = client.get("/api/comfyui/jobs", params={"ids": first}, headers={"If-None-Match": etag})
+    assert [job["id"] for job in other.json()["data"]["jobs"]] == [first]
+
+
+def test_bulk_status_long_polls_until_a_job_changes(client):
+    done = submit(client)
+    wait_for(client, done)
+    job_id = submit(client, {"1": {"class_type": "StubSleep", "inputs": {"seconds": 1}}})
+    wait_for(client, job_id, states=("running",))
+    ids = f"{done},{job_id}"
+    etag = client.get("/api/comfyui/jobs", params={"ids": ids}).headers["etag"]
+
+    started = time.monotonic()
+    while True:
+        response = client.get("/api/comfyui/jobs", params={"ids": ids, "wait": 10}, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert [job["id"] for job in data["jobs"]] == [job_id]
+        assert data["unchanged"] == [done]
+        etag = response.headers["etag"]
+        if data["jobs"][0]["state"] == "completed":
+            break
+    assert time.monotonic() - started < 5
+
+
+def test_bulk_status_limits_ids(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_BULK_JOBS", 2)
+
+    assert client.get("/api/comfyui/jobs", params={"ids": "a,b,c"}).status_code == 413
+    assert client.get("/api/comfyui/jobs", params={"ids": ""}).status_code == 400
+
+
+def test_readiness_waits_for_model_preload(make_stub_pool, monkeypatch):
+    monkeypatch.setattr(main, "worker_pool", make_stub_pool(size=1, run_seconds=1))
+    monkeypatch.setattr(main, "PRELOAD_MODELS", ["sd15.safetensors"])
+    monkeypatch.setattr(main, "shutting_down", False)
+    monkeypatch.setattr(main, "warmed_up", False)
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+        response = client.get("/health/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming_up"
+
+        deadline = time.time() + 10
+        while client.get("/health/ready").status_code != 200:
+            assert time.time() < deadline
+            time.sleep(0.1)
+        assert main.worker_pool.holds_models(["sd15.safetensors"])
+
+        monkeypatch.setattr(main, "shutting_down", True)
+        assert client.get("/health/ready").json()["status"] == "draining"
+        assert client.post("/api/comfyui/generate", json={"prompt": "a cat", "workflow": {}}).status_code == 503
+
+
+def test_shutdown_drains_running_jobs(make_stub_pool, monkeypatch):
+    monkeypatch.setattr(main, "worker_pool", make_stub_pool(size=1))
+    monkeypatch.setattr(main, "result_cache", ResultCache())
+    monkeypatch.setattr(main, "shutting_down", False)
+    with TestClient(main.app) as client:
+        job_id = submit(client, {"1": {"class_type": "StubSleep", "inputs": {"seconds": 1}}})
+        wait_for(client, job_id, states=("running",))
+
+    assert main.jobs.get(job_id)["state"] == "completed"
+
+
+def test_sigterm_drains_while_serving_and_ends_event_streams(tmp_path):
+    port = free_port_block(1)
+    env = {
+        **os.environ,
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "COMFYUI_MAIN": STUB_COMFYUI,
+        "COMFYUI_BASE_PORT": str(free_port_block(1)),
+        "MAX_CONCURRENT_JOBS": "1",
+        "WORKER_OUTPUT_ROOT": str(tmp_path / "workers"),
+        "WORKER_HEALTH_INTERVAL": "0.5",
+        "JOB_STORE": "memory",
+        "JOB_OUTPUT_ROOT": str(tmp_path / "outputs"),
+        "BLOB_ROOT": str(tmp_path / "blobs"),
+        "FIREBASE_SERVICE_ACCOUNT": str(tmp_path / "no-firebase.json"),
+        "DRAIN_TIMEOUT": "30",
+        "HTTP_DRAIN_TIMEOUT": "5",
+    }
+    log = open(tmp_path / "backend.log", "wb")
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=os.path.dirname(main.__file__), env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=10) as http:
+            deadline = time.time() + 60
+            while True:
+                assert time.time() < deadline, (tmp_path / "backend.log").read_text()
+                try:
+                    if http.get("/health/ready").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.2)
+
+            workflow = {"1": {"class_type": "StubSleep", "inputs": {"seconds": 3}}}
+            job_id = http.post("/api/comfyui/generate", json={"prompt": "a cat", "workflow": workflow}).json()["data"]["jobId"]
+            while http.get(f"/api/comfyui/job/{job_id}").json()["data"]["state"] != "running":
+                time.sleep(0.05)
+
+            stream_ended = threading.Event()
+
+            def read_stream():
+                with httpx.stream("GET", f"http://127.0.0.1:{port}/api/comfyui/events", timeout=30) as response:
+                    for _ in response.iter_lines():
+                        pass
+                stream_ended.set()
+
+            reader = threading.Thread(target=read_stream, daemon=True)
+            reader.start()
+            time.sleep(0.5)
+            process.send_signal(signal.SIGTERM)
+
+            # The stream closes at once, while status requests are still served during the drain
+            assert stream_ended.wait(3)
+            ready = http.get("/health/ready")
+            assert ready.status_code == 503 and ready.json()["status"] == "draining"
+            assert http.get(f"/api/comfyui/job/{job_id}").json()["data"]["state"] == "running"
+            assert http.post("/api/comfyui/generate", json={"prompt": "late", "workflow": workflow}).status_code == 503
+
+        # The server stops once the job is done
+        assert process.wait(timeout=20) == 0
+        assert f"Job {job_id} completed" in (tmp_path / "backend.log").read_text()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        log.close()
+
+
+def test_latency_target_downgrades_tier_under_load(client, monkeypatch):
+    monkeypatch.setattr(main, "latency_model", LatencyModel(defaults={"svd": 5, "animatediff": 1, "other": 20}))
+    monkeypatch.setattr(main, "MAX_CONCURRENT_JOBS", 0)  # keep everything queued
+    monkeypatch.setattr(main, "job_stats", JobStats())
+    routed = {
+        "workflow": {"1": {"class_type": "SVD_img2vid_Conditioning"}},
+        "fallbackWorkflows": [{"1": {"class_type": "ADE_LoadAnimateDiffModel"}}],
+        "latencyTarget": 22,
+    }
+
+    backlog = submit(client, prompt="backlog")  # 20s of work ahead
+    job_id = submit(client, prompt="under load", **routed)
+    job = client.get(f"/api/comfyui/job/{job_id}").json()["data"]
+    assert job["tier"] == "animatediff"
+    assert job["routing"]["requestedTier"] == "svd"
+    assert job["routing"]["downgraded"]
+    assert job["routing"]["expectedSeconds"] == 21
+
+    for queued in (backlog, job_id):
+        client.delete(f"/api/comfyui/job/{queued}")
+    job_id = submit(client, prompt="idle", **routed)
+    job = client.get(f"/api/comfyui/job/{job_id}").json()["data"]
+    assert job["tier"] == "svd"
+    assert not job["routing"]["downgraded"]
+
+
+def test_job_phases_are_traced_and_exported(client, monkeypatch, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(main, "trace_exporter", TraceExporter(str(path), "otlp"))
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+    response = client.post(
+        "/api/comfyui/generate",
+        json={"prompt": "traced", "workflow": {"1": {"class_type": "KSampler"}}},
+        headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"},
+    )
+    data = response.json()["data"]
+    assert data["traceId"] == trace_id
+    job = wait_for(client, data["jobId"])
+    assert job["traceId"] == trace_id
+    assert {"auth", "queue_wait", "dispatch", "execution", "output_collection", "finalize"} <= set(job["phases"])
+
+    deadline = time.time() + 5
+    while trace_id not in (path.read_text() if path.exists() else "") and time.time() < deadline:
+        time.sleep(0.05)
+    # Other tests' jobs may finish meanwhile: pick this trace's line
+    line = next(line for line in path.read_text().splitlines() if trace_id in line)
+    spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root = spans[0]
+    assert root["name"] == "job" and root["parentSpanId"] == "00f067aa0ba902b7"
+    assert all(span["traceId"] == trace_id for span in spans)
+    assert all(span["parentSpanId"] == root["spanId"] for span in spans[1:])
+
+
+def test_overloaded_queue_rejects_with_retry_after(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "blob_store", main.BlobStore(str(tmp_path)))
+    monkeypatch.setattr(main, "latency_model", LatencyModel(defaults={"other": 100}))
+    monkeypatch.setattr(main, "job_stats", JobStats())
+    monkeypatch.setattr(main, "MAX_CONCURRENT_JOBS", 0)  # keep everything queued
+    monkeypatch.setattr(main, "MAX_QUEUE_WAIT_SECONDS", 150)
+
+    def post(prompt: str):
+        return client.post("/api/comfyui/generate", json={"prompt": prompt, "workflow": {"1": {"class_type": "KSampler"}}})
+
+    first = post("first").json()["data"]
+    assert first["estimatedWaitSeconds"] == 0
+    assert first["eta"] == pytest.approx(time.time() + 100, abs=5)
+    second = post("second").json()["data"]
+    assert second["estimatedWaitSeconds"] == 100
+    assert client.get(f"/api/comfyui/job/{second['jobId']}").json()["data"]["estimatedSeconds"] == 200
+
+    rejected = post("third")
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "50"
+    # Rejected before the reference image is stored
+    inline = "data:image/png;base64," + base64.b64encode(b"\x89PNG rejected").decode()
+    with_image = client.post("/api/comfyui/generate", json={"prompt": "image", "workflow": {}, "referenceImage": inline})
+    assert with_image.status_code == 429
+    assert not main.blob_store.exists(hashlib.sha256(b"\x89PNG rejected").hexdigest())
+    batch = client.post("/api/comfyui/batch", json={"shots": [
+        {"prompt": "first", "workflow": {"1": {"class_type": "KSampler"}}, "priority": 1},
+        {"prompt": "shot", "workflow": {}},
+    ]})
+    assert batch.status_code == 429
+    assert client.get(f"/api/comfyui/job/{first['jobId']}").json()["data"]["priority"] == 5  # not promoted
+
+    client.delete(f"/api/comfyui/job/{first['jobId']}")
+    # 100s queued: one more shot fits, but the second shot of a batch would wait 200s
+    shots = [{"prompt": f"shot {i}", "workflow": {"1": {"class_type": "KSampler"}}} for i in range(2)]
+    assert client.post("/api/comfyui/batch", json={"shots": shots}).status_code == 429
+    assert client.post("/api/comfyui/batch", json={"shots": shots[:1]}).status_code == 200
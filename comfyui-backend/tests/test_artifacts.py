@@ -0,0 +1,99 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from artifacts import parse_range
+
+VIDEO = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def completed_job(tmp_path):
+    video_path = tmp_path / "out.mp4"
+    video_path.write_bytes(VIDEO)
+    job_id = f"job-{time.time_ns()}"
+    main.jobs.add({
+        "id": job_id,
+        "state": main.JobState.COMPLETED,
+        "progress": 100,
+        "userId": "anonymous",
+        "createdAt": time.time(),
+        "completedAt": time.time(),
+        "result": {
+            "artifact": main.artifact_info(str(video_path), f"/api/comfyui/job/{job_id}/artifact"),
+            "videoPath": str(video_path),
+        },
+    })
+    yield job_id
+    main.jobs.delete(job_id)
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=990-5000", 1000) == (990, 999)
+    assert parse_range("bytes=0-1,5-9", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=1000-", 1000)
+
+
+def test_status_carries_reference_not_payload(client, completed_job):
+    data = client.get(f"/api/comfyui/job/{completed_job}").json()["data"]
+    result = data["result"]
+
+    assert "imageData" not in result
+    assert result["artifact"]["size"] == len(VIDEO)
+    assert result["artifact"]["contentType"] == "video/mp4"
+    assert "sig=" in result["imageUrl"]
+
+
+def test_signed_url_streams_full_file(client, completed_job):
+    url = client.get(f"/api/comfyui/job/{completed_job}").json()["data"]["result"]["imageUrl"]
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.content == VIDEO
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(len(VIDEO))
+
+
+def test_range_request(client, completed_job):
+    url = f"/api/comfyui/job/{completed_job}/artifact"
+    response = client.get(url, headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == VIDEO[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(VIDEO)}"
+
+    response = client.get(url, headers={"Range": f"bytes={len(VIDEO)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(VIDEO)}"
+
+
+def test_conditional_requests(client, completed_job):
+    url = f"/api/comfyui/job/{completed_job}/artifact"
+    etag = client.head(url).headers["etag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Stale If-Range falls back to the full body
+    response = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert len(response.content) == len(VIDEO)
+
+
+def test_invalid_signature_requires_auth(client, completed_job, monkeypatch):
+    monkeypatch.setattr(main, "FIREBASE_ENABLED", True)
+    response = client.get(f"/api/comfyui/job/{completed_job}/artifact?expires=9999999999&sig=bad")
+    assert response.status_code == 401
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from benchmark import format_report, parse_distribution, percentile, summarize
+
+
+def test_percentile_interpolates():
+    values = [float(v) for v in range(1, 101)]
+
+    assert percentile(values, 50) == pytest.approx(50.5)
+    assert percentile(values, 99) == pytest.approx(99.01)
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_distributions_are_seeded():
+    first = parse_distribution("lognormal:2:0.5", random.Random(7))
+    second = parse_distribution("lognormal:2:0.5", random.Random(7))
+
+    assert [first() for _ in range(5)] == [second() for _ in range(5)]
+    assert parse_distribution("fixed:1.5", random.Random())() == 1.5
+    assert 1 <= parse_distribution("uniform:1:2", random.Random())() <= 2
+
+
+@pytest.mark.parametrize("spec", ["gamma:1", "fixed", "uniform:1", "exp:x"])
+def test_invalid_distributions_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_distribution(spec, random.Random())
+
+
+def test_report_formats_missing_values():
+    empty = summarize([])
+    report = {
+        "jobs": 0,
+        "completed": 0,
+        "elapsedSeconds": 1.0,
+        "throughputJobsPerSecond": 0.0,
+        "queueWaitSeconds": empty,
+        "endToEndSeconds": empty,
+        "submitLatencySeconds": summarize([0.01, 0.02]),
+        "statusLatencySeconds": empty,
+        "server": {"cpuPercent": None, "rssPeakBytes": 2**20},
+    }
+
+    text = format_report(report)
+    assert "Queue wait" in text
+    assert "peak RSS 1.0 MiB" in text
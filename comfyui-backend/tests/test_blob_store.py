@@ -0,0 +1,66 @@
+import base64
+import hashlib
+import os
+
+import pytest
+
+from blob_store import BlobStore, BlobTooLarge, decode_data_url, is_digest
+
+
+def test_put_is_content_addressed_and_deduplicated(tmp_path):
+    store = BlobStore(str(tmp_path))
+    digest, created = store.put(b"face")
+
+    assert digest == hashlib.sha256(b"face").hexdigest()
+    assert created
+    assert store.put(b"face") == (digest, False)
+    assert store.exists(digest)
+    with open(store.path(digest), "rb") as f:
+        assert f.read() == b"face"
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_streamed_upload_respects_size_limit(tmp_path):
+    store = BlobStore(str(tmp_path), max_blob_bytes=8)
+    upload = store.upload()
+    upload.write(b"12345")
+    with pytest.raises(BlobTooLarge):
+        upload.write(b"67890")
+    upload.abort()
+
+    assert os.listdir(store.tmp_dir) == []
+    assert not store.exists(hashlib.sha256(b"1234567890").hexdigest())
+
+
+def test_partial_uploads_are_cleared_on_start(tmp_path):
+    store = BlobStore(str(tmp_path))
+    store.upload().write(b"half")
+
+    reopened = BlobStore(str(tmp_path))
+    assert os.listdir(reopened.tmp_dir) == []
+
+
+def test_unused_blobs_expire(tmp_path):
+    store = BlobStore(str(tmp_path))
+    old, _ = store.put(b"old")
+    new, _ = store.put(b"new")
+    os.utime(store.path(old), (1000, 1000))
+
+    assert store.evict_unused(3600) == 1
+    assert not store.exists(old)
+    assert store.exists(new)
+
+
+def test_decode_data_url():
+    encoded = base64.b64encode(b"png-bytes").decode()
+
+    assert decode_data_url(f"data:image/png;base64,{encoded}") == b"png-bytes"
+    assert decode_data_url(encoded) == b"png-bytes"
+    with pytest.raises(ValueError):
+        decode_data_url("data:image/png;base64,not base64!")
+
+
+def test_is_digest_rejects_paths():
+    assert is_digest("a" * 64)
+    assert not is_digest("../" + "a" * 61)
+    assert not is_digest("A" * 64)
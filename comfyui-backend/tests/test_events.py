@@ -0,0 +1,92 @@
+import asyncio
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from events import EventBus
+
+
+def event(job_id: str, user_id: str, state: str = "running", progress: float = 0) -> dict:
+    return {"jobId": job_id, "userId": user_id, "state": state, "progress": progress}
+
+
+def test_publish_fans_out_to_job_and_user_subscribers():
+    async def scenario():
+        bus = EventBus()
+        job_sub = bus.subscribe(job_id="job-1")
+        user_sub = bus.subscribe(user_id="alice")
+        other_sub = bus.subscribe(user_id="bob")
+
+        bus.publish(event("job-1", "alice", progress=30))
+
+        assert (await job_sub.get(timeout=1))["progress"] == 30
+        assert (await user_sub.get(timeout=1))["jobId"] == "job-1"
+        assert await other_sub.get(timeout=0.01) is None
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_keeps_latest_events():
+    async def scenario():
+        bus = EventBus(max_queue=3)
+        sub = bus.subscribe(job_id="job-1")
+        for progress in range(10):
+            bus.publish(event("job-1", "alice", progress=progress))
+
+        received = [(await sub.get(timeout=1))["progress"] for _ in range(3)]
+        assert received == [7, 8, 9]
+        assert sub.dropped == 7
+
+    asyncio.run(scenario())
+
+
+def test_unsubscribe_releases_index():
+    async def scenario():
+        bus = EventBus()
+        with bus.subscribe(job_id="job-1"):
+            with bus.subscribe(user_id="alice"):
+                assert bus.subscriber_count == 2
+        assert bus.subscriber_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_end_all_wakes_every_listener():
+    async def scenario():
+        bus = EventBus()
+        job_sub = bus.subscribe(job_id="job-1")
+        user_sub = bus.subscribe(user_id="alice")
+        waiting = asyncio.ensure_future(job_sub.get(timeout=10))
+        await asyncio.sleep(0)
+
+        assert bus.end_all() == 2
+        assert await asyncio.wait_for(waiting, 1) is None
+        assert job_sub.ended and user_sub.ended
+        assert await user_sub.get(timeout=1) is None
+
+    asyncio.run(scenario())
+
+
+def test_sse_stream_ends_after_terminal_state():
+    job_id = f"job-{time.time_ns()}"
+    main.jobs.add({
+        "id": job_id,
+        "state": main.JobState.COMPLETED,
+        "progress": 100,
+        "userId": "anonymous",
+        "createdAt": time.time(),
+        "completedAt": time.time(),
+    })
+    try:
+        client = TestClient(main.app)
+        with client.stream("GET", f"/api/comfyui/job/{job_id}/events") as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            body = "".join(response.iter_text())
+    finally:
+        main.jobs.delete(job_id)
+
+    data = json.loads(body.split("data: ", 1)[1])
+    assert data["jobId"] == job_id
+    assert data["state"] == "completed"
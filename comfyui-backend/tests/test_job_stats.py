@@ -0,0 +1,55 @@
+from job_stats import JobStats
+from job_store import MemoryJobStore
+from workflow_analysis import detect_tier
+
+
+def make_job(job_id: str, user_id: str = "alice", tier: str = "animatediff") -> dict:
+    return {"id": job_id, "state": "queued", "userId": user_id, "tier": tier, "createdAt": 0}
+
+
+def transition(stats: JobStats, job: dict, state: str):
+    stats.transitioned(job, job["state"], state)
+    job["state"] = state
+
+
+def test_transitions_move_counts_between_states():
+    stats = JobStats()
+    a, b = make_job("a"), make_job("b", user_id="bob", tier="svd")
+    stats.created(a)
+    stats.created(b)
+    transition(stats, a, "running")
+    transition(stats, a, "completed")
+    transition(stats, b, "running")
+
+    assert stats.total == 2
+    assert stats.count("completed") == 1
+    assert stats.count("running") == 1
+    assert stats.count("queued") == 0
+    assert stats.user_counts("alice") == {"completed": 1}
+    assert stats.tier_counts()["svd"]["running"] == 1
+
+
+def test_seed_matches_store_and_eviction_decrements():
+    store = MemoryJobStore()
+    for i, user in enumerate(["alice", "alice", "bob"]):
+        job = make_job(f"job-{i}", user_id=user)
+        store.add(job)
+        job.update(state="completed", completedAt=1)
+        store.save(job)
+
+    stats = JobStats()
+    stats.seed(store.summary())
+    assert stats.count("completed") == 3
+    assert stats.user_counts("bob") == {"completed": 1}
+
+    for job in store.evict_expired(ttl_seconds=10, now=100):
+        stats.removed(job)
+    assert stats.total == 0
+    assert stats.user_counts("bob") == {}
+
+
+def test_detect_tier():
+    assert detect_tier({"1": {"class_type": "WanVideoSampler"}}) == "wan"
+    assert detect_tier({"1": {"class_type": "SVD_img2vid_Conditioning"}}) == "svd"
+    assert detect_tier({"1": {"class_type": "ADE_LoadAnimateDiffModel"}}) == "animatediff"
+    assert detect_tier({"1": {"class_type": "KSampler"}}) == "other"
@@ -0,0 +1,126 @@
+import time
+
+from job_store import MemoryJobStore, SQLiteJobStore
+
+
+def make_job(job_id: str, state: str = "queued", **extra) -> dict:
+    job = {
+        "id": job_id,
+        "state": state,
+        "progress": 0,
+        "userId": "user-1",
+        "createdAt": time.time(),
+        "workflow": {"1": {"class_type": "KSampler"}},
+        "referenceImage": "data:image/png;base64,AAAA",
+        "priority": 5,
+    }
+    job.update(extra)
+    return job
+
+
+def finish(store, job: dict, completed_at: float = None):
+    job["state"] = "completed"
+    job["completedAt"] = completed_at or time.time()
+    store.save(job)
+
+
+def test_sqlite_store_survives_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = SQLiteJobStore(path)
+    store.add(make_job("queued-1"))
+    running = make_job("running-1")
+    store.add(running)
+    running["state"] = "running"
+    store.save(running)
+    done = make_job("done-1")
+    store.add(done)
+    finish(store, done)
+    store.close()
+
+    reopened = SQLiteJobStore(path)
+    recovered = {job["id"]: job for job in reopened.recover()}
+    assert set(recovered) == {"queued-1", "running-1"}
+    assert recovered["running-1"]["workflow"] == {"1": {"class_type": "KSampler"}}
+    assert reopened.get("done-1")["state"] == "completed"
+    assert reopened.count_by_state() == {"queued": 1, "running": 1, "completed": 1}
+    assert journal_mode(reopened) == "wal"
+
+
+def journal_mode(store: SQLiteJobStore) -> str:
+    return store._db.execute("PRAGMA journal_mode").fetchone()[0]
+
+
+def test_finished_jobs_drop_heavy_fields(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    job = make_job("job-1")
+    store.add(job)
+    finish(store, job)
+
+    store._finished.clear()
+    reloaded = store.get("job-1")
+    assert "workflow" not in reloaded
+    assert "referenceImage" not in reloaded
+
+
+def test_hot_set_is_bounded_but_jobs_stay_readable(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"), hot_size=3)
+    for i in range(10):
+        job = make_job(f"job-{i}")
+        store.add(job)
+        finish(store, job)
+
+    assert len(store._finished) == 3
+    assert len(store) == 10
+    assert store.get("job-0")["state"] == "completed"
+
+
+def test_active_jobs_are_never_evicted_from_memory():
+    store = MemoryJobStore(hot_size=1)
+    for i in range(5):
+        store.add(make_job(f"job-{i}"))
+    done = make_job("done")
+    store.add(done)
+    finish(store, done)
+
+    assert all(store.get(f"job-{i}") is not None for i in range(5))
+
+
+def test_ttl_eviction(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    now = time.time()
+    old = make_job("old")
+    store.add(old)
+    finish(store, old, completed_at=now - 7200)
+    fresh = make_job("fresh")
+    store.add(fresh)
+    finish(store, fresh, completed_at=now - 60)
+    store.add(make_job("queued"))
+
+    assert [job["id"] for job in store.evict_expired(3600, now=now)] == ["old"]
+    assert store.get("old") is None
+    assert store.get("fresh") is not None
+    assert store.get("queued") is not None
+
+
+def test_batch_is_stored_with_its_jobs(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = SQLiteJobStore(path)
+    shots = [make_job(f"shot-{i}", batchId="scene-1") for i in range(3)]
+    store.add_batch({"id": "scene-1", "userId": "user-1", "createdAt": time.time(), "jobIds": ["shot-0", "shot-1", "shot-2"]}, shots)
+    store.close()
+
+    reopened = SQLiteJobStore(path)
+    assert reopened.get_batch("scene-1")["jobIds"] == ["shot-0", "shot-1", "shot-2"]
+    assert [job["id"] for job in reopened.recover()] == ["shot-0", "shot-1", "shot-2"]
+
+
+def test_batch_eviction_waits_for_active_jobs():
+    store = MemoryJobStore()
+    now = time.time()
+    shot = make_job("shot")
+    store.add_batch({"id": "old", "userId": "user-1", "createdAt": now - 7200, "jobIds": ["shot"]}, [shot])
+
+    assert store.evict_expired_batches(3600, now=now) == 0
+    finish(store, shot)
+    assert store.evict_expired_batches(3600, now=now) == 1
+    assert store.get_batch("old") is None
@@ -0,0 +1,38 @@
+import pytest
+
+from metrics import MetricsRegistry
+
+
+def test_exposition_format():
+    registry = MetricsRegistry()
+    jobs = registry.counter("jobs_total", "Jobs", ["state"])
+    queued = registry.gauge("queued", "Queued jobs", fn=lambda: 3)
+    latency = registry.histogram("latency_seconds", "Latency", ["route"], buckets=(0.1, 1))
+
+    jobs.inc(state="completed")
+    jobs.inc(2, state='fa"iled')
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(5, route="/a")
+
+    text = registry.render()
+    assert "# TYPE jobs_total counter" in text
+    assert 'jobs_total{state="completed"} 1' in text
+    assert 'jobs_total{state="fa\\"iled"} 2' in text
+    assert "queued 3" in text
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_seconds_sum{route="/a"} 5.55' in text
+    assert 'latency_seconds_count{route="/a"} 3' in text
+    assert queued.value() == 3
+
+
+def test_labels_must_match():
+    registry = MetricsRegistry()
+    jobs = registry.counter("jobs_total", "Jobs", ["state"])
+
+    with pytest.raises(ValueError):
+        jobs.inc(tier="wan")
+    with pytest.raises(ValueError):
+        registry.counter("jobs_total", "Jobs again")
@@ -0,0 +1,49 @@
+import os
+import uuid
+
+from output_store import OutputStore
+
+
+def write_output(store: OutputStore, size: int) -> str:
+    job_id = str(uuid.uuid4())
+    os.makedirs(store.job_dir(job_id))
+    with open(os.path.join(store.job_dir(job_id), "out.mp4"), "wb") as f:
+        f.write(b"\0" * size)
+    return job_id
+
+
+def test_quota_evicts_least_recently_used(tmp_path):
+    store = OutputStore(str(tmp_path), quota_bytes=250)
+    a, b, c = (write_output(store, 100) for _ in range(3))
+    for job_id in (a, b, c):
+        store.add(job_id, 100)
+
+    store.touch(a)
+    evicted = store.select_evictions()
+    assert evicted == [b]
+    assert store.used_bytes == 200
+
+    store.delete(evicted)
+    assert not os.path.exists(store.job_dir(b))
+    assert os.path.exists(store.job_dir(a))
+
+
+def test_newest_output_is_kept_even_over_quota(tmp_path):
+    store = OutputStore(str(tmp_path), quota_bytes=10)
+    job_id = write_output(store, 100)
+    store.add(job_id, 100)
+
+    assert store.select_evictions() == []
+
+
+def test_scan_tracks_completed_and_reports_orphans(tmp_path):
+    store = OutputStore(str(tmp_path))
+    done = write_output(store, 50)
+    crashed = write_output(store, 70)
+    (tmp_path / "not-a-job").mkdir()
+
+    orphans = store.scan(lambda job_id: job_id == done)
+    assert orphans == [crashed]
+    assert done in store
+    assert store.used_bytes == 50
+    assert store.usage()["jobs"] == 1
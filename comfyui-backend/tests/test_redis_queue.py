@@ -0,0 +1,248 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # fakeredis needs it for Lua scripts
+
+from job_store import RedisJobStore
+from redis_queue import RedisJobQueue
+from test_job_store import finish, make_job
+from test_scheduler import FakeClock
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_queue(server, replica_id: str, clock: FakeClock, **kwargs) -> RedisJobQueue:
+    client = fakeredis.FakeRedis(server=server)
+    return RedisJobQueue(client, replica_id, aging_interval=60, visibility_timeout=30, clock=clock, **kwargs)
+
+
+def test_replicas_claim_each_job_once(server):
+    clock = FakeClock()
+    a = make_queue(server, "a", clock)
+    b = make_queue(server, "b", clock)
+    a.push("bulk", priority=9)
+    b.push("preview", priority=1)
+    a.push("normal", priority=5)
+
+    assert len(a) == len(b) == 3
+    assert b.pop() == "preview"
+    assert a.pop() == "normal"
+    assert b.pop() == "bulk"
+    assert a.pop() is None
+    assert not b
+
+
+def test_claimed_job_is_not_requeued_by_push(server):
+    clock = FakeClock()
+    queue = make_queue(server, "a", clock)
+    queue.push("job-1")
+    assert queue.pop() == "job-1"
+
+    queue.push("job-1", priority=1)
+    assert "job-1" not in queue
+
+
+def test_expired_lease_is_taken_over_and_requeued(server):
+    clock = FakeClock()
+    crashed = make_queue(server, "crashed", clock)
+    survivor = make_queue(server, "survivor", clock)
+    crashed.push("job-1", priority=1)
+    crashed.push("job-2", priority=5)
+    assert crashed.pop() == "job-1"
+
+    clock.now += 10
+    assert survivor.reclaim_expired() == []
+
+    clock.now += 30
+    assert survivor.reclaim_expired() == ["job-1"]
+    assert crashed.reclaim_expired() == []  # only one replica takes over
+    assert survivor.requeue("job-1")
+
+    # Back at its original position, ahead of the lower priority job
+    assert survivor.pop() == "job-1"
+
+
+def test_heartbeat_extends_lease(server):
+    clock = FakeClock()
+    owner = make_queue(server, "owner", clock)
+    other = make_queue(server, "other", clock)
+    owner.push("job-1")
+    assert owner.pop() == "job-1"
+
+    for _ in range(5):
+        clock.now += 20
+        assert owner.heartbeat() == []
+        assert other.reclaim_expired() == []
+
+    owner.job_finished("job-1")
+    clock.now += 60
+    assert other.reclaim_expired() == []
+
+
+def test_remote_cancel_reaches_owner(server):
+    clock = FakeClock()
+    owner = make_queue(server, "owner", clock)
+    other = make_queue(server, "other", clock)
+    owner.push("job-1")
+    owner.push("job-2")
+    assert owner.pop() == "job-1"
+    assert owner.pop() == "job-2"
+
+    assert not other.remove("job-1")  # already claimed
+    other.request_cancel("job-1")
+    assert owner.heartbeat() == ["job-1"]
+
+    owner.job_finished("job-1")
+    assert owner.heartbeat() == []
+
+
+def test_finished_job_of_taken_over_lease_keeps_new_owner(server):
+    clock = FakeClock()
+    slow = make_queue(server, "slow", clock)
+    other = make_queue(server, "other", clock)
+    slow.push("job-1")
+    assert slow.pop() == "job-1"
+
+    clock.now += 31
+    assert other.reclaim_expired() == ["job-1"]
+    slow.job_finished("job-1")  # must not release the other replica's lease
+    assert not other.remove("job-1")
+    assert other.requeue("job-1")
+    assert other.pop() == "job-1"
+
+
+def test_depth_counts_jobs_of_all_replicas_per_tier(server):
+    clock = FakeClock()
+    tiers = {"wan": "wan", "svd-1": "svd", "svd-2": "svd"}
+    a = make_queue(server, "a", clock, tier_fn=tiers.get)
+    b = make_queue(server, "b", clock, tier_fn=tiers.get)
+    a.push("wan", priority=1)
+    a.push("svd-1")
+    a.push("svd-1", priority=2)  # priority update, not a second job
+    b.push("svd-2")
+    assert b.depth() == {"wan": {"queued": 1, "running": 0}, "svd": {"queued": 2, "running": 0}}
+
+    assert b.pop() == "wan"
+    assert a.remove("svd-2")
+    assert a.depth() == {"wan": {"queued": 0, "running": 1}, "svd": {"queued": 1, "running": 0}}
+
+    clock.now += 31
+    assert a.reclaim_expired() == ["wan"]
+    b.job_finished("wan")  # lease taken over: not b's to release
+    assert a.requeue("wan")
+    assert a.depth()["wan"] == {"queued": 1, "running": 0}
+    assert a.pop() == "wan"
+    a.job_finished("wan")
+    assert a.depth()["wan"] == {"queued": 0, "running": 0}
+
+
+def test_replicas_are_counted_by_heartbeat(server):
+    clock = FakeClock()
+    a = make_queue(server, "a", clock)
+    b = make_queue(server, "b", clock)
+    assert a.replicas() == 1
+    a.heartbeat()
+    b.heartbeat()
+    assert a.replicas() == 2
+
+    clock.now += 31
+    a.heartbeat()
+    assert a.replicas() == 1
+
+
+def test_over_budget_head_blocks(server):
+    clock = FakeClock()
+    costs = {"big": 20.0, "small": 2.0}
+    queue = make_queue(server, "a", clock, cost_fn=costs.get)
+    queue.push("big", priority=1)
+    queue.push("small", priority=5)
+
+    assert queue.pop(max_cost=8) is None
+    assert queue.pop(max_cost=24) == "big"
+    assert queue.pop(max_cost=4) == "small"
+
+
+def test_preferred_job_overtakes_head_boundedly(server):
+    clock = FakeClock()
+    queue = make_queue(server, "a", clock, reorder_window=3, max_skips=1)
+    for job_id in ("head", "second", "warm-1", "warm-2"):
+        clock.now += 1
+        queue.push(job_id)
+
+    warm = lambda job_id: job_id.startswith("warm")
+    assert queue.pop(prefer=warm) == "warm-1"
+    assert queue.pop(prefer=warm) == "head"  # overtaken max_skips times
+    assert queue.pop(prefer=warm) == "warm-2"
+    assert queue.pop(prefer=warm) == "second"
+
+
+def test_redis_store_shares_status_between_replicas(server):
+    a = RedisJobStore(fakeredis.FakeRedis(server=server), progress_interval=0)
+    b = RedisJobStore(fakeredis.FakeRedis(server=server), progress_interval=0)
+    job = make_job("job-1")
+    a.add(job)
+    assert b.get("job-1")["state"] == "queued"
+
+    job["state"] = "running"
+    a.save(job)
+    job["progress"] = 40
+    a.save_progress(job)
+    assert b.get("job-1")["progress"] == 40
+    assert [j["id"] for j in b.active_jobs()] == ["job-1"]
+
+    finish(a, job)
+    assert b.get("job-1")["state"] == "completed"
+    assert "workflow" not in b.get("job-1")
+    assert b.active_jobs() == []
+    assert len(b) == 1
+
+
+def test_redis_store_serves_changes_to_finished_jobs(server):
+    a = RedisJobStore(fakeredis.FakeRedis(server=server))
+    b = RedisJobStore(fakeredis.FakeRedis(server=server))
+    job = make_job("job-1")
+    a.add(job)
+    job["result"] = {"videoPath": "/out/job-1/video.mp4"}
+    finish(a, job)
+    assert b.get("job-1")["result"] == {"videoPath": "/out/job-1/video.mp4"}
+
+    # Renditions are added after completion, eviction may happen on any replica
+    job["result"] = {**job["result"], "renditions": {"poster": {}}}
+    a.save(job)
+    assert "renditions" in b.get("job-1")["result"]
+    evicted = b.get("job-1")
+    evicted["result"] = {**evicted["result"], "evicted": True}
+    b.save(evicted)
+    assert a.get("job-1")["result"]["evicted"] is True
+
+
+def test_redis_store_evicts_each_job_once(server):
+    a = RedisJobStore(fakeredis.FakeRedis(server=server))
+    b = RedisJobStore(fakeredis.FakeRedis(server=server))
+    old = make_job("old")
+    a.add(old)
+    finish(a, old, completed_at=1000.0)
+    new = make_job("new")
+    a.add(new)
+    finish(a, new)
+
+    assert [job["id"] for job in b.evict_expired(3600)] == ["old"]
+    assert a.evict_expired(3600) == []
+    assert a.get("old") is None
+    assert b.get("new")["state"] == "completed"
+
+
+def test_redis_store_keeps_batches_with_active_jobs(server):
+    store = RedisJobStore(fakeredis.FakeRedis(server=server))
+    done = make_job("done")
+    queued = make_job("queued")
+    store.add_batch({"id": "b1", "createdAt": 1000.0, "jobIds": ["done"]}, [done])
+    store.add_batch({"id": "b2", "createdAt": 1000.0, "jobIds": ["queued"]}, [queued])
+    finish(store, done)
+
+    assert store.evict_expired_batches(3600) == 1
+    assert store.get_batch("b1") is None
+    assert store.get_batch("b2")["jobIds"] == ["queued"]
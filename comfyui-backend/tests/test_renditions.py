@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+import pytest
+
+from renditions import RenditionPipeline, ffmpeg_args
+
+
+def make_source(tmp_path) -> str:
+    source = tmp_path / "render.mp4"
+    source.write_bytes(b"\x00\x00\x00\x18ftypmp42video")
+    return str(source)
+
+
+def test_renders_each_configured_variant(tmp_path, fake_ffmpeg):
+    pipeline = RenditionPipeline(["poster", "preview", "web"], ffmpeg=fake_ffmpeg)
+    out = tmp_path / "renditions"
+
+    paths = asyncio.run(pipeline.render(make_source(tmp_path), str(out)))
+
+    assert paths == {
+        "poster": str(out / "poster.jpg"),
+        "preview": str(out / "preview.mp4"),
+        "web": str(out / "web.mp4"),
+    }
+    assert sorted(os.listdir(out)) == ["poster.jpg", "preview.mp4", "web.mp4"]
+
+
+def test_failed_rendition_is_skipped(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "preview")
+    pipeline = RenditionPipeline(["poster", "preview"], ffmpeg=fake_ffmpeg)
+    out = tmp_path / "renditions"
+
+    paths = asyncio.run(pipeline.render(make_source(tmp_path), str(out)))
+
+    assert list(paths) == ["poster"]
+    assert pipeline.failures == 1
+    assert os.listdir(out) == ["poster.jpg"]
+
+
+def test_process_count_is_bounded(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "0.3")
+    pipeline = RenditionPipeline(["poster", "preview", "web"], ffmpeg=fake_ffmpeg, max_processes=2)
+
+    async def render_twice():
+        source = make_source(tmp_path)
+        await asyncio.gather(
+            pipeline.render(source, str(tmp_path / "a")),
+            pipeline.render(source, str(tmp_path / "b")),
+        )
+
+    asyncio.run(render_twice())
+
+    events = []
+    for line in (tmp_path / "ffmpeg.log").read_text().splitlines():
+        kind, at = line.split()
+        events.append((float(at), 1 if kind == "start" else -1))
+    running = peak = 0
+    for _, delta in sorted(events, key=lambda e: (e[0], e[1])):
+        running += delta
+        peak = max(peak, running)
+    assert len(events) == 12
+    assert peak == 2
+
+
+def test_timeout_kills_ffmpeg(tmp_path, fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_SECONDS", "10")
+    pipeline = RenditionPipeline(["poster"], ffmpeg=fake_ffmpeg, timeout=0.5)
+
+    assert asyncio.run(pipeline.render(make_source(tmp_path), str(tmp_path / "out"))) == {}
+    assert pipeline.failures == 1
+
+
+def test_disabled_without_ffmpeg_or_renditions(tmp_path):
+    assert not RenditionPipeline(ffmpeg=str(tmp_path / "missing")).enabled
+    assert not RenditionPipeline([], ffmpeg="sh").enabled
+    with pytest.raises(ValueError):
+        RenditionPipeline(["gif"])
+
+
+def test_web_rendition_only_remuxes():
+    args = ffmpeg_args("web", "in.mp4", "out.mp4", 360)
+    assert args[args.index("-c") + 1] == "copy"
+    assert "+faststart" in args
@@ -0,0 +1,41 @@
+from result_cache import ResultCache, request_fingerprint
+
+
+def test_fingerprint_is_key_order_independent():
+    a = request_fingerprint("u1", "cat", {"1": {"class_type": "KSampler", "inputs": {"seed": 1, "steps": 20}}}, None)
+    b = request_fingerprint("u1", "cat", {"1": {"inputs": {"steps": 20, "seed": 1}, "class_type": "KSampler"}}, None)
+    assert a == b
+
+
+def test_fingerprint_changes_with_any_input():
+    base = request_fingerprint("u1", "cat", {"seed": 1}, None)
+    assert request_fingerprint("u2", "cat", {"seed": 1}, None) != base
+    assert request_fingerprint("u1", "dog", {"seed": 1}, None) != base
+    assert request_fingerprint("u1", "cat", {"seed": 2}, None) != base
+    assert request_fingerprint("u1", "cat", {"seed": 1}, "data:image/png;base64,AA") != base
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", "job-a")
+    cache.put("b", "job-b")
+    cache.get("a")
+    cache.put("c", "job-c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "job-a"
+    assert cache.evictions == 1
+
+
+def test_stats():
+    cache = ResultCache()
+    cache.record_hit()
+    cache.record_coalesced()
+    cache.record_miss()
+    cache.record_miss()
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["coalesced"] == 1
+    assert stats["misses"] == 2
+    assert stats["hitRate"] == 0.5
@@ -0,0 +1,208 @@
+import pytest
+
+from scheduler import FairShareScheduler, JobScheduler, parse_user_weights
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def drain(scheduler: JobScheduler):
+    out = []
+    while scheduler:
+        out.append(scheduler.pop())
+    return out
+
+
+def test_lower_priority_number_runs_first():
+    clock = FakeClock()
+    scheduler = JobScheduler(aging_interval=60, clock=clock)
+    scheduler.push("bulk", priority=9)
+    scheduler.push("preview", priority=1)
+    scheduler.push("normal", priority=5)
+
+    assert drain(scheduler) == ["preview", "normal", "bulk"]
+
+
+def test_equal_priority_is_fifo():
+    scheduler = JobScheduler(aging_interval=60, clock=FakeClock())
+    for i in range(50):
+        scheduler.push(f"job-{i}", priority=5)
+
+    assert drain(scheduler) == [f"job-{i}" for i in range(50)]
+
+
+def test_remove_keeps_heap_order():
+    scheduler = JobScheduler(aging_interval=0)
+    for i in range(20):
+        scheduler.push(f"job-{i}", priority=i % 7)
+
+    assert scheduler.remove("job-3")
+    assert scheduler.remove("job-14")
+    assert not scheduler.remove("job-14")
+    assert "job-3" not in scheduler
+
+    popped = drain(scheduler)
+    assert len(popped) == 18
+    priorities = [int(job_id.split("-")[1]) % 7 for job_id in popped]
+    assert priorities == sorted(priorities)
+
+
+def test_aging_prevents_starvation():
+    clock = FakeClock()
+    scheduler = JobScheduler(aging_interval=10, clock=clock)
+    scheduler.push("old-bulk", priority=9)
+
+    # A stream of urgent jobs arriving long after the bulk job was queued
+    clock.now += 100
+    scheduler.push("urgent", priority=1)
+
+    assert scheduler.pop() == "old-bulk"
+    assert scheduler.pop() == "urgent"
+
+
+def test_push_existing_job_updates_priority():
+    scheduler = JobScheduler(aging_interval=0)
+    scheduler.push("a", priority=5)
+    scheduler.push("b", priority=5)
+    scheduler.push("b", priority=1)
+
+    assert len(scheduler) == 2
+    assert scheduler.position("b") == 0
+    assert drain(scheduler) == ["b", "a"]
+
+
+def test_fair_share_interleaves_users():
+    scheduler = FairShareScheduler(aging_interval=0)
+    for i in range(6):
+        scheduler.push(f"heavy-{i}", user_id="heavy")
+    scheduler.push("light-0", user_id="light")
+    scheduler.push("light-1", user_id="light")
+
+    order = drain(scheduler)
+    assert order[:4] == ["heavy-0", "light-0", "heavy-1", "light-1"]
+    assert len(scheduler) == 0
+
+
+def test_fair_share_weights():
+    scheduler = FairShareScheduler(aging_interval=0, weights={"gold": 3})
+    for i in range(9):
+        scheduler.push(f"gold-{i}", user_id="gold")
+        scheduler.push(f"free-{i}", user_id="free")
+
+    first_eight = drain(scheduler)[:8]
+    assert sum(job.startswith("gold") for job in first_eight) == 6
+
+
+def test_fair_share_priority_within_user():
+    scheduler = FairShareScheduler(aging_interval=0)
+    scheduler.push("bulk", priority=9, user_id="alice")
+    scheduler.push("preview", priority=1, user_id="alice")
+
+    assert scheduler.pop() == "preview"
+
+
+def test_per_user_concurrency_cap():
+    scheduler = FairShareScheduler(aging_interval=0, max_running_per_user=1)
+    scheduler.push("a-0", user_id="alice")
+    scheduler.push("a-1", user_id="alice")
+    scheduler.push("b-0", user_id="bob")
+
+    assert scheduler.pop() == "a-0"
+    assert scheduler.pop() == "b-0"
+    assert scheduler.pop() is None  # alice is capped, bob has nothing queued
+    assert len(scheduler) == 1
+
+    scheduler.job_finished("a-0")
+    assert scheduler.pop() == "a-1"
+
+
+def test_fair_share_remove():
+    scheduler = FairShareScheduler(aging_interval=0)
+    scheduler.push("a-0", user_id="alice")
+    scheduler.push("b-0", user_id="bob")
+
+    assert scheduler.remove("a-0")
+    assert not scheduler.remove("a-0")
+    assert "a-0" not in scheduler
+    assert drain(scheduler) == ["b-0"]
+
+
+def test_batches_take_turns_within_a_user():
+    scheduler = FairShareScheduler(aging_interval=0)
+    for i in range(3):
+        scheduler.push(f"scene-{i}", user_id="alice", batch_id="scene")
+    scheduler.push("preview", priority=9, user_id="alice")
+
+    assert drain(scheduler) == ["scene-0", "preview", "scene-1", "scene-2"]
+
+
+def test_batch_counts_as_one_tenant():
+    scheduler = FairShareScheduler(aging_interval=0)
+    for batch in ("a", "b"):
+        for i in range(3):
+            scheduler.push(f"{batch}-{i}", user_id="alice", batch_id=batch)
+    for i in range(3):
+        scheduler.push(f"bob-{i}", user_id="bob")
+
+    first_four = drain(scheduler)[:4]
+    assert sum(job.startswith("bob") for job in first_four) == 2
+
+
+def test_reorder_window_prefers_resident_models():
+    scheduler = JobScheduler(aging_interval=0, reorder_window=2, max_skips=5)
+    for job_id in ("svd-0", "wan-0", "svd-1", "wan-1"):
+        scheduler.push(job_id)
+
+    wan_loaded = lambda job_id: job_id.startswith("wan")
+    assert scheduler.pop(wan_loaded) == "wan-0"
+    assert scheduler.pop(wan_loaded) == "svd-0"  # wan-1 is outside the window
+    assert drain(scheduler) == ["svd-1", "wan-1"]
+
+
+def test_reorder_is_bounded_by_max_skips():
+    scheduler = FairShareScheduler(aging_interval=0, reorder_window=10, max_skips=2)
+    scheduler.push("svd", user_id="alice")
+    for i in range(5):
+        scheduler.push(f"wan-{i}", user_id="alice")
+
+    wan_loaded = lambda job_id: job_id.startswith("wan")
+    order = [scheduler.pop(wan_loaded) for _ in range(4)]
+    assert order == ["wan-0", "wan-1", "svd", "wan-2"]
+
+
+def test_job_over_budget_keeps_its_turn():
+    costs = {"big": 20.0, "small": 2.0}
+    scheduler = FairShareScheduler(aging_interval=0, quantum=4, cost_fn=lambda job_id: costs[job_id.split("-")[0]])
+    scheduler.push("big-0", user_id="alice")
+    for i in range(10):
+        scheduler.push(f"small-{i}", user_id="bob")
+
+    started = []
+    while (job_id := scheduler.pop(max_cost=10)) is not None:
+        started.append(job_id)
+
+    # Once big-0 has earned its turn, small jobs wait behind it instead of starving it
+    assert started == [f"small-{i}" for i in range(8)]
+    assert scheduler.pop(max_cost=10) is None
+    assert scheduler.pop(max_cost=24) == "big-0"
+    assert scheduler.pop(max_cost=10) == "small-8"
+
+
+@pytest.mark.parametrize("kwargs", [{"quantum": 0}, {"quantum": -1}, {"default_weight": 0}, {"weights": {"u": 0}}, {"weights": {"u": -2}}])
+def test_fair_share_rejects_non_positive_credit(kwargs):
+    # Zero credit per turn would make pop() spin forever
+    with pytest.raises(ValueError):
+        FairShareScheduler(**kwargs)
+
+
+def test_user_weights_are_parsed_and_validated():
+    assert parse_user_weights(" gold:3, bronze:0.5 ,") == {"gold": 3.0, "bronze": 0.5}
+    assert parse_user_weights("") == {}
+    for spec in ("gold", "gold:", "gold:x", "gold:0", ":2"):
+        with pytest.raises(ValueError, match="USER_WEIGHTS entry"):
+            parse_user_weights(spec)
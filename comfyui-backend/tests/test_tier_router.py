@@ -0,0 +1,36 @@
+import pytest
+
+from tier_router import LatencyModel
+
+DEFAULTS = {"svd": 100.0, "animatediff": 30.0, "other": 60.0}
+
+
+def test_ewma_replaces_default_runtime():
+    model = LatencyModel(alpha=0.5, defaults=DEFAULTS)
+    assert model.runtime("svd") == 100
+    assert model.runtime("unknown") == 60
+
+    model.observe("svd", 40)
+    assert model.runtime("svd") == 40
+    model.observe("svd", 80)
+    assert model.runtime("svd") == pytest.approx(60)
+    assert model.stats()["svd"] == {"expectedSeconds": 60, "samples": 2}
+
+
+def test_expected_wait_spreads_backlog_over_slots():
+    model = LatencyModel(defaults=DEFAULTS)
+    assert model.expected_wait({}, slots=2) == 0
+    assert model.expected_wait({"svd": {"running": 1}}, slots=2) == 0  # a slot is free
+
+    depth = {"svd": {"queued": 2, "running": 2}, "animatediff": {"queued": 1}}
+    # 2 x 100 queued + 2 x 50 remaining + 30, over two slots
+    assert model.expected_wait(depth, slots=2) == pytest.approx(165)
+
+
+def test_choose_prefers_first_tier_that_meets_target():
+    model = LatencyModel(defaults=DEFAULTS)
+    tiers = ["svd", "animatediff"]
+
+    assert model.choose(tiers, wait=0, target=120) == (0, 100)
+    assert model.choose(tiers, wait=50, target=120) == (1, 80)  # downgraded under load
+    assert model.choose(tiers, wait=500, target=120) == (1, 530)  # nothing meets it: fastest
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from token_cache import TokenCache
+
+
+class FakeVerifier:
+    def __init__(self, delay: float = 0.0, lifetime: float = 3600):
+        self.calls = 0
+        self.threads = set()
+        self.delay = delay
+        self.lifetime = lifetime
+
+    def __call__(self, token: str) -> dict:
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        if token == "bad":
+            raise ValueError("signature mismatch")
+        return {"uid": f"user-{token}", "exp": time.time() + self.lifetime}
+
+
+def test_verified_token_is_cached():
+    verifier = FakeVerifier()
+    cache = TokenCache(verifier)
+
+    async def scenario():
+        for _ in range(5):
+            assert (await cache.verify("abc"))["uid"] == "user-abc"
+
+    asyncio.run(scenario())
+    assert verifier.calls == 1
+    assert cache.stats() == {"entries": 1, "hits": 4, "misses": 1}
+    assert threading.get_ident() not in verifier.threads
+
+
+def test_expired_token_is_verified_again():
+    verifier = FakeVerifier(lifetime=0.05)
+    cache = TokenCache(verifier)
+
+    async def scenario():
+        await cache.verify("abc")
+        await asyncio.sleep(0.1)
+        await cache.verify("abc")
+
+    asyncio.run(scenario())
+    assert verifier.calls == 2
+
+
+def test_concurrent_cold_requests_share_one_verification():
+    verifier = FakeVerifier(delay=0.1)
+    cache = TokenCache(verifier)
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.verify("abc") for _ in range(10)))
+        assert {r["uid"] for r in results} == {"user-abc"}
+
+    asyncio.run(scenario())
+    assert verifier.calls == 1
+
+
+def test_event_loop_not_blocked_by_verification():
+    cache = TokenCache(FakeVerifier(delay=0.3))
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await cache.verify("abc")
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
+
+
+def test_invalid_token_is_not_cached():
+    verifier = FakeVerifier()
+    cache = TokenCache(verifier)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await cache.verify("bad")
+
+    asyncio.run(scenario())
+    assert verifier.calls == 2
+    assert len(cache) == 0
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from tracing import JobTrace, TraceExporter, parse_traceparent
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+def make_trace() -> JobTrace:
+    trace = JobTrace("job-1", TRACE_ID, "00f067aa0ba902b7", start_ns=1_000_000_000)
+    trace.add("queue_wait", 1_000_000_000, 3_000_000_000)
+    with pytest.raises(RuntimeError):
+        with trace.span("execution", worker=0):
+            raise RuntimeError("out of memory")
+    trace.end(4_000_000_000, **{"job.state": "failed"})
+    return trace
+
+
+def test_traceparent_is_continued_or_ignored():
+    assert parse_traceparent(f"00-{TRACE_ID}-00f067aa0ba902b7-01") == (TRACE_ID, "00f067aa0ba902b7")
+    assert parse_traceparent(f"00-{'0' * 32}-00f067aa0ba902b7-01") == (None, None)
+    assert parse_traceparent("garbage") == (None, None)
+    assert parse_traceparent(None) == (None, None)
+
+
+def test_spans_record_phases_and_errors():
+    trace = make_trace()
+    wait, execution = trace.spans
+
+    assert wait.parent_id == execution.parent_id == trace.root.span_id
+    assert trace.root.parent_id == "00f067aa0ba902b7"
+    assert execution.error == "RuntimeError: out of memory"
+    assert trace.durations()["queue_wait"] == 2.0
+
+
+def test_otlp_export_writes_one_request_per_line(tmp_path):
+    exporter = TraceExporter(str(tmp_path / "traces.jsonl"), "otlp")
+    exporter.export(make_trace())
+    exporter.export(make_trace())
+
+    lines = (tmp_path / "traces.jsonl").read_text().splitlines()
+    assert len(lines) == 2
+    spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["job", "queue_wait", "execution"]
+    assert {span["traceId"] for span in spans} == {TRACE_ID}
+    assert spans[1]["startTimeUnixNano"] == "1000000000"
+    assert spans[2]["status"] == {"code": 2, "message": "RuntimeError: out of memory"}
+    assert {"key": "worker", "value": {"intValue": "0"}} in spans[2]["attributes"]
+
+
+def test_chrome_export_is_a_loadable_event_array(tmp_path):
+    path = tmp_path / "trace.json"
+    exporter = TraceExporter(str(path), "chrome")
+    exporter.export(make_trace())
+    exporter.export(make_trace())
+
+    # Viewers accept the missing closing bracket; close it to parse strictly
+    events = json.loads(path.read_text().rstrip().rstrip(",") + "]")
+    complete = [event for event in events if event["ph"] == "X"]
+    assert len(complete) == 6
+    assert {event["tid"] for event in complete} == {1, 2}
+    assert complete[1] == {**complete[1], "name": "queue_wait", "ts": 1_000_000, "dur": 2_000_000}
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        TraceExporter(str(tmp_path / "x"), "zipkin")
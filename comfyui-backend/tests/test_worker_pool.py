@@ -0,0 +1,135 @@
+import asyncio
+import os
+
+import pytest
+
+from worker_pool import WorkerError, preload_workflow
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 60))
+
+
+def test_pool_executes_workflow_on_long_lived_worker(tmp_path, make_stub_pool):
+    async def scenario():
+        pool = make_stub_pool()
+        await pool.start()
+        try:
+            assert pool.healthy_count == 2
+            pids = {w.process.pid for w in pool.workers}
+
+            progress = []
+            for i in range(3):
+                outputs = await pool.run({"1": {"class_type": "KSampler"}}, str(tmp_path / f"job{i}"), progress.append)
+                assert len(outputs) == 1
+                assert outputs[0].endswith(".mp4")
+                assert os.path.exists(outputs[0])
+
+            assert progress and progress[-1] == pytest.approx(1.0)
+            # Same processes served every job
+            assert {w.process.pid for w in pool.workers} == pids
+        finally:
+            await pool.stop()
+
+    run(scenario())
+
+
+def test_execution_error_is_reported(tmp_path, make_stub_pool):
+    async def scenario():
+        pool = make_stub_pool(size=1)
+        await pool.start()
+        try:
+            with pytest.raises(WorkerError, match="boom"):
+                await pool.run({"1": {"class_type": "StubFail", "inputs": {"message": "boom"}}}, str(tmp_path / "job"))
+            assert pool.busy_count == 0
+        finally:
+            await pool.stop()
+
+    run(scenario())
+
+
+def test_crashed_worker_is_restarted(tmp_path, make_stub_pool):
+    async def scenario():
+        pool = make_stub_pool(size=1)
+        await pool.start()
+        try:
+            worker = pool.workers[0]
+            worker.process.kill()
+            await worker.process.wait()
+
+            for _ in range(100):
+                await asyncio.sleep(0.1)
+                if worker.restarts and worker.healthy:
+                    break
+            assert worker.restarts == 1
+            outputs = await pool.run({"1": {"class_type": "KSampler"}}, str(tmp_path / "job"))
+            assert len(outputs) == 1
+        finally:
+            await pool.stop()
+
+    run(scenario())
+
+
+def test_cancelled_run_interrupts_worker(tmp_path, make_stub_pool):
+    async def scenario():
+        pool = make_stub_pool(size=1, run_seconds=30)
+        await pool.start()
+        try:
+            task = asyncio.create_task(pool.run({"1": {"class_type": "KSampler"}}, str(tmp_path / "job")))
+            await asyncio.sleep(1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert pool.busy_count == 0
+
+            # The worker is free again and not still rendering the cancelled prompt
+            outputs = await asyncio.wait_for(
+                pool.run({"1": {"class_type": "StubSleep", "inputs": {"seconds": 0.1}}}, str(tmp_path / "job2")), 10
+            )
+            assert len(outputs) == 1
+        finally:
+            await pool.stop()
+
+    run(scenario())
+
+
+def test_jobs_go_to_worker_holding_their_models(tmp_path, make_stub_pool):
+    async def scenario():
+        pool = make_stub_pool()
+        await pool.start()
+        try:
+            await pool.run({"1": {"class_type": "KSampler"}}, str(tmp_path / "a"), models=["wan.safetensors"])
+            holder = next(w for w in pool.workers if w.resident_models)
+            assert pool.holds_models(["wan.safetensors"])
+            assert not pool.holds_models(["svd.safetensors"])
+
+            other = next(w for w in pool.workers if w is not holder)
+            other.resident_models = {"svd.safetensors"}
+            for _ in range(3):
+                worker = await pool.acquire(["wan.safetensors"])
+                assert worker is holder
+                await pool.release(worker)
+            assert holder.stats()["residentModels"] == ["wan.safetensors"]
+        finally:
+            await pool.stop()
+
+    run(scenario())
+
+
+def test_preload_warms_idle_workers(make_stub_pool):
+    workflow = preload_workflow(["sd15.safetensors", "svd.safetensors"])
+    loaders = [node["inputs"]["ckpt_name"] for node in workflow.values() if node["class_type"] == "CheckpointLoaderSimple"]
+    assert loaders == ["sd15.safetensors", "svd.safetensors"]
+    assert sum(node["class_type"] == "KSampler" for node in workflow.values()) == 0
+
+    async def scenario():
+        pool = make_stub_pool()
+        await pool.start()
+        try:
+            assert await pool.preload(["sd15.safetensors", "svd.safetensors"]) == 2
+            assert pool.holds_models(["svd.safetensors"])
+            assert not any(w.busy for w in pool.workers)
+        finally:
+            await pool.stop()
+
+    run(scenario())
@@ -0,0 +1,46 @@
+from workflow_analysis import ModelSizeIndex, estimate_cost, required_models
+
+
+def test_required_models_reads_loader_inputs():
+    workflow = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd15.safetensors"}},
+        "2": {"class_type": "ADE_LoadAnimateDiffModel", "inputs": {"model_name": "mm_sd15_v3.ckpt"}},
+        "3": {"class_type": "LoraLoader", "inputs": {"lora_name": "style.safetensors", "model": ["1", 0]}},
+        "4": {"class_type": "WanVideoModelLoader", "inputs": {"model": "wan2.1_t2v_14B_fp8.safetensors"}},
+        "5": {"class_type": "KSampler", "inputs": {"seed": 1, "sampler_name": "euler"}},
+        "6": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd15.safetensors"}},
+    }
+
+    assert required_models(workflow) == [
+        "mm_sd15_v3.ckpt",
+        "sd15.safetensors",
+        "style.safetensors",
+        "wan2.1_t2v_14B_fp8.safetensors",
+    ]
+    assert required_models({}) == []
+
+
+def test_estimate_cost_scales_with_frames_and_resolution():
+    small = {
+        "1": {"class_type": "ADE_LoadAnimateDiffModel", "inputs": {"model_name": "mm.ckpt"}},
+        "2": {"class_type": "EmptyLatentImage", "inputs": {"width": 512, "height": 512, "batch_size": 16}},
+    }
+    large = {
+        "1": {"class_type": "WanVideoModelLoader", "inputs": {"model": "wan2.1_t2v_14B.safetensors"}},
+        "2": {"class_type": "WanVideoEmptyEmbeds", "inputs": {"width": 1280, "height": 720, "num_frames": 81}},
+    }
+
+    assert estimate_cost(small) < 5
+    assert estimate_cost(large) > 20
+
+
+def test_estimate_cost_uses_model_files_on_disk(tmp_path):
+    checkpoints = tmp_path / "checkpoints"
+    checkpoints.mkdir()
+    (checkpoints / "tiny.safetensors").write_bytes(b"\0" * 1000)
+    sizes = ModelSizeIndex(str(tmp_path))
+    sizes.refresh()
+    workflow = {"1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "tiny.safetensors"}}}
+
+    assert sizes.size_gb("tiny.safetensors") == 1e-6
+    assert estimate_cost(workflow, sizes) < estimate_cost(workflow)
@@ -0,0 +1,84 @@
+"""
+Tier Routing for ComfyUI Backend
+================================
+
+Latency-aware choice between alternative workflows of one request, e.g.
+an SVD (Tier 3) workflow with an AnimateDiff (Tier 2) fallback.
+
+- ``LatencyModel`` keeps an EWMA of execution seconds per tier, fed by
+  completed jobs; tiers without history start from ``DEFAULT_RUNTIME``
+- ``expected_wait`` turns the current queue depth into seconds: queued
+  jobs at their tier's EWMA plus running jobs at half of it, spread over
+  the worker slots (no wait while a slot is free)
+- ``choose`` takes the first (most preferred) candidate whose wait plus
+  run time meets the latency target, otherwise the one expected to finish
+  first, so requests downgrade automatically as load grows and return to
+  the preferred tier when the queue drains
+
+Queue depth comes from ``JobStats`` tier counts, or from the shared Redis
+queue's counts when replicas share one (spread over the slots of all live
+replicas). It ignores priorities, so an urgent job may be downgraded more
+than needed.
+"""
+
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+from workflow_analysis import TIER_ANIMATEDIFF, TIER_OTHER, TIER_SVD, TIER_WAN
+
+# Execution seconds assumed for a tier until jobs of it have completed
+DEFAULT_RUNTIME = {
+    TIER_WAN: 600.0,
+    TIER_SVD: 120.0,
+    TIER_ANIMATEDIFF: 45.0,
+    TIER_OTHER: 60.0,
+}
+
+
+class LatencyModel:
+    """Per-tier EWMA of execution time"""
+
+    def __init__(self, alpha: float = 0.2, defaults: Mapping[str, float] = DEFAULT_RUNTIME):
+        self.alpha = alpha
+        self.defaults = dict(defaults)
+        self._ewma: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+
+    def observe(self, tier: str, seconds: float):
+        """Record the execution time of a completed job"""
+        previous = self._ewma.get(tier)
+        self._ewma[tier] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+        self._samples[tier] = self._samples.get(tier, 0) + 1
+
+    def runtime(self, tier: str) -> float:
+        """Expected execution seconds of a job of ``tier``"""
+        if tier in self._ewma:
+            return self._ewma[tier]
+        return self.defaults.get(tier, self.defaults.get(TIER_OTHER, 60.0))
+
+    def expected_wait(self, depth: Mapping[str, Mapping[str, int]], slots: int) -> float:
+        """Seconds until a job submitted now starts; ``depth`` is tier -> {"queued": n, "running": n}"""
+        queued = sum(counts.get("queued", 0) for counts in depth.values())
+        running = sum(counts.get("running", 0) for counts in depth.values())
+        if queued + running < slots:
+            return 0.0
+        work = sum(
+            (counts.get("queued", 0) + counts.get("running", 0) / 2) * self.runtime(tier)
+            for tier, counts in depth.items()
+        )
+        return work / max(slots, 1)
+
+    def choose(self, tiers: Sequence[str], wait: float, target: float) -> Tuple[int, float]:
+        """Index of the candidate tier to run and its expected seconds to completion"""
+        etas = [wait + self.runtime(tier) for tier in tiers]
+        for index, eta in enumerate(etas):
+            if eta <= target:
+                return index, eta
+        index = min(range(len(etas)), key=etas.__getitem__)
+        return index, etas[index]
+
+    def stats(self) -> Dict[str, dict]:
+        tiers: List[str] = sorted(set(self.defaults) | set(self._ewma))
+        return {
+            tier: {"expectedSeconds": round(self.runtime(tier), 2), "samples": self._samples.get(tier, 0)}
+            for tier in tiers
+        }
@@ -0,0 +1,87 @@
+"""
+Token Cache for ComfyUI Backend
+===============================
+
+Caches verified Firebase ID tokens so repeated requests with the same token
+(every status poll) skip signature verification.
+
+- Keyed by SHA-256 of the token, so raw tokens are never held as dict keys
+- Entries expire at the token's own ``exp`` claim
+- Bounded LRU of ``max_entries`` tokens
+- Cold verifications run in a thread pool; concurrent requests carrying the
+  same unverified token share one verification
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Tuple
+
+
+class TokenCache:
+    """Verified-token cache with off-loop verification"""
+
+    def __init__(
+        self,
+        verify: Callable[[str], dict],
+        max_entries: int = 10000,
+        max_workers: int = 4,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._verify = verify
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="token-verify")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def verify(self, token: str) -> dict:
+        """Decoded claims of ``token``; raises whatever ``verify`` raises for bad tokens"""
+        key = hashlib.sha256(token.encode()).hexdigest()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            claims, expires_at = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._entries[key]
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self._verify, token)
+        self._pending[key] = future
+        try:
+            claims = await asyncio.shield(future)
+        finally:
+            self._pending.pop(key, None)
+
+        self._store(key, claims)
+        return claims
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _store(self, key: str, claims: dict):
+        expires_at = float(claims.get("exp", 0))
+        if expires_at <= self._clock():
+            return
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,198 @@
+"""
+Job Tracing for ComfyUI Backend
+===============================
+
+Span-level timing of the phases of each job (auth, queue wait, dispatch,
+execution, output collection, finalize, encoding), written to a local file
+when the job ends.
+
+- Trace ids follow W3C Trace Context: a client ``traceparent`` header is
+  continued, otherwise a new trace is started; the id is returned on
+  submission so client and backend timings can be joined
+- Each job is a root span named ``job`` with one child span per phase
+- ``TraceExporter`` appends finished traces as OTLP-JSON (one
+  ``ExportTraceServiceRequest`` per line, the OpenTelemetry Collector file
+  exporter format) or as Chrome trace events (open the file in Perfetto or
+  ``chrome://tracing``; one row per job)
+
+Exporting writes to disk and is meant to run in an executor.
+"""
+
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+TRACE_FORMATS = ("otlp", "chrome")
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# OTLP enum values
+_SPAN_KIND_INTERNAL = 1
+_STATUS_ERROR = 2
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(header: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Trace id and parent span id of a W3C ``traceparent`` header, or (None, None)"""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if match is None or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], start_ns: int, end_ns: Optional[int] = None, **attributes):
+        self.name = name
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ns(self) -> int:
+        return max((self.end_ns or self.start_ns) - self.start_ns, 0)
+
+
+class JobTrace:
+    """Phase spans of one job under its root span"""
+
+    def __init__(self, job_id: str, trace_id: str, parent_span_id: Optional[str] = None, start_ns: Optional[int] = None):
+        self.job_id = job_id
+        self.trace_id = trace_id
+        self.root = Span("job", parent_span_id, start_ns or time.time_ns(), **{"job.id": job_id})
+        self.spans: List[Span] = []
+
+    def add(self, name: str, start_ns: int, end_ns: int, **attributes) -> Span:
+        """Record a phase that has already ended"""
+        span = Span(name, self.root.span_id, start_ns, end_ns, **attributes)
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time the enclosed block as phase ``name``; exceptions mark it failed"""
+        span = Span(name, self.root.span_id, time.time_ns(), **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            self.spans.append(span)
+
+    def end(self, end_ns: Optional[int] = None, **attributes):
+        self.root.end_ns = end_ns or time.time_ns()
+        self.root.attributes.update(attributes)
+
+    def durations(self) -> Dict[str, float]:
+        """Seconds spent per phase (repeated phases are summed)"""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration_ns / 1e9
+        return {name: round(seconds, 3) for name, seconds in totals.items()}
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace: JobTrace, span: Span) -> dict:
+    otlp = {
+        "traceId": trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": _SPAN_KIND_INTERNAL,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": _STATUS_ERROR, "message": span.error} if span.error else {},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+def otlp_request(trace: JobTrace, service_name: str) -> dict:
+    """OTLP/JSON ExportTraceServiceRequest holding one job's spans"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": service_name},
+                "spans": [_otlp_span(trace, span) for span in (trace.root, *trace.spans)],
+            }],
+        }],
+    }
+
+
+def chrome_events(trace: JobTrace, pid: int, tid: int) -> List[dict]:
+    """Chrome trace events ("X" complete events, microseconds) for one job on row ``tid``"""
+    events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": f"job {trace.job_id}"}}]
+    for span in (trace.root, *trace.spans):
+        args = {**span.attributes, "traceId": trace.trace_id}
+        if span.error:
+            args["error"] = span.error
+        events.append({
+            "name": span.name,
+            "cat": "job",
+            "ph": "X",
+            "ts": span.start_ns / 1000,
+            "dur": span.duration_ns / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": args,
+        })
+    return events
+
+
+class TraceExporter:
+    """Appends finished job traces to ``path``"""
+
+    def __init__(self, path: str, fmt: str = "otlp", service_name: str = "comfyui-backend"):
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format {fmt!r} (expected one of {', '.join(TRACE_FORMATS)})")
+        self.path = path
+        self.format = fmt
+        self.service_name = service_name
+        self.exported = 0
+        self._lock = threading.Lock()
+
+    def export(self, trace: JobTrace):
+        with self._lock:
+            self.exported += 1
+            if self.format == "otlp":
+                text = json.dumps(otlp_request(trace, self.service_name)) + "\n"
+            else:
+                # JSON array format without the closing bracket, which trace viewers accept
+                events = chrome_events(trace, os.getpid(), self.exported)
+                text = "".join(json.dumps(event) + ",\n" for event in events)
+                if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                    text = "[\n" + text
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(text)
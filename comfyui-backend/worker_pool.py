@@ -0,0 +1,490 @@
+"""
+ComfyUI Worker Pool
+===================
+
+Long-lived ComfyUI server processes that jobs are dispatched to over
+ComfyUI's HTTP prompt API, instead of launching ComfyUI (and reloading
+models) for every job.
+
+- Spawns ``size`` local ComfyUI servers on consecutive ports, or attaches
+  to already running servers listed in ``COMFYUI_WORKER_URLS``
+- Periodic health checks (``/system_stats``); crashed or unresponsive
+  local workers are restarted
+- Progress is read from ComfyUI's ``/ws`` channel when the ``websockets``
+  package is available, otherwise ``/history`` is polled
+- Outputs of local workers are moved into the job directory; remote
+  outputs are downloaded through ``/view``. Both run off the event loop
+  (a move across filesystems copies the whole video)
+- Each worker remembers the models its last job loaded; ``acquire`` hands
+  a job to the idle worker that already holds most of its models
+- ``run`` reports its phases (worker acquire, dispatch, execution, output
+  collection) through an optional ``span`` context manager factory
+- ``preload`` loads a set of checkpoints on every idle worker before the
+  first job, so the first requests after a deploy skip the weight read
+
+``stub_comfyui.py`` implements the same API without a GPU for tests.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from contextlib import nullcontext
+from functools import partial
+from typing import Callable, ContextManager, Iterable, List, Optional, Set
+
+import aiofiles
+import httpx
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+OUTPUT_KEYS = ("videos", "gifs", "images")
+
+ProgressCallback = Callable[[float], None]
+SpanFactory = Callable[..., ContextManager]  # span(name, **attributes), e.g. JobTrace.span
+
+
+def _no_span(name: str, **attributes) -> ContextManager:
+    return nullcontext()
+
+
+class WorkerError(Exception):
+    """ComfyUI rejected or failed to execute a prompt"""
+
+
+class NoWorkersAvailable(WorkerError):
+    """The pool has no workers configured"""
+
+
+def _move_if_exists(source: str, target: str) -> bool:
+    """Move a local worker's output (blocking: copies when crossing filesystems)"""
+    if not os.path.exists(source):
+        return False
+    shutil.move(source, target)
+    return True
+
+
+def preload_workflow(checkpoints: Iterable[str]) -> dict:
+    """
+    Prompt that loads each checkpoint and decodes a 64x64 empty latent with
+    its VAE: ComfyUI caches the loaded weights without running a sampler.
+    """
+    workflow = {}
+    for i, checkpoint in enumerate(checkpoints):
+        loader, latent, decode, preview = (str(4 * i + n) for n in (1, 2, 3, 4))
+        workflow[loader] = {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": checkpoint}}
+        workflow[latent] = {"class_type": "EmptyLatentImage", "inputs": {"width": 64, "height": 64, "batch_size": 1}}
+        workflow[decode] = {"class_type": "VAEDecode", "inputs": {"samples": [latent, 0], "vae": [loader, 2]}}
+        workflow[preview] = {"class_type": "PreviewImage", "inputs": {"images": [decode, 0]}}
+    return workflow
+
+
+class ComfyUIWorker:
+    """One ComfyUI server, either spawned by the pool or external"""
+
+    def __init__(
+        self,
+        index: int,
+        url: str,
+        command: Optional[List[str]] = None,
+        output_dir: Optional[str] = None,
+        startup_timeout: float = 300,
+    ):
+        self.index = index
+        self.url = url.rstrip("/")
+        self.command = command
+        self.output_dir = output_dir
+        self.startup_timeout = startup_timeout
+
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.healthy = False
+        self.busy = False
+        self.current_prompt: Optional[str] = None
+        self.restarts = 0
+        self.failed_checks = 0
+        self.last_check: Optional[float] = None
+        self.resident_models: Set[str] = set()  # loaded by the last completed job
+        self._client = httpx.AsyncClient(base_url=self.url, timeout=30)
+
+    @property
+    def managed(self) -> bool:
+        """True if the pool owns the process and may restart it"""
+        return self.command is not None
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.busy
+
+    def stats(self) -> dict:
+        return {
+            "index": self.index,
+            "url": self.url,
+            "healthy": self.healthy,
+            "busy": self.busy,
+            "managed": self.managed,
+            "pid": self.process.pid if self.process else None,
+            "restarts": self.restarts,
+            "residentModels": sorted(self.resident_models),
+        }
+
+    # Lifecycle
+
+    async def start(self):
+        if self.managed:
+            if self.output_dir:
+                os.makedirs(self.output_dir, exist_ok=True)
+            self.process = await asyncio.create_subprocess_exec(*self.command)
+            print(f"👷 Worker {self.index} starting (pid {self.process.pid}) at {self.url}")
+
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process and self.process.returncode is not None:
+                raise WorkerError(f"Worker {self.index} exited with code {self.process.returncode}")
+            if await self.check_health():
+                print(f"✅ Worker {self.index} ready at {self.url}")
+                return
+            await asyncio.sleep(0.5)
+        raise WorkerError(f"Worker {self.index} did not become healthy within {self.startup_timeout}s")
+
+    async def stop(self):
+        self.healthy = False
+        self.resident_models = set()
+        if self.process and self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), 10)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        self.process = None
+
+    async def restart(self):
+        self.restarts += 1
+        print(f"🔄 Restarting worker {self.index} (restart #{self.restarts})")
+        await self.stop()
+        await self.start()
+
+    async def close(self):
+        await self.stop()
+        await self._client.aclose()
+
+    async def check_health(self) -> bool:
+        self.last_check = time.time()
+        if self.process and self.process.returncode is not None:
+            self.healthy = False
+            return False
+        try:
+            response = await self._client.get("/system_stats", timeout=5)
+            self.healthy = response.status_code == 200
+        except httpx.HTTPError:
+            self.healthy = False
+        self.failed_checks = 0 if self.healthy else self.failed_checks + 1
+        return self.healthy
+
+    # Prompt execution
+
+    async def execute(
+        self,
+        workflow: dict,
+        output_dir: str,
+        on_progress: Optional[ProgressCallback] = None,
+        span: SpanFactory = _no_span,
+    ) -> List[str]:
+        """Run ``workflow`` and place its output files in ``output_dir``"""
+        client_id = uuid.uuid4().hex
+        try:
+            if WEBSOCKETS_AVAILABLE:
+                ws_url = self.url.replace("http", "ws", 1) + f"/ws?clientId={client_id}"
+                async with websockets.connect(ws_url, max_size=None) as ws:
+                    with span("dispatch", worker=self.index):
+                        prompt_id = await self._submit(workflow, client_id)
+                    with span("execution", worker=self.index):
+                        await self._wait_ws(ws, prompt_id, len(workflow), on_progress)
+            else:
+                with span("dispatch", worker=self.index):
+                    prompt_id = await self._submit(workflow, client_id)
+                with span("execution", worker=self.index):
+                    await self._wait_history(prompt_id)
+
+            with span("output_collection", worker=self.index):
+                history = await self._history(prompt_id)
+                return await self._collect_outputs(history, output_dir)
+        finally:
+            self.current_prompt = None
+
+    async def interrupt(self):
+        """Stop the prompt currently executing on this worker"""
+        try:
+            await self._client.post("/interrupt", timeout=5)
+        except httpx.HTTPError:
+            pass
+
+    async def _submit(self, workflow: dict, client_id: str) -> str:
+        response = await self._client.post("/prompt", json={"prompt": workflow, "client_id": client_id})
+        if response.status_code != 200:
+            raise WorkerError(f"ComfyUI rejected prompt: {response.text[:500]}")
+        prompt_id = response.json()["prompt_id"]
+        self.current_prompt = prompt_id
+        return prompt_id
+
+    async def _wait_ws(self, ws, prompt_id: str, node_count: int, on_progress: Optional[ProgressCallback]):
+        nodes_done = 0
+        async for message in ws:
+            if not isinstance(message, str):
+                continue  # binary preview frames
+            event = json.loads(message)
+            data = event.get("data") or {}
+            if data.get("prompt_id") not in (None, prompt_id):
+                continue
+
+            kind = event.get("type")
+            if kind == "progress" and on_progress and data.get("max"):
+                fraction = (nodes_done + data["value"] / data["max"]) / max(node_count, 1)
+                on_progress(min(fraction, 1.0))
+            elif kind == "executing":
+                if data.get("node") is None and data.get("prompt_id") == prompt_id:
+                    return
+                nodes_done += 1
+                if on_progress:
+                    on_progress(min(nodes_done / max(node_count, 1), 1.0))
+            elif kind == "execution_success":
+                return
+            elif kind == "execution_error":
+                raise WorkerError(data.get("exception_message") or "ComfyUI execution error")
+            elif kind == "execution_interrupted":
+                raise WorkerError("ComfyUI execution interrupted")
+        raise WorkerError("ComfyUI connection closed during execution")
+
+    async def _wait_history(self, prompt_id: str, interval: float = 1.0):
+        while True:
+            history = await self._history(prompt_id)
+            if history and (history.get("status") or {}).get("completed", True):
+                return
+            await asyncio.sleep(interval)
+
+    async def _history(self, prompt_id: str) -> dict:
+        response = await self._client.get(f"/history/{prompt_id}")
+        response.raise_for_status()
+        history = response.json().get(prompt_id) or {}
+        status = history.get("status") or {}
+        if status.get("status_str") == "error":
+            raise WorkerError(f"ComfyUI execution failed: {status.get('messages')}")
+        return history
+
+    async def _collect_outputs(self, history: dict, output_dir: str) -> List[str]:
+        await asyncio.get_running_loop().run_in_executor(None, partial(os.makedirs, output_dir, exist_ok=True))
+        collected = []
+        for node_output in (history.get("outputs") or {}).values():
+            for key in OUTPUT_KEYS:
+                for item in node_output.get(key, []):
+                    if item.get("type", "output") != "output":
+                        continue
+                    collected.append(await self._fetch_output(item, output_dir))
+        return collected
+
+    async def _fetch_output(self, item: dict, output_dir: str) -> str:
+        filename = os.path.basename(item["filename"])
+        target = os.path.join(output_dir, filename)
+
+        if self.output_dir:
+            source = os.path.join(self.output_dir, item.get("subfolder", ""), filename)
+            if await asyncio.get_running_loop().run_in_executor(None, _move_if_exists, source, target):
+                return target
+
+        params = {"filename": item["filename"], "subfolder": item.get("subfolder", ""), "type": "output"}
+        async with self._client.stream("GET", "/view", params=params, timeout=None) as response:
+            response.raise_for_status()
+            async with aiofiles.open(target, "wb") as f:
+                async for chunk in response.aiter_bytes():
+                    await f.write(chunk)
+        return target
+
+
+class ComfyUIWorkerPool:
+    """Fixed-size pool of ComfyUI workers with health checks and restarts"""
+
+    def __init__(self, workers: List[ComfyUIWorker], health_interval: float = 10, max_failed_checks: int = 3):
+        self.workers = workers
+        self.health_interval = health_interval
+        self.max_failed_checks = max_failed_checks
+        self._available = asyncio.Condition()
+        self._health_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        size: int,
+        comfyui_main: str,
+        base_port: int = 8188,
+        host: str = "127.0.0.1",
+        worker_urls: Optional[List[str]] = None,
+        output_root: str = "/tmp/comfyui_workers",
+        python: str = sys.executable,
+        extra_args: Optional[List[str]] = None,
+        **kwargs,
+    ) -> "ComfyUIWorkerPool":
+        """Attach to ``worker_urls`` if given, otherwise spawn ``size`` local servers"""
+        startup_timeout = kwargs.pop("startup_timeout", 300)
+        if worker_urls:
+            workers = [
+                ComfyUIWorker(i, url, startup_timeout=startup_timeout)
+                for i, url in enumerate(worker_urls)
+            ]
+            return cls(workers, **kwargs)
+
+        if not os.path.exists(comfyui_main):
+            return cls([], **kwargs)
+
+        workers = []
+        for i in range(size):
+            port = base_port + i
+            output_dir = os.path.join(output_root, f"worker_{i}")
+            command = [
+                python, comfyui_main,
+                "--listen", host,
+                "--port", str(port),
+                "--output-directory", output_dir,
+                *(extra_args or []),
+            ]
+            workers.append(ComfyUIWorker(i, f"http://{host}:{port}", command, output_dir, startup_timeout))
+        return cls(workers, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.workers)
+
+    @property
+    def healthy_count(self) -> int:
+        return sum(1 for w in self.workers if w.healthy)
+
+    @property
+    def busy_count(self) -> int:
+        return sum(1 for w in self.workers if w.busy)
+
+    def stats(self) -> dict:
+        return {
+            "total": len(self.workers),
+            "healthy": self.healthy_count,
+            "busy": self.busy_count,
+            "workers": [w.stats() for w in self.workers],
+        }
+
+    async def start(self):
+        results = await asyncio.gather(*(w.start() for w in self.workers), return_exceptions=True)
+        for worker, result in zip(self.workers, results):
+            if isinstance(result, Exception):
+                print(f"⚠️ Worker {worker.index} failed to start: {result}")
+        self._health_task = asyncio.create_task(self._health_loop())
+        await self._notify()
+
+    async def stop(self):
+        if self._health_task:
+            self._health_task.cancel()
+        await asyncio.gather(*(w.close() for w in self.workers), return_exceptions=True)
+
+    async def preload(self, checkpoints: List[str]) -> int:
+        """Load ``checkpoints`` on every idle healthy worker; returns how many were warmed"""
+        if not checkpoints:
+            return 0
+        idle = [w for w in self.workers if w.available]
+        for worker in idle:
+            worker.busy = True  # keep jobs off the worker while it loads
+        workflow = preload_workflow(checkpoints)
+        loop = asyncio.get_running_loop()
+        scratch = tempfile.mkdtemp(prefix="comfyui_preload_")
+
+        async def warm(worker: ComfyUIWorker) -> bool:
+            started = time.monotonic()
+            try:
+                await worker.execute(workflow, os.path.join(scratch, str(worker.index)))
+            except (WorkerError, httpx.HTTPError) as e:
+                print(f"⚠️ Worker {worker.index} preload failed: {e}")
+                return False
+            finally:
+                worker.busy = False
+            worker.resident_models = set(checkpoints)
+            print(f"🔥 Worker {worker.index} preloaded {len(checkpoints)} checkpoints in {time.monotonic() - started:.1f}s")
+            return True
+
+        try:
+            warmed = await asyncio.gather(*(warm(w) for w in idle))
+        finally:
+            await self._notify()
+            await loop.run_in_executor(None, partial(shutil.rmtree, scratch, ignore_errors=True))
+        return sum(warmed)
+
+    def holds_models(self, models: Iterable[str]) -> bool:
+        """True if an idle worker already has all of ``models`` loaded"""
+        wanted = set(models)
+        return any(w.available and wanted <= w.resident_models for w in self.workers)
+
+    async def acquire(self, models: Iterable[str] = ()) -> ComfyUIWorker:
+        """Wait for an idle healthy worker, preferring one that holds ``models``, and mark it busy"""
+        if not self.workers:
+            raise NoWorkersAvailable("No ComfyUI workers configured")
+        wanted = set(models)
+        async with self._available:
+            while True:
+                idle = [w for w in self.workers if w.available]
+                if idle:
+                    worker = max(idle, key=lambda w: len(wanted & w.resident_models))
+                    worker.busy = True
+                    return worker
+                await self._available.wait()
+
+    async def release(self, worker: ComfyUIWorker):
+        worker.busy = False
+        await self._notify()
+
+    async def run(
+        self,
+        workflow: dict,
+        output_dir: str,
+        on_progress: Optional[ProgressCallback] = None,
+        models: Iterable[str] = (),
+        span: SpanFactory = _no_span,
+    ) -> List[str]:
+        """Execute ``workflow`` on the next available worker"""
+        with span("worker_acquire"):
+            worker = await self.acquire(models)
+        try:
+            outputs = await worker.execute(workflow, output_dir, on_progress, span)
+            # ComfyUI keeps the last prompt's models loaded until VRAM is needed
+            worker.resident_models = set(models)
+            return outputs
+        except asyncio.CancelledError:
+            await worker.interrupt()
+            raise
+        finally:
+            await self.release(worker)
+
+    async def _notify(self):
+        async with self._available:
+            self._available.notify_all()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for worker in self.workers:
+                try:
+                    await self._check_worker(worker)
+                except Exception as e:
+                    print(f"⚠️ Worker {worker.index} health check failed: {e}")
+            await self._notify()
+
+    async def _check_worker(self, worker: ComfyUIWorker):
+        crashed = worker.process is not None and worker.process.returncode is not None
+        if not crashed and await worker.check_health():
+            return
+        if worker.managed and (crashed or worker.failed_checks >= self.max_failed_checks or worker.process is None):
+            try:
+                await worker.restart()
+            except WorkerError as e:
+                print(f"⚠️ {e}")
@@ -0,0 +1,134 @@
+"""
+Workflow Analysis for ComfyUI Backend
+=====================================
+
+Static inspection of submitted ComfyUI workflow dicts (API format:
+``{node_id: {"class_type": ..., "inputs": {...}}}``).
+
+- ``detect_tier``: video model family (wan, svd, animatediff, other)
+- ``required_models``: model files the workflow loads
+- ``estimate_cost``: rough GPU memory (GB) a run needs, from model sizes
+  and frames x resolution, used for admission control
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional
+
+# Generation tiers, named after the video model family a workflow uses
+TIER_WAN = "wan"
+TIER_SVD = "svd"
+TIER_ANIMATEDIFF = "animatediff"
+TIER_OTHER = "other"
+
+# Loader inputs that name a model file (checkpoints, UNets, VAEs, text encoders, LoRAs, ...)
+MODEL_INPUTS = (
+    "ckpt_name", "unet_name", "model_name", "vae_name",
+    "clip_name", "clip_name1", "clip_name2", "clip_name3",
+    "lora_name", "control_net_name", "clip_vision_name",
+    "upscale_model", "motion_model", "model",
+)
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".sft")
+
+
+def iter_nodes(workflow: dict) -> Iterable[dict]:
+    for node in (workflow or {}).values():
+        if isinstance(node, dict):
+            yield node
+
+
+def detect_tier(workflow: dict) -> str:
+    """Model family of a workflow: wan, svd, animatediff or other"""
+    class_types = [str(node.get("class_type", "")) for node in iter_nodes(workflow)]
+    if any(ct.startswith(("WanVideo", "LoadWanVideo")) for ct in class_types):
+        return TIER_WAN
+    if any(ct.startswith("SVD_") for ct in class_types):
+        return TIER_SVD
+    if any(ct.startswith("ADE_") or "AnimateDiff" in ct for ct in class_types):
+        return TIER_ANIMATEDIFF
+    return TIER_OTHER
+
+
+def required_models(workflow: dict) -> List[str]:
+    """Sorted model file names a workflow loads"""
+    models = set()
+    for node in iter_nodes(workflow):
+        for key, value in (node.get("inputs") or {}).items():
+            # Linked inputs are [node_id, output_index]; only literal names count
+            if not isinstance(value, str) or not value:
+                continue
+            if key in MODEL_INPUTS or value.lower().endswith(MODEL_EXTENSIONS):
+                models.add(value)
+    return sorted(models)
+
+
+# Cost estimation
+
+# Model weights per tier when the files cannot be found on disk (GB)
+TIER_MODEL_GB = {
+    TIER_WAN: 16.0,
+    TIER_SVD: 4.5,
+    TIER_ANIMATEDIFF: 3.5,
+    TIER_OTHER: 2.5,
+}
+# Activation memory per latent-decoded pixel per frame; ~8 GB for 81 frames at 1280x720
+ACTIVATION_GB_PER_PIXEL = 1e-7
+FRAME_INPUTS = ("length", "num_frames", "video_frames", "frame_count", "frames", "batch_size")
+DEFAULT_FRAMES = 16
+DEFAULT_RESOLUTION = (512, 512)
+
+
+class ModelSizeIndex:
+    """Sizes of the model files under ComfyUI's ``models`` directory, by file name"""
+
+    def __init__(self, models_dir: str):
+        self.models_dir = models_dir
+        self._sizes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def refresh(self):
+        """Rescan the models directory (blocking; run it off the event loop)"""
+        sizes: Dict[str, int] = {}
+        for root, _, files in os.walk(self.models_dir):
+            for name in files:
+                try:
+                    sizes[name] = os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+        self._sizes = sizes
+
+    def size_gb(self, name: str) -> Optional[float]:
+        size = self._sizes.get(os.path.basename(name))
+        return size / 1e9 if size is not None else None
+
+
+def _int_input(workflow: dict, keys: Iterable[str]) -> Optional[int]:
+    """Largest literal integer among ``keys`` across all nodes"""
+    values = [
+        value
+        for node in iter_nodes(workflow)
+        for key, value in (node.get("inputs") or {}).items()
+        if key in keys and isinstance(value, int) and not isinstance(value, bool)
+    ]
+    return max(values) if values else None
+
+
+def estimate_cost(workflow: dict, model_sizes: Optional[ModelSizeIndex] = None) -> float:
+    """
+    Estimated peak GPU memory of a run in GB.
+
+    Model weights come from the model files on disk when they can be found,
+    otherwise from the tier default; activations scale with
+    frames x width x height.
+    """
+    sizes = [model_sizes.size_gb(name) for name in required_models(workflow)] if model_sizes else []
+    if sizes and None not in sizes:
+        model_gb = sum(sizes)
+    else:
+        model_gb = TIER_MODEL_GB[detect_tier(workflow)]
+
+    frames = _int_input(workflow, FRAME_INPUTS) or DEFAULT_FRAMES
+    width = _int_input(workflow, ("width",)) or DEFAULT_RESOLUTION[0]
+    height = _int_input(workflow, ("height",)) or DEFAULT_RESOLUTION[1]
+    return round(model_gb + frames * width * height * ACTIVATION_GB_PER_PIXEL, 2)
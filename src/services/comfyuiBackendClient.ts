@@ -419,6 +419,11 @@ async function pollJobStatus(
         throw new Error(`Job failed: ${failedReason}`);
       }
 
+      if (state === 'cancelled' || state === 'timed_out') {
+        const outcome = state === 'cancelled' ? 'cancelled' : 'timed out';
+        throw new Error(failedReason ? `Job ${outcome}: ${failedReason}` : `Job ${outcome}`);
+      }
+
       // Wait before next poll
       await new Promise(resolve => setTimeout(resolve, pollInterval));
     } catch (error: unknown) {
@@ -694,9 +699,9 @@ export async function generateVideo(params: {
  */
 export async function getVideoJobStatus(jobId: string): Promise<{
   jobId: string;
-  status?: 'queued' | 'processing' | 'completed' | 'failed';
+  status?: 'queued' | 'processing' | 'completed' | 'failed' | 'cancelled' | 'timed_out';
   // Some backend versions use `state` instead of `status`
-  state?: 'queued' | 'processing' | 'completed' | 'failed';
+  state?: 'queued' | 'processing' | 'completed' | 'failed' | 'cancelled' | 'timed_out';
   progress: number;
   result?: any;
   error?: string;
@@ -1084,6 +1089,14 @@ async function pollVideoJob(
         throw new Error(status.error || 'Video generation failed');
       }
 
+      // Terminal too; the message must contain "failed" so the catch below rethrows it
+      if (currentStatus === 'cancelled' || currentStatus === 'timed_out') {
+        const outcome = currentStatus === 'cancelled' ? 'was cancelled' : 'timed out';
+        throw new Error(
+          `Video generation failed: job ${outcome}${status.error ? ` (${status.error})` : ''}`
+        );
+      }
+
       if (onProgress) {
         const rawProgress = typeof status.progress === 'number' ? status.progress : 0;
         const boundedRaw = Math.max(0, Math.min(100, rawProgress));